@@ -1,12 +1,11 @@
 import streamlit as st
-import psycopg2
 from database import (
     get_db_connection,
     get_all_users_for_admin_view,
     get_audit_logs,
     get_response_info,
     get_response_details,
-    update_response_detail,
+    update_response_details,
     get_user_by_username,
     update_user_allowed_surveys,
     add_governorate_admin,
@@ -18,65 +17,78 @@ from database import (
     save_survey,
     delete_survey,
     get_survey_fields,
+    get_compiled_survey,
     get_user_allowed_surveys
 )
-import json
 import pandas as pd
 from datetime import datetime
 import re
 from io import BytesIO
+from jobs import (
+    latest_survey_export, submit_survey_export,
+    read_result as read_export_result
+)
+from storage.exports import get_export_checkpoint
+from profiling import section
+from analytics_views import show_analytics, show_crosstab
 
 def show_admin_dashboard():
     st.title("لوحة تحكم النظام")
     
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "إدارة المستخدمين",
         "إدارة المحافظات", 
         "إدارة الإدارات الصحية",     
         "إدارة الاستبيانات", 
-        "عرض البيانات"
+        "عرض البيانات",
+        "التحليلات"
     ])
     
-    with tab1:
+    with tab1, section("manage_users"):
         manage_users()
     
-    with tab2:
+    with tab2, section("manage_governorates"):
         manage_governorates()
     
-    with tab3:
+    with tab3, section("manage_regions"):
         manage_regions()
     
-    with tab4:
+    with tab4, section("manage_surveys"):
         manage_surveys()
     
-    with tab5:
+    with tab5, section("view_data"):
         view_data()
 
+    with tab6, section("analytics"):
+        show_analytics()
+
 def manage_users():
     st.header("إدارة المستخدمين")
     
     # عرض المستخدمين الحاليين
-    users = get_all_users_for_admin_view()
+    with section("load_users"):
+        users = get_all_users_for_admin_view()
     
     # عرض جدول المستخدمين
-    for user in users:
-        col1, col2, col3, col4, col5, col6 = st.columns([2, 2, 2, 2, 1, 1])
-        with col1:
-            st.write(user[1])
-        with col2:
-            role = "مسؤول نظام" if user[2] == "admin" else "مسؤول محافظة" if user[2] == "governorate_admin" else "موظف"
-            st.write(role)
-        with col3:
-            st.write(user[3] if user[3] else "غير محدد")
-        with col4:
-            st.write(user[4] if user[4] else "غير محدد")
-        with col5:
-            if st.button("تعديل", key=f"edit_{user[0]}"):
-                st.session_state.editing_user = user[0]
-        with col6:
-            if st.button("حذف", key=f"delete_{user[0]}"):
-                delete_user(user[0])
-                st.rerun()
+    with section("users_table"):
+        for user in users:
+            col1, col2, col3, col4, col5, col6 = st.columns([2, 2, 2, 2, 1, 1])
+            with col1:
+                st.write(user[1])
+            with col2:
+                role = "مسؤول نظام" if user[2] == "admin" else "مسؤول محافظة" if user[2] == "governorate_admin" else "موظف"
+                st.write(role)
+            with col3:
+                st.write(user[3] if user[3] else "غير محدد")
+            with col4:
+                st.write(user[4] if user[4] else "غير محدد")
+            with col5:
+                if st.button("تعديل", key=f"edit_{user[0]}"):
+                    st.session_state.editing_user = user[0]
+            with col6:
+                if st.button("حذف", key=f"delete_{user[0]}"):
+                    delete_user(user[0])
+                    st.rerun()
     
     if 'editing_user' in st.session_state:
         edit_user_form(st.session_state.editing_user)
@@ -452,6 +464,8 @@ def manage_surveys():
         with col3:
             if st.button("تعديل", key=f"edit_survey_{survey[0]}"):
                 st.session_state.editing_survey = survey[0]
+                # فتح النموذج من جديد يقرأ رقم الإصدار الحالي
+                st.session_state.pop(f"survey_version_{survey[0]}", None)
         with col4:
             if st.button("حذف", key=f"delete_survey_{survey[0]}"):
                 delete_survey(survey[0])
@@ -470,23 +484,29 @@ def edit_survey(survey_id):
     try:
         cursor = conn.cursor()
         # الحصول على بيانات الاستبيان
-        cursor.execute("SELECT survey_name, is_active FROM Surveys WHERE survey_id=%s", (survey_id,))
+        cursor.execute("SELECT survey_name, is_active, definition_version FROM Surveys WHERE survey_id=%s",
+                       (survey_id,))
         survey = cursor.fetchone()
-        
-        # الحصول على حقول الاستبيان الحالية
-        cursor.execute('''
-            SELECT field_id, field_label, field_type, field_options, is_required, field_order
-            FROM Survey_Fields
-            WHERE survey_id = %s
-            ORDER BY field_order
-        ''', (survey_id,))
-        fields = cursor.fetchall()
     except Exception as e:
         st.error(f"حدث خطأ في جلب بيانات الاستبيان: {str(e)}")
         return
     finally:
         conn.close()
-    
+
+    # الحصول على حقول الاستبيان الحالية من التعريف المترجم
+    schema = get_compiled_survey(survey_id)
+    if schema is None:
+        return
+
+    # رقم إصدار الاستبيان عند فتح النموذج، للتحقق من عدم تعديله من مسؤول آخر قبل الحفظ
+    version_key = f"survey_version_{survey_id}"
+    if version_key not in st.session_state:
+        st.session_state[version_key] = survey[2]
+        # قيم الحقول تُقرأ من جديد مع رقم الإصدار، فلا تبقى قيم قديمة تُحفظ على الإصدار الجديد
+        for field in schema.fields:
+            for prefix in ('label', 'type', 'order', 'required', 'remove', 'options'):
+                st.session_state.pop(f"{prefix}_{field.field_id}", None)
+
     # تهيئة حالة الجلسة للحقول الجديدة إذا لم تكن موجودة
     if 'new_survey_fields' not in st.session_state:
         st.session_state.new_survey_fields = []
@@ -502,22 +522,25 @@ def edit_survey(survey_id):
         st.subheader("الحقول الحالية")
         
         updated_fields = []
-        for field in fields:
-            field_id = field[0]
-            with st.expander(f"حقل: {field[1]} (نوع: {field[2]})"):
+        for position, field in enumerate(schema.fields, start=1):
+            field_id = field.field_id
+            with st.expander(f"حقل: {field.label} (نوع: {field.field_type})"):
                 col1, col2 = st.columns(2)
                 with col1:
-                    new_label = st.text_input("تسمية الحقل", value=field[1], key=f"label_{field_id}")
+                    new_label = st.text_input("تسمية الحقل", value=field.label, key=f"label_{field_id}")
                     new_type = st.selectbox(
                         "نوع الحقل",
                         ["text", "number", "dropdown", "checkbox", "date"],
-                        index=["text", "number", "dropdown", "checkbox", "date"].index(field[2]),
+                        index=["text", "number", "dropdown", "checkbox", "date"].index(field.field_type),
                         key=f"type_{field_id}"
                     )
+                    new_position = st.number_input("الترتيب", min_value=1, value=position, step=1,
+                                                   key=f"order_{field_id}")
                 with col2:
-                    new_required = st.checkbox("مطلوب", value=bool(field[4]), key=f"required_{field_id}")
+                    new_required = st.checkbox("مطلوب", value=field.is_required, key=f"required_{field_id}")
+                    remove_field = st.checkbox("حذف الحقل", value=False, key=f"remove_{field_id}")
                     if new_type == 'dropdown':
-                        options = "\n".join(json.loads(field[3])) if field[3] else ""
+                        options = "\n".join(field.options)
                         new_options = st.text_area(
                             "خيارات القائمة المنسدلة (سطر لكل خيار)",
                             value=options,
@@ -526,13 +549,17 @@ def edit_survey(survey_id):
                     else:
                         new_options = None
                 
-                updated_fields.append({
-                    'field_id': field_id,
-                    'field_label': new_label,
-                    'field_type': new_type,
-                    'field_options': [opt.strip() for opt in new_options.split('\n')] if new_options else None,
-                    'is_required': new_required
-                })
+                if not remove_field:
+                    updated_fields.append((new_position, position, {
+                        'field_id': field_id,
+                        'field_label': new_label,
+                        'field_type': new_type,
+                        'field_options': [opt.strip() for opt in new_options.split('\n')] if new_options else None,
+                        'is_required': new_required
+                    }))
+        
+        # ترتيب الحقول حسب الترتيب الجديد، والحقول المحذوفة لا تُرسل
+        updated_fields = [f for _, _, f in sorted(updated_fields, key=lambda x: (x[0], x[1]))]
         
         # إضافة حقول جديدة
         st.subheader("إضافة حقول جديدة")
@@ -580,20 +607,30 @@ def edit_survey(survey_id):
         
         # أزرار حفظ التعديلات
         st.markdown("---")
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
             if st.form_submit_button("💾 حفظ التعديلات"):
                 # دمج الحقول المعدلة مع الحقول الجديدة
                 all_fields = updated_fields + st.session_state.new_survey_fields
                 
-                if update_survey(survey_id, new_name, is_active, all_fields):
+                # عند التعارض يبقى رقم الإصدار القديم فلا يُحفظ فوق تعديل الآخر حتى إعادة التحميل
+                if update_survey(survey_id, new_name, is_active, all_fields,
+                                 st.session_state[version_key]):
+                    del st.session_state[version_key]
                     st.success("تم تحديث الاستبيان بنجاح")
                     st.session_state.new_survey_fields = []
                     del st.session_state.editing_survey
                     st.rerun()
+                else:
+                    st.warning("اضغط «إعادة التحميل» لقراءة أحدث نسخة من الاستبيان قبل الحفظ مرة أخرى")
         with col2:
+            if st.form_submit_button("🔄 إعادة التحميل"):
+                del st.session_state[version_key]
+                st.rerun()
+        with col3:
             if st.form_submit_button("❌ إلغاء"):
                 st.session_state.new_survey_fields = []
+                del st.session_state[version_key]
                 del st.session_state.editing_survey
                 st.rerun()
 
@@ -665,6 +702,13 @@ def create_survey_form():
                 st.session_state.create_survey_fields = []
                 st.rerun()
 
+def reset_response_editor(response_id, details):
+    """حذف قيم حقول محرر الإجابة ورقم إصدارها معًا لتُقرأ من جديد من قاعدة البيانات"""
+    for detail in details:
+        st.session_state.pop(f"dropdown_{detail[0]}_{response_id}", None)
+        st.session_state.pop(f"input_{detail[0]}_{response_id}", None)
+    st.session_state.pop(f"response_version_{response_id}", None)
+
 def display_survey_data(survey_id):
     """عرض بيانات استجابات الاستبيان وتصدير شامل لجميع البيانات"""
     conn = get_db_connection()
@@ -728,80 +772,15 @@ def display_survey_data(survey_id):
         
         # عرض البيانات
         st.dataframe(df)
-        
+
+        # الجدول التقاطعي يُحسب فقط عند فتحه
+        if st.toggle("جدول تقاطعي بين حقلين", key=f"crosstab_{survey_id}"):
+            with section("crosstab"):
+                show_crosstab(survey_id)
+
         # زر تصدير شامل لجميع البيانات
-        if st.button("تصدير شامل لجميع البيانات إلى Excel", key=f"export_excel_{survey_id}"):
-            # إنشاء اسم ملف مناسب
-            filename = re.sub(r'[^\w\-_]', '_', survey_name) + "_كامل_" + datetime.now().strftime("%Y%m%d_%H%M") + ".xlsx"
-            
-            # إنشاء ملف Excel متعدد الأوراق
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                # 1. ورقة ملخص الإجابات
-                df.to_excel(writer, sheet_name='ملخص_الإجابات', index=False)
-                
-                # 2. ورقة تفاصيل جميع الإجابات
-                all_details = []
-                for response in responses:
-                    cursor.execute('''
-                        SELECT sf.field_label, rd.answer_value, 
-                               u.username as entered_by, 
-                               r.submission_date as entry_date,
-                               r.is_completed
-                        FROM Response_Details rd
-                        JOIN Survey_Fields sf ON rd.field_id = sf.field_id
-                        JOIN Responses r ON rd.response_id = r.response_id
-                        JOIN Users u ON r.user_id = u.user_id
-                        WHERE rd.response_id = %s
-                        ORDER BY sf.field_order
-                    ''', (response[0],))
-                    details = cursor.fetchall()
-                    
-                    for detail in details:
-                        all_details.append({
-                            "ID الإجابة": response[0],
-                            "الحقل": detail[0],
-                            "القيمة": detail[1],
-                            "أدخلها": detail[2],
-                            "تاريخ الإدخال": detail[3],
-                            "حالة الإجابة": "مكتملة" if detail[4] else "مسودة"
-                        })
-                
-                if all_details:
-                    details_df = pd.DataFrame(all_details)
-                    details_df.to_excel(writer, sheet_name='تفاصيل_الإجابات', index=False)
-                
-                # 3. ورقة حقول الاستبيان
-                cursor.execute('''
-                    SELECT field_label, field_type, field_options, is_required
-                    FROM Survey_Fields
-                    WHERE survey_id = %s
-                    ORDER BY field_order
-                ''', (survey_id,))
-                fields = cursor.fetchall()
-                
-                fields_df = pd.DataFrame(
-                    [(f[0], f[1], json.loads(f[2]) if f[2] else None, "نعم" if f[3] else "لا") for f in fields],
-                    columns=["اسم الحقل", "نوع الحقل", "الخيارات", "مطلوب"]
-                )
-                fields_df.to_excel(writer, sheet_name='حقول_الاستبيان', index=False)
-                
-                # 4. ورقة المستخدمين الذين أدخلوا بيانات
-                users_df = pd.DataFrame(
-                    [(r[1], r[2], r[3], r[4], "مكتملة" if r[5] else "مسودة") for r in responses],
-                    columns=["المستخدم", "الإدارة الصحية", "المحافظة", "تاريخ التقديم", "الحالة"]
-                )
-                users_df.drop_duplicates().to_excel(writer, sheet_name='المستخدمين', index=False)
-   
-            # تقديم ملف للتنزيل
-            with open(filename, "rb") as f:
-                st.download_button(
-                    label="تنزيل ملف Excel الكامل",
-                    data=f,
-                    file_name=filename,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key=f"download_excel_{survey_id}"
-                )
-            st.success("تم إنشاء ملف Excel الشامل بنجاح")
+        # التصدير يعمل في الخلفية، ويمكن مغادرة الصفحة والعودة لتنزيل الملف
+        show_survey_export(survey_id)
 
         # عرض تفاصيل إجابة محددة
         selected_response_id = st.selectbox(
@@ -820,12 +799,23 @@ def display_survey_data(survey_id):
                 **المستخدم:** {response_info[2]}  
                 **الإدارة الصحية:** {response_info[3]}  
                 **المحافظة:** {response_info[4]}  
-                **تاريخ التقديم:** {response_info[5]}
+                **تاريخ التقديم:** {response_info[5]}  
+                **إصدار الاستبيان:** {response_info[6]}
                 """)
                 
                 details = get_response_details(selected_response_id)
+                # التحقق والخيارات من إصدار الاستبيان الذي عُبئت عليه الإجابة
+                response_schema = get_compiled_survey(survey_id, response_info[6])
+                if response_schema is None:
+                    return
                 updates = {}  # لتخزين التعديلات
-                
+                errors = {}  # أخطاء التحقق من أنواع القيم
+
+                # رقم إصدار الإجابة عند فتحها، للتحقق من عدم تعديلها من مسؤول آخر قبل الحفظ
+                version_key = f"response_version_{selected_response_id}"
+                if version_key not in st.session_state:
+                    st.session_state[version_key] = response_info[7]
+
                 # استخدم نموذج لتجميع التعديلات
                 with st.form(key=f"edit_response_form_{selected_response_id}"):
                     for detail in details:
@@ -836,7 +826,7 @@ def display_survey_data(survey_id):
                             st.markdown(f"**{label}**")
                         with col2:
                             if field_type == 'dropdown':
-                                options_list = json.loads(options) if options else []
+                                options_list = response_schema.options(field_id)
                                 new_value = st.selectbox(
                                     label,
                                     options_list,
@@ -852,34 +842,121 @@ def display_survey_data(survey_id):
                             
                             if new_value != answer:
                                 updates[detail_id] = new_value
-                    
+                                field = response_schema.by_id.get(field_id)
+                                error = field.validate(new_value) if field else None
+                                if error:
+                                    errors[label] = error
+
                     # زر حفظ التعديلات
                     col1, col2 = st.columns(2)
                     with col1:
                         save_clicked = st.form_submit_button("💾 حفظ جميع التعديلات")
                         if save_clicked:
-                            if updates:
-                                success_count = 0
-                                for detail_id, new_value in updates.items():
-                                    if update_response_detail(detail_id, new_value):
-                                        success_count += 1
-                                
-                                if success_count == len(updates):
+                            if errors:
+                                st.error("قيم غير صالحة: " + "، ".join(f"{k} ({v})" for k, v in errors.items()))
+                            elif updates:
+                                # عند التعارض يبقى رقم الإصدار القديم فلا يُحفظ فوق تعديل الآخر حتى إعادة التحميل
+                                if update_response_details(
+                                    selected_response_id, updates, st.session_state[version_key]
+                                ):
+                                    del st.session_state[version_key]
                                     st.success("تم تحديث جميع التعديلات بنجاح")
+                                    st.rerun()
                                 else:
-                                    st.error(f"تم تحديث {success_count} من أصل {len(updates)} تعديلات")
-                                st.rerun()
+                                    st.warning("اضغط «إلغاء التعديلات» لإعادة تحميل أحدث نسخة من الإجابة")
                             else:
                                 st.info("لم تقم بإجراء أي تعديلات")
                     with col2:
                         cancel_clicked = st.form_submit_button("❌ إلغاء التعديلات")
                         if cancel_clicked:
+                            reset_response_editor(selected_response_id, details)
                             st.rerun()
     except Exception as e:
         st.error(f"حدث خطأ في قاعدة البيانات: {str(e)}")
     finally:
         conn.close()
         
+# نوع التصدير في الواجهة: (الوصف، زر التصدير، زر إعادة التصدير، زر التنزيل)
+EXPORT_MODES = {
+    'full': ("كل البيانات", "تصدير شامل لجميع البيانات إلى Excel", "إعادة التصدير الشامل",
+             "تنزيل ملف Excel الكامل"),
+    'delta': ("التغييرات منذ آخر تصدير لي", "تصدير التغييرات إلى Excel", "تصدير التغييرات إلى Excel",
+              "تنزيل ملف التغييرات"),
+    'governorate': ("ملف لكل محافظة (zip)", "تصدير حزمة المحافظات", "إعادة تصدير حزمة المحافظات",
+                    "تنزيل حزمة المحافظات"),
+    'region': ("ملف لكل إدارة صحية (zip)", "تصدير حزمة الإدارات الصحية", "إعادة تصدير حزمة الإدارات الصحية",
+               "تنزيل حزمة الإدارات الصحية"),
+    'csv': ("جدول CSV للتحليل", "تصدير جدول CSV", "إعادة تصدير جدول CSV", "تنزيل ملف CSV"),
+    'parquet': ("جدول Parquet للتحليل", "تصدير جدول Parquet", "إعادة تصدير جدول Parquet", "تنزيل ملف Parquet"),
+}
+
+EXPORT_MIME_TYPES = {
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    'zip': "application/zip",
+    'csv': "text/csv",
+    'parquet': "application/vnd.apache.parquet",
+}
+
+def show_survey_export(survey_id):
+    """زر التصدير (الشامل أو التغييرات فقط أو حزمة لكل محافظة) وحالة آخر مهمة تصدير خلفية للاستبيان"""
+    user_id = st.session_state.get('user_id')
+    mode = st.radio(
+        "نوع التصدير",
+        list(EXPORT_MODES),
+        format_func=lambda m: EXPORT_MODES[m][0],
+        horizontal=True,
+        key=f"export_mode_{survey_id}"
+    )
+
+    if mode == 'delta':
+        checkpoint = get_export_checkpoint(user_id, survey_id)
+        if checkpoint:
+            st.caption(f"آخر تصدير للتغييرات: {checkpoint[2]:%Y-%m-%d %H:%M} (حتى الإجابة #{checkpoint[0]})")
+        else:
+            st.caption("لا يوجد تصدير سابق للتغييرات، سيتم تصدير جميع الإجابات الحالية")
+
+    job = latest_survey_export(survey_id, mode, user_id)
+    active = job is not None and job['status'] in ('queued', 'running')
+    _, label, again_label, _ = EXPORT_MODES[mode]
+    if job is not None and job['status'] == 'done':
+        label = again_label
+    if st.button(label, key=f"export_{mode}_{survey_id}", disabled=active):
+        job = submit_survey_export(survey_id, user_id, force=job is not None, mode=mode)
+        active = job['status'] in ('queued', 'running')
+
+    if job is not None:
+        # تحديث حالة المهمة كل ثانيتين أثناء التشغيل دون إعادة تحميل الصفحة كلها
+        st.fragment(show_export_status, run_every=2 if active else None)(survey_id, active, mode)
+
+def show_export_status(survey_id, was_active, mode='full'):
+    """تقدم مهمة التصدير أو زر تنزيل نتيجتها"""
+    job = latest_survey_export(survey_id, mode, st.session_state.get('user_id'))
+    if job is None:
+        return
+    if job['status'] in ('queued', 'running'):
+        total = job['progress_total'] or 0
+        done = job['progress_done'] or 0
+        st.progress(min(done / total, 1.0) if total else 0.0,
+                    text=f"جاري التصدير في الخلفية... {done} من {total} إجابة")
+    elif was_active:
+        # انتهت المهمة: إعادة تحميل الصفحة لإيقاف التحديث الدوري
+        st.rerun()
+    elif job['status'] == 'done':
+        data = read_export_result(job)
+        if data is None:
+            st.warning("ملف التصدير لم يعد متاحًا، يرجى التصدير مرة أخرى")
+            return
+        st.download_button(
+            label=EXPORT_MODES[mode][3],
+            data=data,
+            file_name=job['result_name'],
+            mime=EXPORT_MIME_TYPES.get(job['result_name'].rsplit('.', 1)[-1], "application/octet-stream"),
+            key=f"download_{mode}_{survey_id}_{job['job_id']}"
+        )
+        st.caption(f"تم الإنشاء في {job['finished_at']:%Y-%m-%d %H:%M} ومتاح حتى {job['expires_at']:%Y-%m-%d %H:%M}")
+    else:
+        st.error(f"فشل التصدير: {job['error']}")
+
 def view_data():
     st.header("عرض البيانات المجمعة")
     
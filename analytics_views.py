@@ -0,0 +1,220 @@
+import streamlit as st
+import pandas as pd
+from datetime import date, timedelta
+from database import (
+    get_analytics_surveys,
+    get_survey_field_labels,
+    get_field_distribution,
+    get_survey_rollup,
+    get_submission_trend,
+    get_field_crosstab,
+    get_governorates_list,
+    get_governorate_health_admins,
+    get_analytics_source_status
+)
+from jobs import refresh_replica
+from profiling import section
+
+def show_analytics():
+    """تحليلات الاستبيانات (من النسخة التحليلية إن كانت مفعلة حتى لا تبطئ إدخال البيانات)"""
+    st.header("تحليلات الاستبيانات")
+
+    with section("analytics_source"):
+        show_analytics_source()
+
+    surveys = get_analytics_surveys()
+    if not surveys:
+        st.info("لا توجد إجابات لتحليلها بعد")
+        return
+    survey_names = dict(surveys)
+    survey_id = st.selectbox("اختر الاستبيان", options=list(survey_names),
+                             format_func=lambda sid: survey_names[sid], key="analytics_survey")
+
+    with section("rollup_report"):
+        levels = show_rollup_report(survey_id)
+
+    if levels:
+        with section("submission_trend"):
+            show_submission_trend(survey_id, levels)
+
+    with section("field_distribution"):
+        show_field_distribution(survey_id)
+
+def show_analytics_source():
+    """مصدر البيانات وعمر النسخة التحليلية، مع طلب مزامنة إذا كانت قديمة"""
+    status = get_analytics_source_status()
+    job = refresh_replica(st.session_state.get('user_id'))
+    if status is None and job is None:
+        st.caption("التحليلات من قاعدة البيانات الرئيسية مباشرة")
+        return
+    if status is not None:
+        st.caption(f"التحليلات من النسخة التحليلية — آخر مزامنة {status['synced_at']:%Y-%m-%d %H:%M:%S} "
+                   f"({status['duration_ms']:.0f} ms)")
+    if job is not None:
+        st.caption("جاري تحديث النسخة التحليلية في الخلفية...")
+    elif st.button("تحديث النسخة الآن", key="refresh_replica"):
+        refresh_replica(st.session_state.get('user_id'), force=True)
+        st.info("بدأ تحديث النسخة التحليلية في الخلفية")
+
+ROLLUP_COLUMNS = ["الإجابات", "المكتملة", "الإدارات المشاركة", "الموظفون", "آخر إجابة"]
+
+def _rollup_frame(rows, name_index, name_label):
+    """جدول مستوى من التقرير الهرمي بعمود الاسم ومقاييس المستوى"""
+    df = pd.DataFrame([(row[name_index],) + tuple(row[7:]) for row in rows],
+                      columns=[name_label] + ROLLUP_COLUMNS)
+    df["نسبة الإكمال %"] = (df["المكتملة"] * 100 / df["الإجابات"]).round(1)
+    return df
+
+def show_rollup_report(survey_id):
+    """الإجمالي ثم التفصيل حسب المحافظة ثم الإدارة الصحية ثم الموظف، وإرجاع صفوف كل مستوى"""
+    st.subheader("التقرير الهرمي")
+    rows = get_survey_rollup(survey_id)
+    if not rows:
+        st.info("لا توجد إجابات لهذا الاستبيان")
+        return None
+    levels = {depth: [row for row in rows if row[0] == depth] for depth in range(4)}
+    total = levels[0][0]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("إجمالي الإجابات", total[7])
+    col2.metric("الإجابات المكتملة", total[8], f"{total[8] * 100 / total[7]:.1f}%", delta_color="off")
+    col3.metric("الإدارات المشاركة", total[9])
+    col4.metric("الموظفون", total[10])
+
+    by_governorate = _rollup_frame(levels[1], 2, "المحافظة")
+    st.dataframe(by_governorate, use_container_width=True, hide_index=True)
+    st.bar_chart(by_governorate.set_index("المحافظة")[["المكتملة"]])
+    governorates = {row[1]: row[2] for row in levels[1]}
+    governorate_id = st.selectbox("تفاصيل المحافظة", options=list(governorates),
+                                  format_func=lambda gid: governorates[gid],
+                                  key=f"rollup_governorate_{survey_id}")
+    admins = [row for row in levels[2] if row[1] == governorate_id]
+    st.dataframe(_rollup_frame(admins, 4, "الإدارة الصحية"), use_container_width=True, hide_index=True)
+    admin_names = {row[3]: row[4] for row in admins}
+    admin_id = st.selectbox("تفاصيل الإدارة الصحية", options=list(admin_names),
+                            format_func=lambda aid: admin_names[aid],
+                            key=f"rollup_admin_{survey_id}_{governorate_id}")
+    employees = [row for row in levels[3] if row[3] == admin_id]
+    st.dataframe(_rollup_frame(employees, 6, "الموظف").drop(columns=["الإدارات المشاركة", "الموظفون"]),
+                 use_container_width=True, hide_index=True)
+    return levels
+
+# الفترة المعروضة في الاتجاهات: عدد الأسابيع
+TREND_PERIODS = {4: "4 أسابيع", 12: "3 أشهر", 26: "6 أشهر", 52: "سنة"}
+
+def show_submission_trend(survey_id, levels):
+    """الإجابات المكتملة يوميًا مع المتوسطات المتحركة ومقارنة كل أسبوع بالذي قبله"""
+    st.subheader("اتجاهات الإرسال")
+    governorates = {row[1]: row[2] for row in levels[1]}
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        weeks = st.selectbox("الفترة", options=list(TREND_PERIODS), format_func=TREND_PERIODS.get,
+                             key=f"trend_weeks_{survey_id}")
+    with col2:
+        governorate_id = st.selectbox("المحافظة", options=[None] + list(governorates),
+                                      format_func=lambda gid: "الكل" if gid is None else governorates[gid],
+                                      key=f"trend_governorate_{survey_id}")
+    admins = {row[3]: row[4] for row in levels[2] if row[1] == governorate_id}
+    with col3:
+        region_id = st.selectbox("الإدارة الصحية", options=[None] + list(admins),
+                                 format_func=lambda aid: "الكل" if aid is None else admins[aid],
+                                 key=f"trend_region_{survey_id}_{governorate_id}")
+
+    end = date.today()
+    rows = get_submission_trend(end - timedelta(weeks=weeks) + timedelta(days=1), end,
+                                survey_id, governorate_id, region_id)
+    if not rows:
+        return
+    df = pd.DataFrame(rows, columns=["اليوم", "الإجابات", "متوسط 7 أيام", "متوسط 28 يومًا",
+                                     "آخر 7 أيام", "الأيام 7 السابقة"])
+    df["اليوم"] = pd.to_datetime(df["اليوم"])
+    df[["متوسط 7 أيام", "متوسط 28 يومًا"]] = df[["متوسط 7 أيام", "متوسط 28 يومًا"]].astype(float).round(2)
+
+    latest = df.iloc[-1]
+    previous_week = int(latest["الأيام 7 السابقة"])
+    change = (f"{(latest['آخر 7 أيام'] - previous_week) * 100 / previous_week:+.0f}%"
+              if previous_week else None)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("اليوم", int(latest["الإجابات"]))
+    col2.metric("آخر 7 أيام", int(latest["آخر 7 أيام"]), change)
+    col3.metric("المتوسط اليومي (28 يومًا)", f"{latest['متوسط 28 يومًا']:.1f}")
+
+    st.line_chart(df.set_index("اليوم")[["الإجابات", "متوسط 7 أيام", "متوسط 28 يومًا"]])
+
+    # كل أسبوع ينتهي في نفس يوم الأسبوع الحالي مقارنة بالأسبوع الذي قبله
+    weekly = df.iloc[::-7][["اليوم", "آخر 7 أيام", "الأيام 7 السابقة"]].rename(
+        columns={"اليوم": "نهاية الأسبوع", "آخر 7 أيام": "الأسبوع", "الأيام 7 السابقة": "الأسبوع السابق"})
+    weekly["التغير %"] = ((weekly["الأسبوع"] - weekly["الأسبوع السابق"]) * 100
+                          / weekly["الأسبوع السابق"].where(weekly["الأسبوع السابق"] > 0)).round(1)
+    weekly["نهاية الأسبوع"] = weekly["نهاية الأسبوع"].dt.date
+    st.dataframe(weekly, use_container_width=True, hide_index=True)
+
+def show_field_distribution(survey_id):
+    st.subheader("توزيع الإجابات")
+    fields = get_survey_field_labels(survey_id)
+    if not fields:
+        return
+    field_label = st.selectbox("اختر الحقل", options=[label for label, _ in fields],
+                               key=f"analytics_field_{survey_id}")
+    rows = get_field_distribution(survey_id, field_label)
+    if not rows:
+        st.info("لا توجد إجابات مكتملة لهذا الحقل")
+        return
+    df = pd.DataFrame(rows, columns=["القيمة", "العدد"])
+    st.bar_chart(df.set_index("القيمة"))
+    st.caption(f"القيم الأكثر تكرارًا في الإجابات المكتملة ({len(df)})")
+
+# طرق عرض الجدول التقاطعي: اسم الطريقة -> معامل normalize في pandas.crosstab
+CROSSTAB_VIEWS = {"العدد": False, "نسبة من الصف %": 'index', "نسبة من العمود %": 'columns'}
+
+def show_crosstab(survey_id):
+    """جدول تقاطعي بين حقلين من الاستبيان مع تصفية اختيارية حسب المحافظة أو الإدارة الصحية"""
+    fields = get_survey_field_labels(survey_id)
+    if len(fields) < 2:
+        st.info("يحتاج الجدول التقاطعي إلى حقلين على الأقل في الاستبيان")
+        return
+    labels = [label for label, _ in fields]
+    col1, col2 = st.columns(2)
+    with col1:
+        row_label = st.selectbox("حقل الصفوف", options=labels, key=f"crosstab_rows_{survey_id}")
+    with col2:
+        column_label = st.selectbox("حقل الأعمدة", options=labels, index=1, key=f"crosstab_columns_{survey_id}")
+
+    # قوائم التصفية من الجداول المرجعية الصغيرة وليس من إجابات الاستبيان
+    governorates = dict(get_governorates_list())
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        governorate_id = st.selectbox("المحافظة", options=[None] + list(governorates),
+                                      format_func=lambda gid: "الكل" if gid is None else governorates[gid],
+                                      key=f"crosstab_governorate_{survey_id}")
+    admins = dict(get_governorate_health_admins(governorate_id)) if governorate_id is not None else {}
+    with col2:
+        region_id = st.selectbox("الإدارة الصحية", options=[None] + list(admins),
+                                 format_func=lambda aid: "الكل" if aid is None else admins[aid],
+                                 key=f"crosstab_region_{survey_id}_{governorate_id}")
+    with col3:
+        view = st.radio("العرض", options=list(CROSSTAB_VIEWS), horizontal=True, key=f"crosstab_view_{survey_id}")
+
+    rows = get_field_crosstab(survey_id, row_label, column_label, governorate_id, region_id)
+    if not rows:
+        st.info("لا توجد إجابات مكتملة فيها الحقلان معًا")
+        return
+    table = crosstab_table(rows, row_label, column_label, view)
+    margins = CROSSTAB_VIEWS[view] is False
+    st.dataframe(table, use_container_width=True)
+    st.caption(f"{sum(row[2] for row in rows)} إجابة مكتملة فيها الحقلان، "
+               f"{table.shape[0] - margins} قيمة في الصفوف و {table.shape[1] - margins} في الأعمدة")
+
+def crosstab_table(rows, row_label, column_label, view="العدد"):
+    """ترتيب أعداد (قيمة الصف، قيمة العمود، العدد) في جدول تقاطعي بطريقة العرض المختارة
+
+    أسماء الأعمدة داخلية ثابتة ثم تُسمى المحاور بالحقلين، فيعمل الجدول أيضًا عند اختيار نفس الحقل مرتين.
+    """
+    counts = pd.DataFrame(rows, columns=["row", "column", "count"]).fillna("")
+    normalize = CROSSTAB_VIEWS[view]
+    # الأعداد مجمعة في قاعدة البيانات، و crosstab هنا يرتبها في جدول فقط
+    table = pd.crosstab(counts["row"], counts["column"], values=counts["count"], aggfunc="sum",
+                        margins=normalize is False, margins_name="الإجمالي",
+                        normalize=normalize).fillna(0)
+    table = (table * 100).round(1) if normalize else table.astype(int)
+    table.index.name, table.columns.name = row_label, column_label
+    return table
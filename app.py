@@ -1,15 +1,26 @@
 import streamlit as st
 from datetime import datetime, timedelta 
+
+# تحميل متغيرات البيئة من ملف .env قبل استيراد وحدات المشروع، لأن بعضها يقرأ إعداداته
+# عند الاستيراد (SLOW_QUERY_MS و N_PLUS_ONE و JOB_WORKERS و EXPORT_CACHE_DIR وغيرها)
+from dotenv import load_dotenv
+load_dotenv()
+
 from auth import authenticate, logout
 from admin_views import show_admin_dashboard
 from employee_views import show_employee_dashboard
 from database import init_db, get_user_role
 from governorate_admin_views import show_governorate_admin_dashboard
+from debug_views import record_rerun, show_query_debug_panel, record_profile, show_profile_panel
+from storage import instrumentation
+from contextlib import nullcontext
+import metrics
+import profiling
 import os
+import uuid
 
-# تحميل متغيرات البيئة من ملف .env
-from dotenv import load_dotenv
-load_dotenv()
+# خادم مقاييس Prometheus (مرة واحدة لكل عملية، فقط إذا تم تحديد METRICS_PORT)
+metrics.start_server()
 
 # تهيئة قاعدة البيانات
 init_db()
@@ -17,23 +28,49 @@ init_db()
 def main():
     st.set_page_config(page_title="نظام إدارة الاستبيانات", page_icon="📋", layout="wide")
     
-    # التحقق من حالة الجلسة
-    if authenticate():  # إذا كان مسجل الدخول
-        # تحديث وقت النشاط عند كل تفاعل
-        st.session_state.last_activity = datetime.now()
-        
-        # عرض واجهة المستخدم حسب الدور
-        user_role = get_user_role(st.session_state.user_id)
-        
-        # زر تسجيل الخروج
-        st.sidebar.button("تسجيل الخروج", on_click=logout)
-        
-        if user_role == 'admin':
-            show_admin_dashboard()
-        elif user_role == 'governorate_admin':
-            show_governorate_admin_dashboard()
-        else:
-            show_employee_dashboard()
+    # قياس استعلامات قاعدة البيانات في كل إعادة تشغيل للصفحة
+    show_debug = False
+    user_role = None
+    metrics.touch_session(st.session_state.setdefault('metrics_session', uuid.uuid4().hex))
+    with instrumentation.scope("rerun") as query_stats:
+        # التحقق من حالة الجلسة
+        if authenticate():  # إذا كان مسجل الدخول
+            # تحديث وقت النشاط عند كل تفاعل
+            st.session_state.last_activity = datetime.now()
+            
+            # عرض واجهة المستخدم حسب الدور
+            user_role = get_user_role(st.session_state.user_id)
+            
+            # زر تسجيل الخروج
+            st.sidebar.button("تسجيل الخروج", on_click=logout)
+            
+            # لوحة أداء الاستعلامات متاحة لمسؤول النظام فقط
+            if user_role == 'admin':
+                show_debug = st.sidebar.checkbox("عرض أداء قاعدة البيانات", key="show_query_debug")
+            
+            # قياس أداء الصفحة (زمن الأقسام و cProfile والذاكرة) لمسؤول النظام، ولجميع الأدوار إذا تم تحديد PROFILING
+            profile = False
+            if user_role == 'admin' or os.getenv('PROFILING'):
+                profile = st.sidebar.checkbox("قياس أداء الصفحة (cProfile والذاكرة)", key="profile_pages")
+            
+            if user_role == 'admin':
+                page, show_dashboard = 'admin_dashboard', show_admin_dashboard
+            elif user_role == 'governorate_admin':
+                page, show_dashboard = 'governorate_admin_dashboard', show_governorate_admin_dashboard
+            else:
+                page, show_dashboard = 'employee_dashboard', show_employee_dashboard
+            
+            with profiling.profile_page(page) if profile else nullcontext() as page_profile:
+                if page_profile:
+                    record_profile(page_profile)
+                show_dashboard()
+    
+    metrics.PAGE_SECONDS.observe(query_stats.elapsed_ms / 1000, role=user_role or 'anonymous')
+    record_rerun(query_stats)
+    if show_debug:
+        show_query_debug_panel(query_stats)
+    if st.session_state.get('profile_pages'):
+        show_profile_panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,7 +1,8 @@
 import streamlit as st
-import hashlib
 from datetime import datetime, timedelta
 from database import get_user_by_username, update_last_login, init_db, update_user_activity
+from storage import hash_password
+import metrics
 import os
 
 def authenticate():
@@ -27,6 +28,7 @@ def authenticate():
         if submitted:
             user = get_user_by_username(username)
             if user and check_password(user['password_hash'], password):
+                metrics.LOGIN_ATTEMPTS.inc(result='success')
                 # إنشاء جلسة جديدة
                 st.session_state.authenticated = True
                 st.session_state.user_id = user['user_id']
@@ -39,15 +41,13 @@ def authenticate():
                 st.rerun()
                 return True
             else:
+                metrics.LOGIN_ATTEMPTS.inc(result='failure')
                 st.error("اسم المستخدم أو كلمة المرور غير صحيحة")
     return False
 
 def check_password(hashed_password, user_password):
     return hashed_password == hash_password(user_password)
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def logout():
     keys = list(st.session_state.keys())
     for key in keys:
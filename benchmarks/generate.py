@@ -0,0 +1,223 @@
+"""توليد بيانات اصطناعية قابلة للتكرار لقياس الأداء
+
+    python -m benchmarks.generate --scale medium
+
+يعمل على قاعدة SQLite في bench.db افتراضيًا (DB_BACKEND=sqlite و SQLITE_PATH=bench.db)
+ما لم تُحدد متغيرات البيئة غير ذلك. نفس --seed ونفس الحجم ينتجان نفس البيانات.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+os.environ.setdefault('SQLITE_PATH', 'bench.db')
+
+import storage
+from storage.backends import execute_values
+from storage.core import connection
+from storage.survey_schema import FIELD_TYPES
+
+SCALES = {
+    # محافظات، إدارات لكل محافظة، مستخدمون، استبيانات، حقول لكل استبيان، إجابات، سجلات تعديل
+    'small': dict(governorates=5, admins_per_governorate=4, users=200, surveys=20,
+                  fields_per_survey=10, responses=5_000, audit_entries=2_000),
+    'medium': dict(governorates=27, admins_per_governorate=10, users=5_000, surveys=200,
+                   fields_per_survey=15, responses=100_000, audit_entries=50_000),
+    'large': dict(governorates=27, admins_per_governorate=20, users=20_000, surveys=500,
+                  fields_per_survey=20, responses=250_000, audit_entries=200_000),
+}
+
+BATCH_SIZE = 5_000
+DROPDOWN_OPTIONS = ["خيار أ", "خيار ب", "خيار ج", "خيار د"]
+
+def _log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+def _insert(sql: str, rows, page_size: int = 1000):
+    """إدراج الصفوف على دفعات، كل دفعة في معاملة مستقلة"""
+    for start in range(0, len(rows), BATCH_SIZE):
+        with connection() as conn:
+            execute_values(conn.cursor(), sql, rows[start:start + BATCH_SIZE], page_size=page_size)
+
+def _ids(sql: str, params=()):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+def _max_id(table: str, column: str) -> int:
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")
+        return cursor.fetchone()[0]
+
+def _answer(rng: random.Random, field_type: str, day: datetime) -> str:
+    if field_type == 'number':
+        return str(rng.randint(0, 500))
+    if field_type == 'dropdown':
+        return rng.choice(DROPDOWN_OPTIONS)
+    if field_type == 'checkbox':
+        return rng.choice(("True", "False"))
+    if field_type == 'date':
+        return day.date().isoformat()
+    return f"ملاحظة {rng.randint(1, 10_000)}"
+
+def generate(governorates: int, admins_per_governorate: int, users: int, surveys: int,
+             fields_per_survey: int, responses: int, audit_entries: int,
+             days: int = 365, seed: int = 42) -> dict:
+    """إنشاء البيانات وإرجاع عدد الصفوف المضافة لكل جدول"""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    storage.init_db()
+    prefix = f"bench{_max_id('Users', 'user_id')}"
+
+    # 1. المحافظات والإدارات الصحية
+    _insert("INSERT INTO Governorates (governorate_name, description) VALUES %s",
+            [(f"{prefix} محافظة {g}", "بيانات قياس") for g in range(governorates)])
+    governorate_ids = _ids("SELECT governorate_id FROM Governorates WHERE governorate_name LIKE %s "
+                           "ORDER BY governorate_id", (f"{prefix} %",))
+    _insert("INSERT INTO HealthAdministrations (admin_name, description, governorate_id) VALUES %s",
+            [(f"{prefix} إدارة {g}-{a}", "بيانات قياس", gov_id)
+             for g, gov_id in enumerate(governorate_ids) for a in range(admins_per_governorate)])
+    admins = {}
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT admin_id, governorate_id FROM HealthAdministrations WHERE admin_name LIKE %s",
+                       (f"{prefix} %",))
+        for admin_id, gov_id in cursor.fetchall():
+            admins[admin_id] = gov_id
+    admin_ids = sorted(admins)
+    _log(f"المحافظات: {len(governorate_ids)}، الإدارات الصحية: {len(admin_ids)}")
+
+    # 2. المستخدمون (كلمة المرور لكل المستخدمين: bench)
+    password_hash = storage.hash_password("bench")
+    user_region = {}
+    _insert("INSERT INTO Users (username, password_hash, role, assigned_region) VALUES %s",
+            [(f"{prefix}_user_{u}", password_hash, 'employee', rng.choice(admin_ids)) for u in range(users)])
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id, assigned_region FROM Users WHERE username LIKE %s ORDER BY user_id",
+                       (f"{prefix}_user_%",))
+        user_region = dict(cursor.fetchall())
+    user_ids = sorted(user_region)
+    _log(f"المستخدمون: {len(user_ids)}")
+
+    # 3. الاستبيانات وحقولها والمحافظات المسموح لها
+    creator = _ids("SELECT user_id FROM Users WHERE role = 'admin' ORDER BY user_id LIMIT 1")[0]
+    _insert("INSERT INTO Surveys (survey_name, created_by, created_at) VALUES %s",
+            [(f"{prefix} استبيان {s}", creator, now - timedelta(days=rng.randint(days, days * 2)))
+             for s in range(surveys)])
+    survey_ids = _ids("SELECT survey_id FROM Surveys WHERE survey_name LIKE %s ORDER BY survey_id",
+                      (f"{prefix} %",))
+    field_rows = []
+    for survey_id in survey_ids:
+        for order in range(1, fields_per_survey + 1):
+            field_type = FIELD_TYPES[(survey_id + order) % len(FIELD_TYPES)]
+            options = json.dumps(DROPDOWN_OPTIONS, ensure_ascii=False) if field_type == 'dropdown' else None
+            field_rows.append((survey_id, field_type, f"سؤال {order}", options, order % 3 == 0, order))
+    _insert("""INSERT INTO Survey_Fields
+               (survey_id, field_type, field_label, field_options, is_required, field_order) VALUES %s""",
+            field_rows)
+    survey_fields = {sid: [] for sid in survey_ids}
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT survey_id, field_id, field_type FROM Survey_Fields WHERE survey_id = ANY(%s) "
+                       "ORDER BY survey_id, field_order", (survey_ids,))
+        for survey_id, field_id, field_type in cursor.fetchall():
+            survey_fields[survey_id].append((field_id, field_type))
+
+    surveys_by_governorate = {gov_id: [] for gov_id in governorate_ids}
+    survey_governorates = []
+    for survey_id in survey_ids:
+        for gov_id in rng.sample(governorate_ids, rng.randint(1, min(5, len(governorate_ids)))):
+            surveys_by_governorate[gov_id].append(survey_id)
+            survey_governorates.append((survey_id, gov_id))
+    _insert("INSERT INTO SurveyGovernorate (survey_id, governorate_id) VALUES %s", survey_governorates)
+
+    allowed = {}
+    user_surveys = []
+    for user_id in user_ids:
+        candidates = surveys_by_governorate[admins[user_region[user_id]]]
+        allowed[user_id] = rng.sample(candidates, min(len(candidates), rng.randint(1, 5))) if candidates else []
+        user_surveys.extend((user_id, survey_id) for survey_id in allowed[user_id])
+    _insert("INSERT INTO UserSurveys (user_id, survey_id) VALUES %s", user_surveys)
+    _log(f"الاستبيانات: {len(survey_ids)}، الحقول: {len(field_rows)}")
+
+    # 4. الإجابات وتفاصيلها على دفعات: يُقرأ رقم أول إجابة في الدفعة ثم تُضاف التفاصيل
+    respondents = [user_id for user_id in user_ids if allowed[user_id]]
+    details_total = 0
+    started = time.perf_counter()
+    for start in range(0, responses, BATCH_SIZE):
+        batch = []
+        for _ in range(min(BATCH_SIZE, responses - start)):
+            user_id = rng.choice(respondents)
+            submitted = now - timedelta(days=rng.randint(0, days), seconds=rng.randint(0, 86_399))
+            batch.append((rng.choice(allowed[user_id]), user_id, user_region[user_id],
+                          submitted, rng.random() < 0.9))
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(response_id), 0) FROM Responses")
+            first_id = cursor.fetchone()[0] + 1
+            execute_values(cursor, """INSERT INTO Responses
+                (survey_id, user_id, region_id, submission_date, is_completed) VALUES %s""",
+                batch, page_size=1000)
+            cursor.execute("SELECT response_id FROM Responses WHERE response_id >= %s ORDER BY response_id",
+                           (first_id,))
+            response_ids = [row[0] for row in cursor.fetchall()]
+            details = [
+                (response_id, field_id, _answer(rng, field_type, row[3]))
+                for response_id, row in zip(response_ids, batch)
+                for field_id, field_type in survey_fields[row[0]]
+            ]
+            execute_values(cursor, "INSERT INTO Response_Details (response_id, field_id, answer_value) VALUES %s",
+                           details, page_size=1000)
+        details_total += len(details)
+        _log(f"\rالإجابات: {start + len(batch)}/{responses}، التفاصيل: {details_total} "
+             f"({time.perf_counter() - started:.0f} ث)")
+
+    # 5. سجل التعديلات
+    _insert("""INSERT INTO AuditLog
+               (user_id, action_type, table_name, record_id, old_value, new_value, action_timestamp) VALUES %s""",
+            [(rng.choice(user_ids), rng.choice(('INSERT', 'UPDATE', 'DELETE')),
+              rng.choice(('Users', 'Surveys', 'Response_Details')), rng.randint(1, responses),
+              json.dumps({'value': rng.randint(1, 100)}), json.dumps({'value': rng.randint(1, 100)}),
+              now - timedelta(days=rng.randint(0, days), seconds=rng.randint(0, 86_399)))
+             for _ in range(audit_entries)])
+
+    return {
+        'governorates': len(governorate_ids),
+        'health_administrations': len(admin_ids),
+        'users': len(user_ids),
+        'surveys': len(survey_ids),
+        'survey_fields': len(field_rows),
+        'responses': responses,
+        'response_details': details_total,
+        'audit_log': audit_entries,
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="توليد بيانات اصطناعية لقياس الأداء")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--days', type=int, default=365, help="مدى تواريخ الإجابات بالأيام")
+    for name in SCALES['small']:
+        parser.add_argument('--' + name.replace('_', '-'), type=int, help="تجاوز قيمة الحجم المختار")
+    args = parser.parse_args(argv)
+
+    sizes = dict(SCALES[args.scale])
+    for name in sizes:
+        if getattr(args, name) is not None:
+            sizes[name] = getattr(args, name)
+
+    started = time.perf_counter()
+    counts = generate(days=args.days, seed=args.seed, **sizes)
+    _log(f"\nاكتمل التوليد في {time.perf_counter() - started:.1f} ث")
+    print(json.dumps(counts, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""اختبار تحميل: جلسات متزامنة لموظفين ومسؤولي محافظات ومسؤولي نظام على قاعدة محلية
+
+    python -m benchmarks.generate --scale medium
+    python -m benchmarks.load --employees 50 --governorate-admins 5 --admins 2 --duration 60
+
+كل جلسة تشغّل دوال الصفحات الحقيقية عبر streamlit.testing (AppTest) بحالة جلسة خاصة بها،
+بنفس تسلسل المستخدم الحقيقي:
+- الموظف: show_employee_dashboard ثم تعبئة النموذج والإرسال (process_survey_submission)
+  ثم عرض إجاباته السابقة (employee_views.view_survey_responses)
+- مسؤول المحافظة: governorate_admin_views.view_survey_responses لاستبيانات محافظته
+- مسؤول النظام: admin_views.display_survey_data
+
+AppTest يستخدم حالة عامة على مستوى العملية، لذلك تُوزع الجلسات على --processes عملية:
+الجلسات داخل العملية الواحدة خيوط تتداخل أوقات انتظارها، لكن تنفيذ الصفحات فيها متتابع.
+عدد الصفحات التي تُنفذ في نفس اللحظة يساوي عدد العمليات.
+
+التقرير لكل نوع صفحة: عدد مرات التحميل، الإنتاجية، زمن الاستجابة (p50 / p95 / p99)،
+عدد الاستعلامات والاتصالات وزمن القاعدة، ونسبة الأخطاء (استثناء أو رسالة st.error)، مع
+أعلى عدد اتصالات مفتوحة في نفس الوقت لتحديد حجم مجمع الاتصالات.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+os.environ.setdefault('SQLITE_PATH', 'bench.db')
+
+from streamlit.testing.v1 import AppTest
+
+from storage import instrumentation
+from storage.backends import get_backend
+from storage.core import connection
+from benchmarks.run import Sample, _percentile
+
+# سكربتات الصفحات: تُنفذ داخل AppTest كتطبيق مستقل، لذلك تحتوي على استيراداتها
+def _employee_page(session, view_survey_id=None):
+    import streamlit as st
+    from storage import instrumentation
+    from employee_views import show_employee_dashboard, view_survey_responses
+    for key, value in session.items():
+        st.session_state.setdefault(key, value)
+    with instrumentation.scope('load') as stats:
+        try:
+            show_employee_dashboard()
+            if view_survey_id:
+                view_survey_responses(view_survey_id)
+        finally:
+            st.session_state['_load_stats'] = stats.summary()
+
+def _governorate_admin_page(session, survey_id, governorate_id):
+    import streamlit as st
+    from storage import instrumentation
+    from governorate_admin_views import view_survey_responses
+    for key, value in session.items():
+        st.session_state.setdefault(key, value)
+    with instrumentation.scope('load') as stats:
+        try:
+            view_survey_responses(survey_id, governorate_id)
+        finally:
+            st.session_state['_load_stats'] = stats.summary()
+
+def _admin_page(session, survey_id):
+    import streamlit as st
+    from storage import instrumentation
+    from admin_views import display_survey_data
+    for key, value in session.items():
+        st.session_state.setdefault(key, value)
+    with instrumentation.scope('load') as stats:
+        try:
+            display_survey_data(survey_id)
+        finally:
+            st.session_state['_load_stats'] = stats.summary()
+
+# AppTest يغير حالة عامة في العملية (Runtime وإعدادات streamlit) أثناء التشغيل
+_app_lock = threading.Lock()
+
+SUBMIT_LABEL = "🚀 إرسال النموذج"
+
+class Results:
+    """نتائج كل تحميل صفحة من جلسات عملية واحدة (آمنة للاستخدام من عدة خيوط)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.error_samples = []
+        self.skipped_submissions = 0
+
+    def add(self, page: str, latency_ms: float, stats: dict, error: str = None):
+        with self.lock:
+            entry = self.pages.setdefault(page, {
+                'latencies': [], 'queries': [], 'connections': [], 'db_ms': [], 'errors': 0
+            })
+            entry['latencies'].append(latency_ms)
+            entry['queries'].append(stats.get('queries', 0))
+            entry['connections'].append(stats.get('connections', 0))
+            entry['db_ms'].append(stats.get('db_ms', 0.0))
+            if error:
+                entry['errors'] += 1
+                if len(self.error_samples) < 20:
+                    self.error_samples.append(f"{page}: {error[:300]}")
+
+    def merge(self, other: dict):
+        """إضافة نتائج عملية أخرى (ناتج to_dict)"""
+        for page, entry in other['pages'].items():
+            mine = self.pages.setdefault(page, {key: [] for key in entry if key != 'errors'} | {'errors': 0})
+            for key, value in entry.items():
+                mine[key] += value
+        self.error_samples += other['error_samples'][:max(0, 20 - len(self.error_samples))]
+        self.skipped_submissions += other['skipped_submissions']
+
+    def to_dict(self) -> dict:
+        return {'pages': self.pages, 'error_samples': self.error_samples,
+                'skipped_submissions': self.skipped_submissions}
+
+    def report(self, elapsed: float) -> dict:
+        pages = {}
+        total = errors = 0
+        for page, entry in sorted(self.pages.items()):
+            latencies = entry['latencies']
+            total += len(latencies)
+            errors += entry['errors']
+            pages[page] = {
+                'count': len(latencies),
+                'per_second': round(len(latencies) / elapsed, 2),
+                'p50_ms': round(_percentile(latencies, 0.50), 1),
+                'p95_ms': round(_percentile(latencies, 0.95), 1),
+                'p99_ms': round(_percentile(latencies, 0.99), 1),
+                'max_ms': round(max(latencies), 1),
+                'avg_queries': round(statistics.fmean(entry['queries']), 1),
+                'avg_connections': round(statistics.fmean(entry['connections']), 1),
+                'avg_db_ms': round(statistics.fmean(entry['db_ms']), 1),
+                'error_rate': round(entry['errors'] / len(latencies), 4),
+            }
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'page_loads': total,
+            'per_second': round(total / elapsed, 2) if elapsed else 0,
+            'error_rate': round(errors / total, 4) if total else 0,
+            'skipped_submissions': self.skipped_submissions,
+            'pages': pages,
+            'errors': self.error_samples,
+        }
+
+def _new_app(script, session: dict, **kwargs) -> AppTest:
+    """جلسة جديدة؛ قيم session تُوضع في st.session_state عند أول تشغيل للسكربت"""
+    return AppTest.from_function(script, kwargs=dict(kwargs, session=session))
+
+def _run_page(app: AppTest, page: str, results: Results, timeout: float, action=None) -> bool:
+    """تحميل صفحة واحدة (مع تفاعل اختياري قبله) وتسجيل زمنها وأخطائها"""
+    error = None
+    stats = {}
+    with _app_lock:
+        started = time.perf_counter()
+        try:
+            if action is not None:
+                action(app)
+            app.run(timeout=timeout)
+            if app.exception:
+                error = app.exception[0].message
+            elif app.error:
+                error = app.error[0].value
+            if '_load_stats' in app.session_state:
+                stats = app.session_state['_load_stats']
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        latency = (time.perf_counter() - started) * 1000
+    results.add(page, latency, stats, error)
+    return error is None
+
+def _fill_survey_form(app: AppTest):
+    """تعبئة جميع حقول نموذج الاستبيان بقيم صالحة ثم الضغط على زر الإرسال"""
+    for widget in app.text_input:
+        if widget.key and widget.key.startswith('text_'):
+            widget.input("قيمة اختبار")
+    for widget in app.number_input:
+        if widget.key and widget.key.startswith('number_'):
+            widget.set_value(1)
+    for widget in app.checkbox:
+        if widget.key and widget.key.startswith('checkbox_'):
+            widget.check()
+    next(b for b in app.button if b.label == SUBMIT_LABEL).click()
+
+def employee_session(spec, results: Results, deadline: float, think_time: float,
+                     timeout: float, rng: random.Random):
+    """موظف واحد: يفتح لوحته، يرسل استبيانه اليومي، ثم يتصفح إجاباته حتى نهاية الاختبار"""
+    user_id, region_id, survey_id = spec
+    session = {'user_id': user_id, 'username': f"load_user_{user_id}", 'region_id': region_id}
+
+    app = _new_app(_employee_page, dict(session, selected_surveys=[survey_id]))
+    if _run_page(app, 'employee_dashboard', results, timeout) and \
+            any(b.label == SUBMIT_LABEL for b in app.button):
+        time.sleep(rng.uniform(0, think_time))
+        _run_page(app, 'employee_submit', results, timeout, action=_fill_survey_form)
+    else:
+        # الاستبيان مكتمل اليوم بالفعل (من تشغيل سابق على نفس القاعدة)
+        with results.lock:
+            results.skipped_submissions += 1
+
+    while time.time() < deadline:
+        time.sleep(rng.uniform(0, think_time))
+        app = _new_app(_employee_page, session, view_survey_id=survey_id)
+        _run_page(app, 'employee_history', results, timeout)
+
+def governorate_admin_session(spec, results: Results, deadline: float, think_time: float,
+                              timeout: float, rng: random.Random):
+    """مسؤول محافظة: يتنقل بين إجابات استبيانات محافظته"""
+    user_id, targets = spec
+    while time.time() < deadline:
+        governorate_id, survey_id = rng.choice(targets)
+        app = _new_app(_governorate_admin_page, {'user_id': user_id},
+                       survey_id=survey_id, governorate_id=governorate_id)
+        _run_page(app, 'governorate_responses', results, timeout)
+        time.sleep(rng.uniform(0, think_time))
+
+def admin_session(spec, results: Results, deadline: float, think_time: float,
+                  timeout: float, rng: random.Random):
+    """مسؤول النظام: يعرض بيانات الاستبيانات"""
+    user_id, survey_ids = spec
+    while time.time() < deadline:
+        app = _new_app(_admin_page, {'user_id': user_id}, survey_id=rng.choice(survey_ids))
+        _run_page(app, 'admin_survey_data', results, timeout)
+        time.sleep(rng.uniform(0, think_time))
+
+SESSIONS = {
+    'employee': employee_session,
+    'governorate_admin': governorate_admin_session,
+    'admin': admin_session,
+}
+
+def _worker(sessions, deadline: float, think_time: float, timeout: float) -> dict:
+    """تشغيل جلسات عملية واحدة كخيوط؛ sessions قائمة (وقت البدء، النوع، المواصفات، البذرة)"""
+    results = Results()
+    instrumentation.reset_peak_connections()
+
+    def run(start_at, kind, spec, seed):
+        time.sleep(max(0.0, start_at - time.time()))
+        SESSIONS[kind](spec, results, deadline, think_time, timeout, random.Random(seed))
+
+    threads = [threading.Thread(target=run, args=session, daemon=True) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    output = results.to_dict()
+    output['peak_connections'] = instrumentation.open_connections()['peak']
+    return output
+
+def _targets(sample: Sample):
+    """مستخدمو مسؤولي المحافظات مع استبيانات محافظاتهم، ومسؤول النظام مع جميع الاستبيانات"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT ga.user_id, sg.governorate_id, sg.survey_id
+            FROM GovernorateAdmins ga
+            JOIN SurveyGovernorate sg ON sg.governorate_id = ga.governorate_id
+            ORDER BY 1, 2, 3
+        ''')
+        governorate_admins = {}
+        for user_id, governorate_id, survey_id in cursor.fetchall():
+            governorate_admins.setdefault(user_id, []).append((governorate_id, survey_id))
+        if not governorate_admins:
+            # القاعدة بدون مسؤولي محافظات: جلسات بدون مستخدم على جميع المحافظات
+            cursor.execute("SELECT governorate_id, survey_id FROM SurveyGovernorate ORDER BY 1, 2")
+            governorate_admins = {None: cursor.fetchall()}
+        cursor.execute("SELECT survey_id FROM Surveys ORDER BY survey_id")
+        surveys = [row[0] for row in cursor.fetchall()]
+    return governorate_admins, (sample.admin_id, surveys)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="اختبار تحميل بجلسات متزامنة")
+    parser.add_argument('--employees', type=int, default=20, help="عدد جلسات الموظفين المتزامنة")
+    parser.add_argument('--governorate-admins', type=int, default=2)
+    parser.add_argument('--admins', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=30, help="مدة الاختبار بالثواني بعد بدء كل الجلسات")
+    parser.add_argument('--ramp-up', type=float, default=5, help="ثواني بدء الجلسات تدريجيًا")
+    parser.add_argument('--think-time', type=float, default=1.0, help="أقصى انتظار بين الصفحات بالثواني")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="عدد العمليات (= عدد الصفحات المنفذة في نفس اللحظة)")
+    parser.add_argument('--timeout', type=float, default=60, help="أقصى زمن لتحميل صفحة واحدة")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="ملف JSON للتقرير (stdout افتراضيًا)")
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help="رمز خروج 1 إذا تجاوزت نسبة الأخطاء هذا الحد")
+    args = parser.parse_args(argv)
+
+    sample = Sample(args.seed)
+    rng = random.Random(args.seed)
+    governorate_admins, admin = _targets(sample)
+
+    # كل جلسة موظف مستخدم مختلف، كما في ذروة الإرسال الصباحية
+    by_user = {}
+    for assignment in sample.assignments:
+        by_user.setdefault(assignment[0], []).append(assignment)
+    users = rng.sample(sorted(by_user), min(args.employees, len(by_user)))
+    if len(users) < args.employees:
+        print(f"يوجد {len(users)} موظف فقط في القاعدة", file=sys.stderr)
+
+    specs = [('employee', rng.choice(by_user[user_id])) for user_id in users]
+    admin_users = sorted(governorate_admins, key=lambda u: (u is None, u))
+    for index in range(args.governorate_admins):
+        user_id = admin_users[index % len(admin_users)]
+        specs.append(('governorate_admin', (user_id, governorate_admins[user_id])))
+    specs += [('admin', admin)] * args.admins
+    rng.shuffle(specs)
+
+    started_wall = time.time() + 1
+    deadline = started_wall + args.ramp_up + args.duration
+    processes = max(1, min(args.processes, len(specs)))
+    shards = [[] for _ in range(processes)]
+    for index, (kind, spec) in enumerate(specs):
+        start_at = started_wall + args.ramp_up * index / len(specs)
+        shards[index % processes].append((start_at, kind, spec, rng.random()))
+
+    started = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes) as pool:
+        outputs = pool.starmap(_worker, [(shard, deadline, args.think_time, args.timeout) for shard in shards])
+    elapsed = time.perf_counter() - started
+
+    results = Results()
+    for output in outputs:
+        results.merge(output)
+    report = results.report(elapsed)
+    report.update({
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'backend': type(get_backend()).__name__,
+        'processes': processes,
+        'sessions': {'employees': len(users), 'governorate_admins': args.governorate_admins,
+                     'admins': args.admins},
+        # مجموع أعلى قيم العمليات: حد أعلى للاتصالات المفتوحة في نفس الوقت
+        'peak_connections': sum(output['peak_connections'] for output in outputs),
+    })
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for page, stats in report['pages'].items():
+        print(f"{page:24} {stats['count']:>6} loads  {stats['per_second']:>7.2f}/s  "
+              f"p50 {stats['p50_ms']:>8.1f}  p95 {stats['p95_ms']:>8.1f}  p99 {stats['p99_ms']:>8.1f} ms  "
+              f"errors {stats['error_rate']:.2%}", file=sys.stderr)
+    print(f"الإجمالي {report['per_second']:.2f} صفحة/ث، الأخطاء {report['error_rate']:.2%}، "
+          f"أعلى عدد اتصالات متزامنة {report['peak_connections']}", file=sys.stderr)
+    return 1 if report['error_rate'] > args.max_error_rate else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
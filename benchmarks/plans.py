@@ -0,0 +1,262 @@
+"""فحص خطط تنفيذ الاستعلامات المتكررة لاكتشاف تراجع الفهارس قبل النشر
+
+    python -m benchmarks.generate --scale small   # مرة واحدة لتجهيز القاعدة
+    python -m benchmarks.plans
+
+كل عملية مسجلة في HOT_QUERIES تُنفذ على القاعدة المولدة، وتُجمع الاستعلامات التي أرسلتها
+فعليًا (نفس نص SQL الموجود في storage)، ثم يُطلب لكل SELECT خطة التنفيذ:
+EXPLAIN (FORMAT JSON) في PostgreSQL و EXPLAIN QUERY PLAN في SQLite. يكون رمز الخروج 1
+إذا خالفت أي خطة توقعاتها:
+- استخدام فهرس على الجداول المحددة في index_on
+- عدم وجود مسح كامل (Seq Scan / SCAN) لأي جدول كبير (أكثر من --large-rows صف)
+- التكلفة التقديرية ضمن max_cost (في PostgreSQL فقط)
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Sequence
+
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+os.environ.setdefault('SQLITE_PATH', 'bench.db')
+
+import storage
+from storage import analytics, instrumentation, survey_schema
+from storage.backends import get_backend
+from storage.core import connection
+from storage.exports import iter_response_details, iter_response_values, get_survey_responses
+from benchmarks.run import Sample
+
+TABLES = ('Governorates', 'HealthAdministrations', 'Users', 'Surveys', 'Survey_Fields',
+          'Responses', 'Response_Details', 'GovernorateAdmins', 'UserSurveys',
+          'SurveyGovernorate', 'AuditLog')
+
+class Expectation:
+    """شروط خطة التنفيذ لعملية واحدة"""
+
+    def __init__(self, index_on: Sequence[str] = (), max_cost: float = None, allow_scan: Sequence[str] = ()):
+        self.index_on = {t.lower() for t in index_on}
+        self.max_cost = max_cost
+        # جداول مسموح مسحها بالكامل حتى لو كانت كبيرة (قوائم العرض الكاملة)
+        self.allow_scan = {t.lower() for t in allow_scan}
+
+def _compiled_survey_cold(sample: Sample):
+    _, _, survey_id = sample.assignment()
+    survey_schema.invalidate(survey_id)
+    storage.get_compiled_survey(survey_id)
+
+def _dashboard(sample: Sample):
+    user_id, region_id, survey_ids = sample.user()
+    for survey_id in survey_ids:
+        survey_schema.invalidate(survey_id)
+    storage.get_employee_dashboard_data(user_id, region_id, survey_ids)
+
+def _export_batch(sample: Sample):
+    next(iter_response_details(sample.largest_survey, batch_size=500), None)
+
+def _export_table_stream(sample: Sample):
+    rows = iter_response_values(sample.largest_survey, batch_size=500)
+    next(rows, None)
+    rows.close()
+
+def _field_crosstab(sample: Sample):
+    labels = [label for label, _ in analytics.get_survey_field_labels(sample.largest_survey)]
+    analytics.get_field_crosstab(sample.largest_survey, labels[0], labels[-1])
+
+# اسم العملية: (الدالة، التوقعات)
+HOT_QUERIES = {
+    'get_response_details': (
+        lambda s: storage.get_response_details(s.response_id()),
+        Expectation(index_on=('Response_Details',), max_cost=500)),
+    'get_response_info': (
+        lambda s: storage.get_response_info(s.response_id()),
+        Expectation(index_on=('Responses',), max_cost=100)),
+    'has_completed_survey_today': (
+        lambda s: storage.has_completed_survey_today(*s.assignment()[::2]),
+        Expectation(index_on=('Responses',), max_cost=100)),
+    'get_employee_dashboard_data': (
+        _dashboard,
+        Expectation(index_on=('Responses', 'Survey_Fields'), max_cost=1000)),
+    'get_survey_fields': (
+        lambda s: storage.get_survey_fields(s.assignment()[2]),
+        Expectation(index_on=('Survey_Fields',), max_cost=100)),
+    'get_compiled_survey': (
+        _compiled_survey_cold,
+        Expectation(index_on=('Survey_Fields',), max_cost=100)),
+    'get_user_allowed_surveys': (
+        lambda s: storage.get_user_allowed_surveys(s.user()[0]),
+        Expectation(index_on=('UserSurveys',), max_cost=100)),
+    'get_governorate_surveys': (
+        lambda s: storage.get_governorate_surveys(s.rng.choice(s.governorates)),
+        Expectation(index_on=('SurveyGovernorate',), max_cost=1000)),
+    'get_governorate_employees': (
+        lambda s: storage.get_governorate_employees(s.rng.choice(s.governorates)),
+        Expectation(index_on=('Users',), max_cost=5000)),
+    'get_survey_responses': (
+        lambda s: get_survey_responses(s.largest_survey),
+        Expectation(index_on=('Responses',))),
+    'export_details_batch': (
+        _export_batch,
+        Expectation(index_on=('Responses', 'Response_Details'), max_cost=50_000)),
+    'export_table_stream': (
+        _export_table_stream,
+        Expectation(index_on=('Responses', 'Response_Details'))),
+    'governorate_compliance': (
+        lambda s: storage.get_governorate_compliance(s.rng.choice(s.governorates)),
+        Expectation(index_on=('Responses',))),
+    'field_crosstab': (
+        _field_crosstab,
+        Expectation(index_on=('Responses', 'Response_Details'))),
+    'survey_rollup': (
+        lambda s: analytics.get_survey_rollup(s.largest_survey),
+        Expectation(index_on=('Responses',))),
+    'get_audit_logs': (
+        lambda s: storage.get_audit_logs(),
+        Expectation(allow_scan=('AuditLog',))),
+    'get_all_users_for_admin_view': (
+        lambda s: storage.get_all_users_for_admin_view(),
+        Expectation(allow_scan=('Users',))),
+}
+
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_NOT_ALIAS = {'where', 'join', 'left', 'right', 'inner', 'on', 'order', 'group', 'limit', 'using', 'cross'}
+
+def _aliases(sql: str) -> Dict[str, str]:
+    """الاسم المستعار -> اسم الجدول كما في جملة SQL"""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in _NOT_ALIAS:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+class Plan:
+    """ملخص خطة تنفيذ: الجداول الممسوحة بالكامل، والجداول المقروءة بفهرس، والتكلفة"""
+
+    def __init__(self, scans, indexed, cost: Optional[float], raw):
+        self.scans = scans
+        self.indexed = indexed
+        self.cost = cost
+        self.raw = raw
+
+def _postgres_plan(cursor, sql: str, params) -> Plan:
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    document = cursor.fetchone()[0]
+    if isinstance(document, str):
+        document = json.loads(document)
+    root = document[0]['Plan']
+    scans, indexed = set(), set()
+
+    def walk(node):
+        relation = (node.get('Relation Name') or '').lower()
+        node_type = node.get('Node Type', '')
+        if relation:
+            if node_type == 'Seq Scan':
+                scans.add(relation)
+            elif 'Index' in node_type or node_type == 'Bitmap Heap Scan':
+                indexed.add(relation)
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(root)
+    return Plan(scans, indexed, root.get('Total Cost'), document)
+
+def _sqlite_plan(cursor, sql: str, params) -> Plan:
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    details = [row[-1] for row in cursor.fetchall()]
+    aliases = _aliases(sql)
+    scans, indexed = set(), set()
+    for detail in details:
+        words = detail.split()
+        if len(words) < 2 or words[0] not in ('SCAN', 'SEARCH'):
+            continue
+        table = aliases.get(words[1].lower(), words[1].lower())
+        if words[0] == 'SEARCH' and ('INDEX' in detail or 'PRIMARY KEY' in detail):
+            indexed.add(table)
+        elif words[0] == 'SCAN':
+            scans.add(table)
+    return Plan(scans, indexed, None, details)
+
+def explain(sql: str, params) -> Plan:
+    with connection() as conn:
+        cursor = conn.cursor()
+        if get_backend().name == 'postgres':
+            return _postgres_plan(cursor, sql, params)
+        return _sqlite_plan(cursor, sql, params)
+
+def table_sizes() -> Dict[str, int]:
+    sizes = {}
+    with connection() as conn:
+        cursor = conn.cursor()
+        for table in TABLES:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            sizes[table.lower()] = cursor.fetchone()[0]
+    return sizes
+
+def check(name: str, func, expectation: Expectation, sample: Sample,
+          large_tables: set) -> List[Dict]:
+    """تنفيذ العملية وفحص خطة كل SELECT أرسلته، وإرجاع نتيجة لكل استعلام"""
+    with instrumentation.scope(f"plans:{name}", capture_params=True) as stats:
+        func(sample)
+
+    results = []
+    for record in stats.queries:
+        if not record.statement.upper().startswith('SELECT'):
+            continue
+        plan = explain(record.statement, record.params)
+        problems = []
+        for table in sorted((plan.scans & large_tables) - expectation.allow_scan):
+            problems.append(f"مسح كامل للجدول الكبير {table}")
+        referenced = set(_aliases(record.statement).values())
+        for table in sorted(expectation.index_on & referenced):
+            if table not in plan.indexed:
+                problems.append(f"لا يوجد استخدام لفهرس على {table}")
+        if expectation.max_cost is not None and plan.cost is not None and plan.cost > expectation.max_cost:
+            problems.append(f"التكلفة {plan.cost:.0f} أعلى من الحد {expectation.max_cost:.0f}")
+        results.append({
+            'operation': name,
+            'call_site': record.call_site,
+            'sql': record.statement[:300],
+            'scans': sorted(plan.scans),
+            'indexed': sorted(plan.indexed),
+            'cost': plan.cost,
+            'problems': problems,
+        })
+    return results
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="فحص خطط تنفيذ الاستعلامات المتكررة")
+    parser.add_argument('--only', nargs='*', choices=sorted(HOT_QUERIES))
+    parser.add_argument('--large-rows', type=int, default=10_000,
+                        help="الجداول التي يزيد عدد صفوفها عن هذا الحد تعتبر كبيرة")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="ملف JSON لتفاصيل الخطط")
+    args = parser.parse_args(argv)
+
+    storage.init_db()
+    sample = Sample(args.seed)
+    sizes = table_sizes()
+    large_tables = {table for table, rows in sizes.items() if rows > args.large_rows}
+
+    results = []
+    for name in args.only or HOT_QUERIES:
+        func, expectation = HOT_QUERIES[name]
+        for result in check(name, func, expectation, sample, large_tables):
+            results.append(result)
+            status = "OK  " if not result['problems'] else "FAIL"
+            print(f"{status} {name:30} {result['call_site']}", file=sys.stderr)
+            for problem in result['problems']:
+                print(f"     - {problem}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'backend': get_backend().name, 'table_sizes': sizes, 'queries': results},
+                      f, ensure_ascii=False, indent=2, default=str)
+
+    failures = [r for r in results if r['problems']]
+    print(f"{len(results) - len(failures)}/{len(results)} خطط مطابقة للتوقعات", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""قياس زمن عمليات طبقة البيانات على قاعدة مولدة بـ benchmarks.generate
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline results.json --max-regression 1.25
+
+النتائج JSON بالمللي ثانية لكل عملية (min / median / p95 / mean). مع --baseline تُقارن
+الأوسطات بنتيجة سابقة ويكون رمز الخروج 1 إذا تجاوزت أي عملية نسبة التراجع المسموحة.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+os.environ.setdefault('SQLITE_PATH', 'bench.db')
+
+import exports
+import storage
+from storage import instrumentation, survey_schema
+from storage.backends import get_backend
+from storage.core import connection
+
+class Sample:
+    """عينات عشوائية ثابتة من القاعدة تُستخدم كمدخلات للعمليات المقاسة"""
+
+    def __init__(self, seed: int):
+        rng = random.Random(seed)
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(response_id) FROM Responses")
+            max_response = cursor.fetchone()[0]
+            if not max_response:
+                raise SystemExit("القاعدة فارغة. شغّل python -m benchmarks.generate أولاً")
+            cursor.execute('''
+                SELECT u.user_id, u.assigned_region, us.survey_id
+                FROM Users u JOIN UserSurveys us ON us.user_id = u.user_id
+                WHERE u.role = 'employee'
+                ORDER BY u.user_id, us.survey_id
+            ''')
+            rows = cursor.fetchall()
+            cursor.execute('''
+                SELECT survey_id FROM Responses
+                GROUP BY survey_id ORDER BY COUNT(*) DESC LIMIT 1
+            ''')
+            self.largest_survey = cursor.fetchone()[0]
+            cursor.execute("SELECT governorate_id FROM Governorates ORDER BY governorate_id")
+            self.governorates = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT user_id FROM Users WHERE role = 'admin' ORDER BY user_id LIMIT 1")
+            self.admin_id = cursor.fetchone()[0]
+
+        self.rng = rng
+        self.max_response = max_response
+        self.assignments = rows
+        self.users = {}
+        for user_id, region_id, survey_id in rows:
+            self.users.setdefault(user_id, (region_id, []))[1].append(survey_id)
+
+    def response_id(self) -> int:
+        return self.rng.randint(1, self.max_response)
+
+    def assignment(self):
+        return self.rng.choice(self.assignments)
+
+    def user(self):
+        user_id = self.rng.choice(list(self.users))
+        region_id, survey_ids = self.users[user_id]
+        return user_id, region_id, survey_ids
+
+def _submit(sample: Sample):
+    """نفس مسار الإرسال في لوحة الموظف: التحقق من الإكمال ثم حفظ الإجابة وتفاصيلها"""
+    user_id, region_id, survey_id = sample.assignment()
+    schema = storage.get_compiled_survey(survey_id)
+    storage.has_completed_survey_today(user_id, survey_id)
+    storage.submit_response(survey_id, user_id, region_id,
+                            {field.field_id: "1" for field in schema.fields}, True, schema.version)
+
+def _dashboard(sample: Sample):
+    user_id, region_id, survey_ids = sample.user()
+    storage.get_employee_dashboard_data(user_id, region_id, survey_ids)
+
+def _compiled_survey_cold(sample: Sample):
+    _, _, survey_id = sample.assignment()
+    survey_schema.invalidate(survey_id)
+    storage.get_compiled_survey(survey_id)
+
+def _full_export(sample: Sample):
+    exports.write_survey_workbook(BytesIO(), sample.largest_survey)
+
+# اسم العملية: (الدالة، عدد مرات التكرار الافتراضي)
+OPERATIONS = {
+    'get_response_details': (lambda s: storage.get_response_details(s.response_id()), 200),
+    'get_response_info': (lambda s: storage.get_response_info(s.response_id()), 200),
+    'has_completed_survey_today': (lambda s: storage.has_completed_survey_today(*s.assignment()[::2]), 200),
+    'get_audit_logs': (lambda s: storage.get_audit_logs(), 5),
+    'get_audit_logs_search': (lambda s: storage.get_audit_logs(search_query="UPDATE"), 5),
+    'get_all_users_for_admin_view': (lambda s: storage.get_all_users_for_admin_view(), 10),
+    'get_governorate_surveys': (lambda s: storage.get_governorate_surveys(s.rng.choice(s.governorates)), 50),
+    'get_governorate_employees': (lambda s: storage.get_governorate_employees(s.rng.choice(s.governorates)), 50),
+    'get_employee_dashboard_data': (_dashboard, 100),
+    'get_compiled_survey_cold': (_compiled_survey_cold, 100),
+    'submit_response': (_submit, 50),
+    'full_export': (_full_export, 3),
+}
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def measure(func, sample: Sample, repeat: int, warmup: int = 1) -> dict:
+    """تشغيل العملية repeat مرة بعد التسخين وإرجاع الإحصاءات بالمللي ثانية"""
+    for _ in range(warmup):
+        func(sample)
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        with instrumentation.scope('benchmark') as stats:
+            started = time.perf_counter()
+            func(sample)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(stats.query_count)
+    return {
+        'repeat': repeat,
+        'queries': max(queries),
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(_percentile(timings, 0.95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+    }
+
+def _row_counts() -> dict:
+    counts = {}
+    with connection() as conn:
+        cursor = conn.cursor()
+        for table in ('Users', 'Surveys', 'Survey_Fields', 'Responses', 'Response_Details', 'AuditLog'):
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+    return counts
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    """العمليات التي زاد وسيطها عن الأساس بأكثر من max_regression مرة"""
+    regressions = []
+    for name, stats in results['operations'].items():
+        base = baseline.get('operations', {}).get(name)
+        if not base or not base['median_ms']:
+            continue
+        ratio = stats['median_ms'] / base['median_ms']
+        stats['baseline_ratio'] = round(ratio, 3)
+        if ratio > max_regression:
+            regressions.append((name, ratio))
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="قياس زمن عمليات طبقة البيانات")
+    parser.add_argument('--only', nargs='*', choices=sorted(OPERATIONS), help="قياس عمليات محددة فقط")
+    parser.add_argument('--repeat-scale', type=float, default=1.0, help="مضاعف لعدد مرات التكرار")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="ملف JSON للنتائج (stdout افتراضيًا)")
+    parser.add_argument('--baseline', help="ملف نتائج سابق للمقارنة")
+    parser.add_argument('--max-regression', type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    sample = Sample(args.seed)
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'backend': type(get_backend()).__name__,
+        'python': platform.python_version(),
+        'rows': _row_counts(),
+        'operations': {},
+    }
+    for name in args.only or OPERATIONS:
+        func, repeat = OPERATIONS[name]
+        repeat = max(1, int(repeat * args.repeat_scale))
+        results['operations'][name] = measure(func, sample, repeat)
+        stats = results['operations'][name]
+        print(f"{name:32} median {stats['median_ms']:>10.2f} ms   p95 {stats['p95_ms']:>10.2f} ms",
+              file=sys.stderr)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for name, ratio in regressions:
+        print(f"تراجع في {name}: {ratio:.2f}x من الأساس", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
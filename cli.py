@@ -0,0 +1,276 @@
+"""أوامر التشغيل الدفعي خارج واجهة Streamlit
+
+أمثلة:
+    python cli.py export --survey 3 --output survey3.csv --checkpoint export3.json
+    python cli.py export --survey 3 --output survey3.xlsx
+    python cli.py export --survey 3 --output survey3.zip --by governorate --workers 4
+    python cli.py export --survey 3 --output survey3.parquet
+    python cli.py import-users users.csv --checkpoint import.json
+    python cli.py backfill last-modified --checkpoint backfill.json
+    python cli.py backfill daily-counts --checkpoint daily.json
+    python cli.py purge audit --older-than-days 365
+    python cli.py purge drafts --older-than-days 30
+    python cli.py replica-sync
+
+الأوامر تستخدم طبقة البيانات (storage) مباشرة ولا تحتاج جلسة متصفح. مع --checkpoint
+يُحفظ التقدم بعد كل دفعة، وإعادة تشغيل نفس الأمر تستأنف من آخر دفعة مكتملة.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+
+# الإعدادات تُقرأ عند استيراد بعض الوحدات، فيُحمل .env قبلها
+load_dotenv()
+
+import exports
+import storage
+from storage import instrumentation, maintenance, replica
+from storage.exports import count_survey_responses
+from storage.errors import DataAccessError, DuplicateError
+
+class Checkpoint:
+    """نقطة استئناف في ملف JSON تُكتب بشكل ذري بعد كل دفعة"""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def save(self, **values):
+        self.state.update(values)
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.state = {}
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class Progress:
+    """عرض التقدم في سطر واحد على stderr"""
+
+    def __init__(self, label: str, total: int = None):
+        self.label = label
+        self.total = total
+        self.done = 0
+
+    def advance(self, count: int, position=None):
+        instrumentation.next_batch()
+        self.done += count
+        total = f"/{self.total}" if self.total is not None else ""
+        at = f" (حتى {position})" if position is not None else ""
+        sys.stderr.write(f"\r{self.label}: {self.done}{total}{at}")
+        sys.stderr.flush()
+
+    def finish(self):
+        sys.stderr.write("\n")
+
+def cmd_export(args):
+    """تصدير بيانات استبيان إلى ملف CSV (قابل للاستئناف) أو Excel أو حزمة zip لكل محافظة أو جدول للتحليل"""
+    if args.output.endswith('.parquet') or args.table:
+        fmt = 'parquet' if args.output.endswith('.parquet') else 'csv'
+        progress = Progress("تصدير الإجابات", count_survey_responses(args.survey))
+        exports.write_survey_table(args.output, args.survey, fmt, progress=progress.advance)
+        progress.finish()
+        print(f"تم إنشاء {args.output}")
+        return
+
+    if args.output.endswith('.zip'):
+        progress = Progress("تصدير الإجابات", count_survey_responses(args.survey))
+        files = exports.write_survey_bundle(args.output, args.survey, args.by, args.workers,
+                                            args.batch_size, progress.advance)
+        progress.finish()
+        print(f"تم إنشاء {args.output} ({files} ملف)")
+        return
+
+    if args.output.endswith('.xlsx'):
+        progress = Progress("تصدير الإجابات", count_survey_responses(args.survey))
+        exports.write_survey_workbook(args.output, args.survey, args.batch_size, progress.advance)
+        progress.finish()
+        print(f"تم إنشاء {args.output}")
+        return
+
+    checkpoint = Checkpoint(args.checkpoint)
+    resume_from = None
+    if checkpoint.get('survey_id') == args.survey and checkpoint.get('output') == args.output:
+        resume_from = (checkpoint.get('after_response_id'), checkpoint.get('offset'))
+
+    progress = Progress(
+        "تصدير الإجابات",
+        count_survey_responses(args.survey, resume_from[0] if resume_from else 0)
+    )
+    exports.export_survey_details_csv(
+        args.output, args.survey, resume_from, args.batch_size,
+        progress=progress.advance,
+        on_checkpoint=lambda after, offset: checkpoint.save(
+            survey_id=args.survey, output=args.output, after_response_id=after, offset=offset)
+    )
+    progress.finish()
+    checkpoint.clear()
+    print(f"تم إنشاء {args.output}")
+
+def cmd_import_users(args):
+    """إضافة مستخدمين من ملف CSV بالأعمدة username,password,role,admin_id,governorate_id"""
+    checkpoint = Checkpoint(args.checkpoint)
+    start_line = checkpoint.get('line', 0) if checkpoint.get('file') == args.file else 0
+
+    with open(args.file, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+
+    progress = Progress("استيراد المستخدمين", len(rows))
+    progress.advance(start_line)
+    added, skipped = 0, 0
+    for line, row in enumerate(rows[start_line:], start=start_line + 1):
+        admin_id = int(row['admin_id']) if row.get('admin_id') else None
+        try:
+            user_id = storage.add_user(row['username'], row['password'], row['role'], admin_id)
+            if row['role'] == 'governorate_admin' and row.get('governorate_id'):
+                storage.add_governorate_admin(user_id, int(row['governorate_id']))
+            added += 1
+        except DuplicateError:
+            skipped += 1
+        checkpoint.save(file=args.file, line=line)
+        progress.advance(1, line)
+    progress.finish()
+    checkpoint.clear()
+    print(f"تمت إضافة {added} مستخدم، وتم تخطي {skipped} موجودين بالفعل")
+
+def _backfill_last_modified(args, checkpoint):
+    after = checkpoint.get('after_response_id', 0)
+    progress = Progress("تعبئة وقت آخر تعديل", maintenance.count_missing_last_modified(after))
+    while True:
+        last_id, updated = maintenance.backfill_last_modified(after, args.batch_size)
+        if last_id == after:
+            break
+        after = last_id
+        checkpoint.save(after_response_id=after)
+        progress.advance(updated, after)
+    progress.finish()
+
+def _backfill_daily_counts(args, checkpoint):
+    # الدفعة هنا عدد أيام، والتقدم يُحفظ بآخر يوم مكتمل
+    next_day = checkpoint.get('next_day')
+    day = date.fromisoformat(next_day) if next_day else maintenance.get_first_submission_day()
+    if day is None:
+        return
+    progress = Progress("إعادة حساب الأعداد اليومية (أيام)", (date.today() - day).days + 1)
+    while day <= date.today():
+        days = min(maintenance.DAILY_COUNTS_BATCH_DAYS, (date.today() - day).days + 1)
+        maintenance.backfill_daily_counts(day, days)
+        day += timedelta(days=days)
+        checkpoint.save(next_day=day.isoformat())
+        progress.advance(days, day)
+    progress.finish()
+
+BACKFILLS = {
+    'last-modified': _backfill_last_modified,
+    'daily-counts': _backfill_daily_counts,
+}
+
+def cmd_backfill(args):
+    """تشغيل مهمة تعبئة بيانات على دفعات"""
+    checkpoint = Checkpoint(args.checkpoint)
+    if checkpoint.get('job') != args.job:
+        checkpoint.state = {}
+    checkpoint.save(job=args.job)
+    BACKFILLS[args.job](args, checkpoint)
+    checkpoint.clear()
+    print("اكتملت المهمة")
+
+PURGES = {
+    'audit': ("حذف سجلات التعديلات", maintenance.count_audit_logs_before, maintenance.purge_audit_logs),
+    'drafts': ("حذف الإجابات غير المكتملة", maintenance.count_drafts_before, maintenance.purge_draft_responses),
+}
+
+def cmd_purge(args):
+    """حذف البيانات الأقدم من مدة الاحتفاظ على دفعات صغيرة"""
+    label, count, purge = PURGES[args.target]
+    cutoff = datetime.now() - timedelta(days=args.older_than_days)
+    progress = Progress(label, count(cutoff))
+    if args.dry_run:
+        progress.finish()
+        print(f"سيتم حذف {progress.total} سجل أقدم من {cutoff:%Y-%m-%d}")
+        return
+    while True:
+        deleted = purge(cutoff, args.batch_size)
+        if not deleted:
+            break
+        progress.advance(deleted)
+    progress.finish()
+    print(f"تم حذف {progress.done} سجل")
+
+def cmd_replica_sync(args):
+    """مزامنة النسخة التحليلية (REPLICA_PATH) مع القاعدة الرئيسية"""
+    progress = Progress("مزامنة النسخة التحليلية")
+    counts = replica.sync(args.batch_size, progress=progress.advance)
+    progress.finish()
+    print("تمت المزامنة: " + "، ".join(f"{name} {count}" for name, count in counts.items()))
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="مهام التصدير والاستيراد والصيانة لنظام الاستبيانات")
+    parser.add_argument('--batch-size', type=int, default=500, help="عدد السجلات في كل دفعة")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export = subparsers.add_parser('export', help="تصدير بيانات استبيان")
+    export.add_argument('--survey', type=int, required=True, help="رقم الاستبيان")
+    export.add_argument('--output', required=True, help="ملف الناتج (.csv أو .xlsx أو .zip أو .parquet)")
+    export.add_argument('--table', action='store_true',
+                        help="ملف CSV بصف لكل إجابة وعمود لكل حقل بدلاً من صف لكل قيمة")
+    export.add_argument('--checkpoint', help="ملف نقطة الاستئناف (لملفات CSV)")
+    export.add_argument('--by', choices=['governorate', 'region'], default='governorate',
+                        help="تقسيم حزمة zip: ملف لكل محافظة أو لكل إدارة صحية")
+    export.add_argument('--workers', type=int, help="عدد العمليات لبناء ملفات الحزمة (افتراضيًا BUNDLE_WORKERS)")
+    export.set_defaults(func=cmd_export)
+
+    import_users = subparsers.add_parser('import-users', help="استيراد مستخدمين من CSV")
+    import_users.add_argument('file')
+    import_users.add_argument('--checkpoint', help="ملف نقطة الاستئناف")
+    import_users.set_defaults(func=cmd_import_users)
+
+    backfill = subparsers.add_parser('backfill', help="تعبئة بيانات مشتقة للسجلات القديمة")
+    backfill.add_argument('job', choices=sorted(BACKFILLS))
+    backfill.add_argument('--checkpoint', help="ملف نقطة الاستئناف")
+    backfill.set_defaults(func=cmd_backfill)
+
+    purge = subparsers.add_parser('purge', help="حذف البيانات الأقدم من مدة الاحتفاظ")
+    purge.add_argument('target', choices=sorted(PURGES))
+    purge.add_argument('--older-than-days', type=int, required=True)
+    purge.add_argument('--dry-run', action='store_true', help="عرض عدد السجلات فقط دون حذف")
+    purge.set_defaults(func=cmd_purge)
+
+    replica_sync = subparsers.add_parser('replica-sync', help="مزامنة النسخة التحليلية في DuckDB")
+    replica_sync.set_defaults(func=cmd_replica_sync)
+
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        storage.init_db()
+        # نطاق قياس للأمر حتى يعمل كاشف N+1 فيه (التكرار يُعد داخل كل دفعة)
+        with instrumentation.scope(f"job:{args.command}"):
+            args.func(args)
+    except DataAccessError as e:
+        print(f"\nخطأ: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("\nتم الإيقاف. أعد تشغيل نفس الأمر للاستئناف من آخر نقطة محفوظة", file=sys.stderr)
+        return 130
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
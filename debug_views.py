@@ -0,0 +1,106 @@
+import streamlit as st
+import pandas as pd
+import profiling
+from storage.instrumentation import SLOW_QUERY_MS
+
+QUERY_HISTORY_SIZE = 20
+PROFILE_HISTORY_SIZE = 5
+
+def record_rerun(stats):
+    """Keep a short history of per-rerun query totals in the session"""
+    history = st.session_state.setdefault('query_history', [])
+    history.append(stats.summary())
+    del history[:-QUERY_HISTORY_SIZE]
+
+def show_query_debug_panel(stats):
+    """Show the database cost of the current page in the sidebar (admins only)"""
+    with st.sidebar.expander("🛠️ أداء قاعدة البيانات", expanded=True):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("الاستعلامات", stats.query_count)
+        col2.metric("الاتصالات", stats.connections)
+        col3.metric("زمن القاعدة", f"{stats.db_ms:.0f} ms")
+        st.caption(f"زمن الصفحة الكامل: {stats.elapsed_ms:.0f} ms — الاستعلامات الأبطأ من "
+                   f"{SLOW_QUERY_MS:.0f} ms تُكتب في سجل الاستعلامات البطيئة")
+
+        if stats.repeated:
+            st.warning(f"استعلامات متكررة (N+1) أكثر من {stats.threshold} مرة في هذه الصفحة")
+            st.dataframe(
+                pd.DataFrame(
+                    [(info['count'], info['call_site'], info['origin'], shape[:200])
+                     for shape, info in stats.repeated.items()],
+                    columns=["العدد", "الاستعلام من", "الواجهة", "شكل الاستعلام"]
+                ),
+                hide_index=True
+            )
+
+        if stats.queries:
+            st.markdown("**حسب مكان الاستدعاء**")
+            by_site = pd.DataFrame(stats.by_call_site())
+            by_site['total_ms'] = by_site['total_ms'].round(2)
+            st.dataframe(
+                by_site.rename(columns={
+                    'call_site': "الاستعلام من", 'origin': "الواجهة", 'count': "العدد",
+                    'total_ms': "الزمن (ms)", 'rows': "الصفوف"
+                }),
+                hide_index=True
+            )
+
+            st.markdown("**أبطأ الاستعلامات**")
+            slowest = sorted(stats.queries, key=lambda q: q.duration_ms, reverse=True)[:10]
+            st.dataframe(
+                pd.DataFrame(
+                    [(round(q.duration_ms, 2), q.rows, q.call_site, q.sql[:200]) for q in slowest],
+                    columns=["الزمن (ms)", "الصفوف", "الاستعلام من", "SQL"]
+                ),
+                hide_index=True
+            )
+
+        history = st.session_state.get('query_history', [])
+        if history:
+            st.markdown("**آخر مرات تحميل الصفحة**")
+            st.dataframe(
+                pd.DataFrame(history)[['queries', 'connections', 'db_ms', 'elapsed_ms']].rename(columns={
+                    'queries': "الاستعلامات", 'connections': "الاتصالات",
+                    'db_ms': "زمن القاعدة (ms)", 'elapsed_ms': "زمن الصفحة (ms)"
+                }),
+                hide_index=True
+            )
+
+def record_profile(profile):
+    """Keep the last few page profiles in the session for download"""
+    profiles = st.session_state.setdefault('page_profiles', [])
+    profiles.append(profile)
+    del profiles[:-PROFILE_HISTORY_SIZE]
+
+def show_profile_panel():
+    """Show section timings of the last profiled reruns with their artifacts"""
+    profiles = st.session_state.get('page_profiles', [])
+    if not profiles:
+        return
+    with st.sidebar.expander("⏱️ قياس أداء الصفحة", expanded=True):
+        latest = profiles[-1]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("زمن الصفحة", f"{latest.wall_ms:.0f} ms")
+        col2.metric("زمن القاعدة", f"{latest.db_ms:.0f} ms")
+        col3.metric("ذروة الذاكرة", f"{latest.peak_memory_kb / 1024:.1f} MB" if latest.peak_memory_kb else "-")
+        if latest.busy:
+            st.caption("المقياس مشغول بجلسة أخرى: قيست أزمنة الأقسام فقط دون cProfile والذاكرة")
+        if latest.sections:
+            sections = pd.DataFrame([s.to_dict() for s in latest.sections])
+            sections['section'] = sections.apply(lambda r: "  " * r['depth'] + r['section'], axis=1)
+            st.dataframe(
+                sections.drop(columns=['depth']).rename(columns={
+                    'section': "القسم", 'wall_ms': "الزمن (ms)", 'db_ms': "القاعدة (ms)",
+                    'other_ms': "غير القاعدة (ms)", 'queries': "الاستعلامات"
+                }),
+                hide_index=True
+            )
+        for index, profile in enumerate(reversed(profiles)):
+            st.download_button(
+                f"تنزيل {profile.page} {profile.started_at.strftime('%H:%M:%S')} ({profile.wall_ms:.0f} ms)",
+                data=profile.artifact(),
+                file_name=profile.filename,
+                mime="application/zip",
+                key=f"download_profile_{index}_{profile.filename}"
+            )
+        st.caption("cpu.prof يُفتح بـ python -m pstats أو snakeviz")
@@ -1,20 +1,15 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import json
 from database import (
     get_health_admin_name,
-    save_response,
-    save_response_detail,
-    get_survey_fields,
+    submit_response,
     has_completed_survey_today,
-    get_user_allowed_surveys,
-    get_user_by_username,
+    get_employee_dashboard_data,
     get_response_details,
     get_db_connection
 )
-import psycopg2
-import psycopg2.extras
+from profiling import section
 
 def show_employee_dashboard():
     """Main function to display the employee dashboard"""
@@ -22,13 +17,21 @@ def show_employee_dashboard():
         st.error("حسابك غير مرتبط بأي منطقة. يرجى التواصل مع المسؤول.")
         return
 
-    region_info = get_employee_region_info(st.session_state.region_id)
-    if not region_info:
+    # The multiselect value is already in session state at the start of the
+    # rerun, so everything the page needs is loaded in one call.
+    with section("load_dashboard_data"):
+        dashboard = get_employee_dashboard_data(
+            st.session_state.user_id,
+            st.session_state.region_id,
+            st.session_state.get('selected_surveys', [])
+        )
+    if not dashboard or not dashboard['region_info']:
         st.error("لم يتم العثور على معلومات المنطقة الخاصة بك في النظام")
         return
 
-    display_employee_header(region_info)
-    allowed_surveys = get_user_allowed_surveys(st.session_state.user_id)
+    region_info = dashboard['region_info']
+    display_employee_header(region_info, dashboard['last_login'])
+    allowed_surveys = dashboard['allowed_surveys']
 
     if not allowed_surveys:
         st.info("لا توجد استبيانات متاحة لك حاليًا")
@@ -37,42 +40,14 @@ def show_employee_dashboard():
     selected_surveys = display_survey_selection(allowed_surveys)
 
     for survey_id, survey_name in selected_surveys:
-        display_single_survey(survey_id, region_info['admin_id'])
+        with section(f"survey_form_{survey_id}"):
+            display_single_survey(survey_id, region_info['admin_id'], dashboard['surveys'].get(survey_id))
 
-def get_employee_region_info(region_id):
-    """Get information about the employee's assigned health administration region"""
-    try:
-        conn = get_db_connection()
-        if conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT
-                        ha.admin_id,
-                        ha.admin_name,
-                        g.governorate_name,
-                        g.governorate_id
-                    FROM
-                        HealthAdministrations ha
-                    JOIN
-                        Governorates g ON ha.governorate_id = g.governorate_id
-                    WHERE
-                        ha.admin_id = %s;
-                """, (region_id,))
-                result = cur.fetchone()
-            conn.close()
-            return dict(result) if result else None
-        return None
-    except Exception as e:
-        st.error(f"خطأ في قاعدة البيانات: {str(e)}")
-        return None
-
-def display_employee_header(region_info):
+def display_employee_header(region_info, last_login):
     """Display the employee dashboard header with region info"""
     st.set_page_config(layout="wide")
     st.title(f"لوحة الموظف - {region_info['admin_name']}")
 
-    last_login = get_last_login(st.session_state.username)
-
     col1, col2, col3 = st.columns(3)
     with col1:
         st.subheader("المحافظة")
@@ -84,11 +59,6 @@ def display_employee_header(region_info):
         st.subheader("آخر دخول")
         st.info(last_login if last_login else "غير معروف")
 
-def get_last_login(username):
-    """Get the user's last login time"""
-    user_data = get_user_by_username(username)
-    return user_data['last_login'] if user_data and user_data.get('last_login') else None
-
 def display_survey_selection(allowed_surveys):
     """Display survey selection interface"""
     st.header("الاستبيانات المتاحة")
@@ -102,47 +72,28 @@ def display_survey_selection(allowed_surveys):
     
     return [(s[0], s[1]) for s in allowed_surveys if s[0] in selected_survey_ids]
 
-def display_single_survey(survey_id, region_id):
-    """Display a single survey form"""
-    try:
-        conn = get_db_connection()
-        if conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT survey_id, survey_name, created_at 
-                    FROM Surveys 
-                    WHERE survey_id = %s
-                """, (survey_id,))
-                survey_info = cur.fetchone()
-            conn.close()
-        else:
-            survey_info = None
-
-        if not survey_info:
-            st.error("الاستبيان المحدد غير موجود")
-            return
-
-        if has_completed_survey_today(st.session_state.user_id, survey_id):
-            st.warning(f"لقد أكملت استبيان '{survey_info[1]}' اليوم. يمكنك إكماله مرة أخرى غدًا.")
-            return
+def display_single_survey(survey_id, region_id, survey_info):
+    """Display a single survey form from the preloaded dashboard payload"""
+    if not survey_info:
+        st.error("الاستبيان المحدد غير موجود")
+        return
 
-        with st.expander(f"📋 {survey_info[1]} (تاريخ الإنشاء: {survey_info[2].strftime('%Y-%m-%d')})"):
-            fields = get_survey_fields(survey_id)
-            display_survey_form(survey_id, region_id, fields, survey_info[1])
+    if survey_info['completed_today']:
+        st.warning(f"لقد أكملت استبيان '{survey_info['survey_name']}' اليوم. يمكنك إكماله مرة أخرى غدًا.")
+        return
 
-    except Exception as e:
-        st.error(f"حدث خطأ في قاعدة البيانات: {str(e)}")
+    with st.expander(f"📋 {survey_info['survey_name']} (تاريخ الإنشاء: {survey_info['created_at'].strftime('%Y-%m-%d')})"):
+        display_survey_form(survey_id, region_id, survey_info['schema'], survey_info['survey_name'])
 
-def display_survey_form(survey_id, region_id, fields, survey_name):
+def display_survey_form(survey_id, region_id, schema, survey_name):
     """Display and handle survey form submission"""
     with st.form(f"survey_form_{survey_id}"):
         st.markdown("**يرجى تعبئة جميع الحقول المطلوبة (*)**")
         st.subheader("🧾 بيانات الاستبيان")
 
         answers = {}
-        for field in fields:
-            field_id, label, field_type, options, is_required, _ = field
-            answers[field_id] = render_field(field_id, label, field_type, options, is_required)
+        for field in schema.fields:
+            answers[field.field_id] = render_field(field)
 
         col1, col2 = st.columns(2)
         with col1:
@@ -154,23 +105,23 @@ def display_survey_form(survey_id, region_id, fields, survey_name):
             process_survey_submission(
                 survey_id,
                 region_id,
-                fields,
+                schema,
                 answers,
                 submitted,
                 survey_name
             )
 
-def render_field(field_id, label, field_type, options, is_required):
+def render_field(field):
     """Render different types of form fields"""
-    required_mark = " *" if is_required else ""
+    field_id, label, field_type = field.field_id, field.label, field.field_type
+    required_mark = " *" if field.is_required else ""
 
     if field_type == 'text':
         return st.text_input(label + required_mark, key=f"text_{field_id}")
     elif field_type == 'number':
         return st.number_input(label + required_mark, key=f"number_{field_id}")
     elif field_type == 'dropdown':
-        options_list = json.loads(options) if options else []
-        return st.selectbox(label + required_mark, options_list, key=f"dropdown_{field_id}")
+        return st.selectbox(label + required_mark, field.options, key=f"dropdown_{field_id}")
     elif field_type == 'checkbox':
         return st.checkbox(label + required_mark, key=f"checkbox_{field_id}")
     elif field_type == 'date':
@@ -179,9 +130,9 @@ def render_field(field_id, label, field_type, options, is_required):
         st.warning(f"نوع الحقل غير معروف: {field_type}")
         return None
 
-def process_survey_submission(survey_id, region_id, fields, answers, is_completed, survey_name):
+def process_survey_submission(survey_id, region_id, schema, answers, is_completed, survey_name):
     """Process survey form submission"""
-    missing_fields = check_required_fields(fields, answers)
+    missing_fields = check_required_fields(schema, answers)
 
     if missing_fields and is_completed:
         st.error(f"الحقول التالية مطلوبة: {', '.join(missing_fields)}")
@@ -191,38 +142,24 @@ def process_survey_submission(survey_id, region_id, fields, answers, is_complete
         st.error("لقد قمت بإكمال هذا الاستبيان اليوم بالفعل. يمكنك إكماله مرة أخرى غدًا.")
         return
 
-    response_id = save_response(
+    response_id = submit_response(
         survey_id=survey_id,
         user_id=st.session_state.user_id,
         region_id=region_id,
-        is_completed=is_completed
+        answers=answers,
+        is_completed=is_completed,
+        survey_version=schema.version
     )
 
     if not response_id:
         st.error("حدث خطأ أثناء حفظ البيانات")
         return
 
-    save_response_details(response_id, answers)
     show_submission_message(is_completed, survey_name)
 
-def check_required_fields(fields, answers):
+def check_required_fields(schema, answers):
     """Check for missing required fields"""
-    missing_fields = []
-    for field in fields:
-        field_id, label, _, _, is_required, _ = field
-        if is_required and not answers.get(field_id):
-            missing_fields.append(label)
-    return missing_fields
-
-def save_response_details(response_id, answers):
-    """Save all response details to database"""
-    for field_id, answer in answers.items():
-        if answer is not None:
-            save_response_detail(
-                response_id=response_id,
-                field_id=field_id,
-                answer_value=str(answer)
-            )
+    return schema.missing_required(answers)
 
 def show_submission_message(is_completed, survey_name):
     """Show appropriate submission message"""
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from typing import Dict, Optional, Tuple
+
+# ملفات التصدير الجاهزة على القرص، بمفتاح (الاستبيان، الصيغة، النطاق، علامة البيانات).
+# علامة البيانات (get_survey_watermark) تتغير مع أي إجابة جديدة أو تعديل أو حذف أو تغيير اسم
+# مستخدم أو إدارة صحية أو محافظة، فإذا لم تتغير منذ آخر تصدير يُعاد نفس الملف بدلاً من قراءة
+# كل الإجابات وبناء الملف من جديد.
+# حجم المجلد محدود بـ EXPORT_CACHE_MAX_MB ويُحذف الأقدم استخدامًا أولاً.
+
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', 'export_cache')
+EXPORT_CACHE_MAX_BYTES = int(float(os.getenv('EXPORT_CACHE_MAX_MB', '500')) * 1024 * 1024)
+
+logger = logging.getLogger('export_cache')
+
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+
+def cache_key(survey_id: int, fmt: str, scope: str, watermark: Tuple) -> str:
+    """اسم ملف التصدير في المجلد (الاستبيان والنطاق ظاهران لتسهيل المتابعة)"""
+    digest = hashlib.sha1(repr(tuple(watermark)).encode('utf-8')).hexdigest()[:16]
+    return f"survey{survey_id}_{scope}_{digest}.{fmt}"
+
+def lookup(key: str) -> Optional[str]:
+    """مسار الملف المحفوظ إن وجد؛ يُحدَّث وقت تعديله ليبقى الأحدث استخدامًا"""
+    global _hits, _misses
+    path = os.path.join(EXPORT_CACHE_DIR, key)
+    with _lock:
+        try:
+            os.utime(path)
+        except OSError:
+            _misses += 1
+            return None
+        _hits += 1
+        return path
+
+def store(key: str, source_path: str) -> str:
+    """نسخ ملف تصدير مكتمل إلى المجلد ثم حذف الأقدم إذا تجاوز الحجم الحد"""
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_CACHE_DIR, key)
+    # النسخ لملف مؤقت ثم إعادة التسمية حتى لا يُقرأ ملف ناقص
+    temporary = f"{path}.{threading.get_ident()}.tmp"
+    shutil.copyfile(source_path, temporary)
+    os.replace(temporary, path)
+    evict(keep=key)
+    return path
+
+def _entries():
+    try:
+        names = os.listdir(EXPORT_CACHE_DIR)
+    except FileNotFoundError:
+        return []
+    entries = []
+    for name in names:
+        if name.endswith('.tmp'):
+            continue
+        try:
+            info = os.stat(os.path.join(EXPORT_CACHE_DIR, name))
+        except OSError:
+            continue
+        entries.append((info.st_mtime, info.st_size, name))
+    return entries
+
+def evict(max_bytes: int = None, keep: str = None) -> int:
+    """حذف الملفات الأقدم استخدامًا حتى يصبح الحجم ضمن الحد، وإرجاع عدد المحذوف"""
+    max_bytes = EXPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    removed = 0
+    with _lock:
+        entries = sorted(_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= max_bytes:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(EXPORT_CACHE_DIR, name))
+            except OSError as e:
+                logger.warning("تعذر حذف ملف التصدير %s: %s", name, e)
+                continue
+            total -= size
+            removed += 1
+    return removed
+
+def cache_stats() -> Dict[str, int]:
+    """مرات الإيجاد وعدمه منذ بدء العملية، وعدد الملفات وحجمها"""
+    entries = _entries()
+    return {'hits': _hits, 'misses': _misses, 'files': len(entries),
+            'bytes': sum(size for _, size, _ in entries)}
@@ -0,0 +1,284 @@
+import csv
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from storage import get_compiled_survey
+from storage.errors import NotFoundError
+from storage.exports import (
+    get_all_survey_fields,
+    get_survey_name,
+    get_survey_partitions,
+    get_survey_responses,
+    iter_response_details,
+    iter_response_values
+)
+
+SUMMARY_COLUMNS = ["ID", "المستخدم", "الإدارة الصحية", "المحافظة", "تاريخ التقديم", "الحالة"]
+DETAIL_COLUMNS = ["ID الإجابة", "الحقل", "القيمة", "أدخلها", "تاريخ الإدخال", "حالة الإجابة"]
+
+# progress(عدد الإجابات المعالجة في الدفعة، آخر رقم إجابة)
+ProgressCallback = Callable[[int, int], None]
+
+# عدد العمليات لبناء ملفات حزمة المحافظات (0 = عدد المعالجات)
+BUNDLE_WORKERS = int(os.getenv('BUNDLE_WORKERS', '0')) or os.cpu_count() or 1
+
+def _status(is_completed) -> str:
+    return "مكتملة" if is_completed else "مسودة"
+
+def _detail_row(row) -> tuple:
+    return (row[0], row[1], row[2], row[3], row[4], _status(row[5]))
+
+def write_survey_workbook(target, survey_id: int, batch_size: int = 500,
+                          progress: Optional[ProgressCallback] = None,
+                          since: Optional[Tuple] = None, up_to: Optional[Tuple] = None,
+                          region_ids: Optional[List[int]] = None) -> None:
+    """كتابة ملف Excel شامل للاستبيان (ملخص، تفاصيل، حقول، مستخدمين) في مسار أو ملف مفتوح
+
+    مع since و up_to (انظر storage.exports) يحتوي الملف على الإجابات الجديدة أو المعدلة
+    بعد نقطة التصدير فقط، بنفس الأوراق والأعمدة. region_ids يقصره على إدارات صحية معينة.
+    """
+    if get_survey_name(survey_id) is None:
+        raise NotFoundError("الاستبيان المحدد غير موجود")
+
+    responses = get_survey_responses(survey_id, since, up_to, region_ids)
+    schema = get_compiled_survey(survey_id)
+
+    # التفاصيل تُقرأ على دفعات باستعلامين لكل دفعة بدلاً من استعلام لكل إجابة
+    details = []
+    for last_id, count, rows in iter_response_details(survey_id, batch_size=batch_size,
+                                                      since=since, up_to=up_to, region_ids=region_ids):
+        details.extend(_detail_row(row) for row in rows)
+        if progress:
+            progress(count, last_id)
+
+    with pd.ExcelWriter(target, engine='openpyxl') as writer:
+        # 1. ورقة ملخص الإجابات
+        pd.DataFrame(
+            [(r[0], r[1], r[2], r[3], r[4], _status(r[5])) for r in responses],
+            columns=SUMMARY_COLUMNS
+        ).to_excel(writer, sheet_name='ملخص_الإجابات', index=False)
+
+        # 2. ورقة تفاصيل جميع الإجابات
+        if details:
+            pd.DataFrame(details, columns=DETAIL_COLUMNS).to_excel(
+                writer, sheet_name='تفاصيل_الإجابات', index=False)
+
+        # 3. ورقة حقول الاستبيان
+        pd.DataFrame(
+            [(f.label, f.field_type, f.options or None, "نعم" if f.is_required else "لا")
+             for f in schema.fields],
+            columns=["اسم الحقل", "نوع الحقل", "الخيارات", "مطلوب"]
+        ).to_excel(writer, sheet_name='حقول_الاستبيان', index=False)
+
+        # 4. ورقة المستخدمين الذين أدخلوا بيانات
+        pd.DataFrame(
+            [(r[1], r[2], r[3], r[4], _status(r[5])) for r in responses],
+            columns=["المستخدم", "الإدارة الصحية", "المحافظة", "تاريخ التقديم", "الحالة"]
+        ).drop_duplicates().to_excel(writer, sheet_name='المستخدمين', index=False)
+
+def export_survey_details_csv(path: str, survey_id: int, resume_from: Optional[Tuple[int, int]] = None,
+                              batch_size: int = 500,
+                              progress: Optional[ProgressCallback] = None,
+                              on_checkpoint: Optional[Callable[[int, int], None]] = None) -> int:
+    """تصدير تفاصيل الإجابات إلى CSV على دفعات مع إمكانية الاستئناف
+
+    resume_from هي (آخر رقم إجابة، حجم الملف) من نقطة استئناف سابقة: يُقص الملف
+    لهذا الحجم ثم تُضاف الدفعات التالية، فلا تتكرر صفوف دفعة لم تكتمل. يُستدعى
+    on_checkpoint بنفس القيمتين بعد كتابة كل دفعة على القرص.
+    تُرجع آخر رقم إجابة تم تصديره.
+    """
+    if get_survey_name(survey_id) is None:
+        raise NotFoundError("الاستبيان المحدد غير موجود")
+
+    after_response_id, offset = resume_from if resume_from and os.path.exists(path) else (0, 0)
+    with open(path, 'a' if offset else 'w', newline='', encoding='utf-8-sig') as f:
+        if offset:
+            f.truncate(offset)
+        writer = csv.writer(f)
+        if not offset:
+            writer.writerow(DETAIL_COLUMNS)
+        for last_id, count, rows in iter_response_details(survey_id, after_response_id, batch_size):
+            writer.writerows(_detail_row(row) for row in rows)
+            f.flush()
+            os.fsync(f.fileno())
+            after_response_id = last_id
+            if on_checkpoint:
+                on_checkpoint(last_id, f.tell())
+            if progress:
+                progress(count, last_id)
+    return after_response_id
+
+# تصدير الجدول للتحليل: صف لكل إجابة وعمود لكل حقل بنوعه (CSV أو Parquet)
+TABLE_FORMATS = ('csv', 'parquet')
+TABLE_COLUMNS = SUMMARY_COLUMNS + ["إصدار الاستبيان"]
+# نوع أعمدة الإجابة الثابتة في Parquet
+_TABLE_COLUMN_TYPES = ['int', 'text', 'text', 'text', 'timestamp', 'checkbox', 'int']
+
+def _to_number(value: str):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def _to_bool(value: str):
+    return {'True': True, 'true': True, '1': True, 'False': False, 'false': False, '0': False}.get(value.strip())
+
+def _to_date(value: str):
+    try:
+        return date.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+# تحويل القيمة النصية المخزنة حسب نوع الحقل؛ القيم غير الصالحة تصبح فارغة
+FIELD_CONVERTERS = {'number': _to_number, 'checkbox': _to_bool, 'date': _to_date}
+
+def survey_table_columns(survey_id: int) -> Tuple[List[str], List[str], Dict[int, int]]:
+    """(أسماء الأعمدة، أنواعها، رقم الحقل -> رقم العمود) لجدول الاستبيان
+
+    الحقول تُجمع بالتسمية عبر الإصدارات؛ إذا اختلف نوع نفس التسمية بين الإصدارات يصبح نصًا.
+    """
+    field_types: Dict[str, str] = {}
+    field_ids: Dict[str, List[int]] = {}
+    for field_id, label, field_type in get_all_survey_fields(survey_id):
+        if label in TABLE_COLUMNS:
+            label = f"{label} (حقل)"
+        if field_types.setdefault(label, field_type) != field_type:
+            field_types[label] = 'text'
+        field_ids.setdefault(label, []).append(field_id)
+
+    names = TABLE_COLUMNS + list(field_types)
+    types = _TABLE_COLUMN_TYPES + list(field_types.values())
+    index = {field_id: len(TABLE_COLUMNS) + position
+             for position, ids in enumerate(field_ids.values()) for field_id in ids}
+    return names, types, index
+
+def iter_survey_table(survey_id: int, row_group_size: int = 10000,
+                      columns: Tuple = None) -> Iterator[List[List]]:
+    """صفوف جدول الاستبيان على دفعات من row_group_size إجابة، من استعلام واحد متدفق"""
+    names, types, index = columns or survey_table_columns(survey_id)
+    converters = [FIELD_CONVERTERS.get(t) for t in types]
+    empty = [None] * (len(names) - len(TABLE_COLUMNS))
+    batch: List[List] = []
+    current = None
+    for rows in iter_response_values(survey_id):
+        for response_id, username, admin, governorate, submitted, completed, version, field_id, answer in rows:
+            if current is None or current[0] != response_id:
+                # تفاصيل الإجابة متتالية لأن الاستعلام مرتب برقم الإجابة
+                if current is not None:
+                    batch.append(current)
+                    if len(batch) >= row_group_size:
+                        yield batch
+                        batch = []
+                current = [response_id, username, admin, governorate, submitted, bool(completed), version] + empty
+            column = index.get(field_id)
+            if column is not None and answer is not None and answer != '':
+                convert = converters[column]
+                current[column] = convert(answer) if convert else answer
+    if current is not None:
+        batch.append(current)
+    if batch:
+        yield batch
+
+def _arrow_schema(names: List[str], types: List[str]):
+    import pyarrow as pa
+    arrow_types = {'int': pa.int64(), 'number': pa.float64(), 'checkbox': pa.bool_(),
+                   'date': pa.date32(), 'timestamp': pa.timestamp('us')}
+    return pa.schema([(name, arrow_types.get(t, pa.string())) for name, t in zip(names, types)])
+
+def write_survey_table(target, survey_id: int, fmt: str = 'parquet', row_group_size: int = 10000,
+                       progress: Optional[ProgressCallback] = None) -> int:
+    """تصدير جدول الاستبيان (صف لكل إجابة وعمود لكل حقل) إلى CSV أو Parquet دون تحميله كاملاً
+
+    كل دفعة تُكتب فور قراءتها (مجموعة صفوف في Parquet)، فالذاكرة محدودة بحجم الدفعة.
+    أعمدة Parquet مكتوبة بأنواع الحقول (رقم، منطقي، تاريخ، نص). تُرجع عدد الإجابات.
+    """
+    if get_survey_name(survey_id) is None:
+        raise NotFoundError("الاستبيان المحدد غير موجود")
+    if fmt not in TABLE_FORMATS:
+        raise ValueError(f"صيغة غير مدعومة: {fmt}")
+
+    columns = survey_table_columns(survey_id)
+    names, types, _ = columns
+    total = 0
+    if fmt == 'csv':
+        with open(target, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for batch in iter_survey_table(survey_id, row_group_size, columns):
+                writer.writerows(batch)
+                total += len(batch)
+                if progress:
+                    progress(len(batch), batch[-1][0])
+        return total
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("تصدير Parquet يحتاج الحزمة pyarrow (pip install pyarrow)") from e
+    schema = _arrow_schema(names, types)
+    with pq.ParquetWriter(target, schema, compression='zstd') as writer:
+        for batch in iter_survey_table(survey_id, row_group_size, columns):
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=len(batch))
+            total += len(batch)
+            if progress:
+                progress(len(batch), batch[-1][0])
+    return total
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _write_partition(path: str, survey_id: int, region_ids: List[int], batch_size: int) -> str:
+    # عملية Python جديدة تشغل exports_worker باسمه (لا multiprocessing: عمليات spawn تعيد تشغيل
+    # وحدة __main__ للعملية الأم، وهي صفحة Streamlit)، وتفتح اتصالاتها بالقاعدة بنفسها
+    result = subprocess.run(
+        [sys.executable, '-m', 'exports_worker', path, str(survey_id), str(batch_size), json.dumps(region_ids)],
+        cwd=_PROJECT_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(f"تعذر بناء ملف القسم: {lines[-1] if lines else result.returncode}")
+    return path
+
+def write_survey_bundle(target, survey_id: int, by: str = 'governorate', workers: int = None,
+                        batch_size: int = 500, progress: Optional[Callable[[int, str], None]] = None) -> int:
+    """ملف zip فيه ملف Excel لكل محافظة (أو إدارة صحية مع by='region') بنفس أوراق التصدير الشامل
+
+    كل ملف يُبنى في عملية منفصلة والأقسام الأكبر تبدأ أولاً، فيقترب الزمن الكلي من زمن
+    أكبر قسم بدلاً من مجموعها. progress(عدد إجابات القسم المكتمل، اسمه). تُرجع عدد الملفات.
+    """
+    if get_survey_name(survey_id) is None:
+        raise NotFoundError("الاستبيان المحدد غير موجود")
+
+    partitions = get_survey_partitions(survey_id, by)
+    workers = max(1, min(workers or BUNDLE_WORKERS, len(partitions)))
+    with tempfile.TemporaryDirectory() as directory:
+        # كل خيط ينتظر عملية منفصلة تبني ملف قسم (عملية جديدة بدلاً من fork: العملية الأم قد
+        # تحتوي خيوطًا واتصالات مفتوحة)، فلا يعمل أكثر من workers عملية في نفس الوقت
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bundle')
+        try:
+            futures = {}
+            for number, (_, name, region_ids, count) in enumerate(partitions, 1):
+                path = os.path.join(directory, f"{number}.xlsx")
+                future = pool.submit(_write_partition, path, survey_id, region_ids, batch_size)
+                futures[future] = (name, count)
+            # ملفات xlsx مضغوطة أصلاً، فتُخزن في الحزمة دون ضغط
+            with zipfile.ZipFile(target, 'w', zipfile.ZIP_STORED) as archive:
+                for future in as_completed(futures):
+                    name, count = futures[future]
+                    archive.write(future.result(), re.sub(r'[^\w\- ]', '_', name) + ".xlsx")
+                    if progress:
+                        progress(count, name)
+        finally:
+            pool.shutdown(cancel_futures=True)
+    return len(partitions)
@@ -0,0 +1,24 @@
+"""بناء ملف Excel لقسم واحد من حزمة التصدير في عملية منفصلة
+
+يشغله exports.write_survey_bundle بالأمر:
+    python -m exports_worker <مسار الملف> <رقم الاستبيان> <حجم الدفعة> <أرقام الإدارات JSON>
+
+الوحدة تُشغل باسمها (-m) فلا تحتاج العملية الجديدة إلى وحدة __main__ الخاصة بالعملية الأم
+(صفحة Streamlit)، ولا يُغير شيء في حالة العملية الأم.
+"""
+import json
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from exports import write_survey_workbook
+
+def main(argv=None) -> int:
+    path, survey_id, batch_size, region_ids = argv if argv is not None else sys.argv[1:]
+    write_survey_workbook(path, int(survey_id), int(batch_size), region_ids=json.loads(region_ids))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
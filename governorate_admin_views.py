@@ -1,22 +1,22 @@
 import streamlit as st
 import pandas as pd
-import json
 from database import (
     get_governorate_admin_data,
     get_governorate_surveys,
     get_governorate_employees,
+    get_governorate_compliance,
     update_survey,
     get_survey_fields,
+    get_compiled_survey,
     update_user,
     get_user_allowed_surveys,
     update_user_allowed_surveys,
     get_response_info,
     get_response_details,
-    update_response_detail,
+    update_response_details,
     get_db_connection
 )
-import psycopg2
-import psycopg2.extras
+from profiling import section
 
 def show_governorate_admin_dashboard():
     """Main function to display governorate admin dashboard"""
@@ -35,18 +35,21 @@ def show_governorate_admin_dashboard():
     st.title(f"لوحة تحكم محافظة {governorate_name}")
     st.markdown(f"**وصف المحافظة:** {description}")
 
-    tab1, tab2, tab3 = st.tabs([
+    tab1, tab2, tab3, tab4 = st.tabs([
         "📋 إدارة الاستبيانات",
         "📊 عرض البيانات", 
-        "👥 إدارة الموظفين"
+        "👥 إدارة الموظفين",
+        "✅ متابعة الإرسال اليومي"
     ])
 
-    with tab1:
+    with tab1, section("manage_governorate_surveys"):
         manage_governorate_surveys(governorate_id, governorate_name)
-    with tab2:
+    with tab2, section("view_governorate_data"):
         view_governorate_data(governorate_id, governorate_name)
-    with tab3:
+    with tab3, section("manage_governorate_employees"):
         manage_governorate_employees(governorate_id, governorate_name)
+    with tab4, section("governorate_compliance"):
+        show_governorate_compliance(governorate_id, governorate_name)
 
 def manage_governorate_surveys(governorate_id, governorate_name):
     """Manage surveys for the governorate"""
@@ -86,7 +89,7 @@ def edit_governorate_survey(survey_id, governorate_id):
     try:
         conn = get_db_connection()
         if conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            with conn.cursor(dict_rows=True) as cur:
                 cur.execute("""
                     SELECT survey_id, survey_name, created_at, is_active 
                     FROM Surveys 
@@ -156,12 +159,19 @@ def view_governorate_data(governorate_id, governorate_name):
     if selected_survey:
         view_survey_responses(selected_survey[0], governorate_id)
 
+def reset_response_editor(response_id, details):
+    """Drop the response editor's widget values and version together so both reload from the database"""
+    for detail in details:
+        st.session_state.pop(f"edit_dropdown_{detail[0]}_{response_id}", None)
+        st.session_state.pop(f"edit_input_{detail[0]}_{response_id}", None)
+    st.session_state.pop(f"response_version_{response_id}", None)
+
 def view_survey_responses(survey_id, governorate_id):
     """View and manage survey responses"""
     try:
         conn = get_db_connection()
         if conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            with conn.cursor(dict_rows=True) as cur:
                 # Get survey info
                 cur.execute("""
                     SELECT survey_id, survey_name, created_at 
@@ -243,10 +253,19 @@ def view_survey_responses(survey_id, governorate_id):
                 **الإدارة الصحية:** {response_info[3]}
                 **المحافظة:** {response_info[4]}
                 **تاريخ التقديم:** {response_info[5]}
+                **إصدار الاستبيان:** {response_info[6]}
                 """)
 
                 details = get_response_details(selected_response_id)
+                schema = get_compiled_survey(survey_id, response_info[6])
+                if schema is None:
+                    return
                 updates = {}
+                errors = {}
+
+                version_key = f"response_version_{selected_response_id}"
+                if version_key not in st.session_state:
+                    st.session_state[version_key] = response_info[7]
 
                 with st.form(key=f"edit_response_{survey_id}_{governorate_id}_{selected_response_id}"):
                     for detail in details:
@@ -257,7 +276,7 @@ def view_survey_responses(survey_id, governorate_id):
                             st.markdown(f"**{label}**")
                         with col2:
                             if field_type == 'dropdown':
-                                options_list = json.loads(options) if options else []
+                                options_list = schema.options(field_id)
                                 new_value = st.selectbox(
                                     f"تعديل {label}",
                                     options_list,
@@ -273,25 +292,31 @@ def view_survey_responses(survey_id, governorate_id):
 
                             if new_value != answer:
                                 updates[detail_id] = new_value
+                                field = schema.by_id.get(field_id)
+                                error = field.validate(new_value) if field else None
+                                if error:
+                                    errors[label] = error
 
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.form_submit_button("💾 حفظ جميع التعديلات"):
-                            if updates:
-                                success_count = 0
-                                for detail_id, new_value in updates.items():
-                                    if update_response_detail(detail_id, new_value):
-                                        success_count += 1
-
-                                if success_count == len(updates):
+                            if errors:
+                                st.error("قيم غير صالحة: " + "، ".join(f"{k} ({v})" for k, v in errors.items()))
+                            elif updates:
+                                # On conflict keep the stale version so a second click can't overwrite until reload
+                                if update_response_details(
+                                    selected_response_id, updates, st.session_state[version_key]
+                                ):
+                                    del st.session_state[version_key]
                                     st.success("تم تحديث جميع التعديلات بنجاح")
+                                    st.rerun()
                                 else:
-                                    st.error(f"تم تحديث {success_count} من أصل {len(updates)} تعديلات")
-                                st.rerun()
+                                    st.warning("اضغط «إلغاء التعديلات» لإعادة تحميل أحدث نسخة من الإجابة")
                             else:
                                 st.info("لم تقم بإجراء أي تعديلات")
                     with col2:
                         if st.form_submit_button("❌ إلغاء التعديلات"):
+                            reset_response_editor(selected_response_id, details)
                             st.rerun()
 
     except Exception as e:
@@ -332,7 +357,7 @@ def edit_employee(user_id, governorate_id):
     try:
         conn = get_db_connection()
         if conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            with conn.cursor(dict_rows=True) as cur:
                 # Get employee info
                 cur.execute("""
                     SELECT
@@ -426,3 +451,38 @@ def edit_employee(user_id, governorate_id):
 
     except Exception as e:
         st.error(f"حدث خطأ في قاعدة البيانات: {str(e)}")
+
+def show_governorate_compliance(governorate_id, governorate_name):
+    """Show which employees have and haven't completed their assigned surveys for a day"""
+    st.subheader(f"متابعة الإرسال اليومي - محافظة {governorate_name}")
+
+    # Left empty, the day is taken from the database clock
+    day = st.date_input("اليوم", value=None, key="compliance_day",
+                        help="اتركه فارغًا لليوم الحالي")
+    rows = get_governorate_compliance(governorate_id, day)
+    if not rows:
+        st.info("لا يوجد موظفون لديهم استبيانات مفعلة مسموح بها في هذه المحافظة")
+        return
+
+    df = pd.DataFrame(rows, columns=["admin_id", "الإدارة الصحية", "user_id", "الموظف",
+                                     "الاستبيانات المسموح بها", "المتبقية", "آخر إرسال"])
+    pending = df[df["المتبقية"] > 0]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("الموظفون", len(df))
+    col2.metric("أكملوا جميع الاستبيانات", len(df) - len(pending))
+    col3.metric("لم يكملوا بعد", len(pending))
+
+    only_pending = st.checkbox("عرض من لم يكملوا فقط", value=True, key="compliance_only_pending")
+    for admin_name, employees in df.groupby("الإدارة الصحية", sort=False):
+        remaining = int((employees["المتبقية"] > 0).sum())
+        if only_pending and not remaining:
+            continue
+        with st.expander(f"{admin_name} — لم يكمل {remaining} من {len(employees)}", expanded=remaining > 0):
+            shown = employees[employees["المتبقية"] > 0] if only_pending else employees
+            shown = shown.assign(الحالة=shown["المتبقية"].apply(lambda n: "⏳ متبقي" if n else "✅ مكتمل"))
+            st.dataframe(
+                shown[["الموظف", "الحالة", "الاستبيانات المسموح بها", "المتبقية", "آخر إرسال"]],
+                use_container_width=True,
+                hide_index=True
+            )
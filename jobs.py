@@ -0,0 +1,264 @@
+import logging
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import export_cache
+import metrics
+from exports import TABLE_FORMATS, write_survey_bundle, write_survey_table, write_survey_workbook
+from storage import instrumentation
+from storage import jobs as job_store
+from storage import replica
+from storage.exports import (
+    count_survey_responses,
+    get_change_watermark,
+    get_export_checkpoint,
+    get_survey_name,
+    get_survey_watermark,
+    save_export_checkpoint
+)
+
+# تشغيل المهام الطويلة (مثل التصدير الشامل) في خيوط خلفية داخل عملية Streamlit.
+# حالة كل مهمة وتقدمها في جدول BackgroundJobs، لذلك يمكن للمستخدم مغادرة الصفحة والعودة
+# إليها، والضغط مرة ثانية على نفس التصدير يعيد المهمة الجارية بدلاً من تشغيلها من جديد.
+# النتائج تُحفظ في JOBS_DIR وتُحذف بعد JOB_RESULT_TTL_HOURS.
+# كل عملية تسجل نفسها مالكة لمهامها وتحدث إشارة حياتها كل JOB_HEARTBEAT_SECONDS، فلا تُغلق
+# إلا مهامها بعد إعادة تشغيلها أو مهام عملية توقفت إشارتها لأكثر من JOB_STALE_SECONDS.
+
+JOBS_DIR = os.getenv('JOBS_DIR', 'job_results')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_RESULT_TTL = timedelta(hours=float(os.getenv('JOB_RESULT_TTL_HOURS', '24')))
+# أقل فاصل بين تحديثات التقدم في قاعدة البيانات
+PROGRESS_INTERVAL_SECONDS = 1.0
+# عمر النسخة التحليلية الذي تُطلب بعده مزامنة جديدة عند فتح التحليلات
+REPLICA_MAX_AGE = timedelta(seconds=float(os.getenv('REPLICA_MAX_AGE_SECONDS', '300')))
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '30'))
+JOB_STALE_AFTER = timedelta(seconds=float(os.getenv('JOB_STALE_SECONDS', '120')))
+# مالك المهام: معرف ثابت للنسخة (افتراضيًا اسم الجهاز) يبقى كما هو بعد إعادة التشغيل، فتجد
+# العملية الجديدة مهام سابقتها. إذا عملت عدة عمليات على نفس الجهاز يُحدد لكل منها JOB_INSTANCE_ID
+OWNER = os.getenv('JOB_INSTANCE_ID') or socket.gethostname()
+
+logger = logging.getLogger('jobs')
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+def _heartbeat_loop() -> None:
+    """تحديث إشارة حياة مهام هذه العملية، وإغلاق مهام العمليات التي توقفت إشارتها"""
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            job_store.heartbeat(OWNER)
+            job_store.fail_interrupted_jobs(JOB_RESULT_TTL, datetime.now() - JOB_STALE_AFTER)
+        except Exception:
+            logger.exception("تعذر تحديث إشارة حياة المهام")
+
+def _get_executor() -> ThreadPoolExecutor:
+    """مجمع الخيوط (مرة واحدة لكل عملية)؛ عند إنشائه تُغلق المهام التي قطعتها إعادة تشغيل سابقة"""
+    global _executor
+    if _executor is None:
+        job_store.fail_interrupted_jobs(JOB_RESULT_TTL, datetime.now() - JOB_STALE_AFTER, OWNER)
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        threading.Thread(target=_heartbeat_loop, name='job-heartbeat', daemon=True).start()
+    return _executor
+
+class _Progress:
+    """تحديث تقدم المهمة في قاعدة البيانات بفاصل زمني أدنى بدلاً من كل دفعة"""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.done = 0
+        self.last_write = 0.0
+
+    def __call__(self, count: int, position=None):
+        instrumentation.next_batch()
+        self.done += count
+        now = time.monotonic()
+        if now - self.last_write >= PROGRESS_INTERVAL_SECONDS:
+            self.last_write = now
+            job_store.update_progress(self.job_id, self.done)
+
+def _result_file(job_id: int, survey_id: int, suffix: str, fmt: str = 'xlsx'):
+    """(المسار في JOBS_DIR، اسم الملف عند التنزيل)"""
+    survey_name = get_survey_name(survey_id) or str(survey_id)
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    result_name = (re.sub(r'[^\w\-_]', '_', survey_name) + f"_{suffix}_"
+                   + datetime.now().strftime("%Y%m%d_%H%M") + f".{fmt}")
+    return os.path.join(JOBS_DIR, f"job_{job_id}.{fmt}"), result_name
+
+def _build(fmt: str, write: Callable[[], None]) -> None:
+    """تنفيذ دالة بناء الملف مع تسجيل نتيجتها وزمنها في المقاييس"""
+    started = time.perf_counter()
+    try:
+        write()
+    except Exception:
+        metrics.EXPORTS.inc(format=fmt, result='error')
+        raise
+    metrics.EXPORTS.inc(format=fmt, result='success')
+    metrics.EXPORT_SECONDS.observe(time.perf_counter() - started, format=fmt)
+
+def _build_cached(job_id: int, survey_id: int, fmt: str, scope: str, suffix: str,
+                  write: Callable[[str], None]) -> None:
+    """بناء نتيجة المهمة، أو نسخها من ذاكرة التصدير إذا لم تتغير البيانات منذ آخر بناء"""
+    result_path, result_name = _result_file(job_id, survey_id, suffix, fmt)
+    # العلامة تُقرأ قبل البناء: إذا تغيرت البيانات أثناءه يختلف المفتاح في الطلب التالي
+    cache_key = export_cache.cache_key(survey_id, fmt, scope, get_survey_watermark(survey_id))
+    cached = export_cache.lookup(cache_key)
+    if cached is not None:
+        shutil.copyfile(cached, result_path)
+        metrics.EXPORTS.inc(format=fmt, result='cached')
+    else:
+        _build(fmt, lambda: write(result_path))
+        export_cache.store(cache_key, result_path)
+    job_store.finish_job(job_id, result_path, result_name, JOB_RESULT_TTL)
+
+def _run_survey_export(job_id: int, params: Dict) -> None:
+    survey_id = params['survey_id']
+    job_store.start_job(job_id, count_survey_responses(survey_id))
+    _build_cached(job_id, survey_id, 'xlsx', 'full', "كامل",
+                  lambda path: write_survey_workbook(path, survey_id, progress=_Progress(job_id)))
+
+# تقسيم حزمة التصدير: اسم القسم في اسم الملف المنزل
+BUNDLE_PARTITIONS = {'governorate': "حسب_المحافظة", 'region': "حسب_الإدارة"}
+
+def _run_survey_bundle_export(job_id: int, params: Dict) -> None:
+    """ملف zip فيه ملف Excel لكل محافظة أو إدارة صحية، كل منها في عملية منفصلة"""
+    survey_id, by = params['survey_id'], params['by']
+    job_store.start_job(job_id, count_survey_responses(survey_id))
+    _build_cached(job_id, survey_id, 'zip', f"bundle_{by}", BUNDLE_PARTITIONS[by],
+                  lambda path: write_survey_bundle(path, survey_id, by, progress=_Progress(job_id)))
+
+def _run_survey_table_export(job_id: int, params: Dict) -> None:
+    """جدول الاستبيان للتحليل (صف لكل إجابة وعمود لكل حقل) بصيغة CSV أو Parquet"""
+    survey_id, fmt = params['survey_id'], params['format']
+    job_store.start_job(job_id, count_survey_responses(survey_id))
+    _build_cached(job_id, survey_id, fmt, 'table', "جدول",
+                  lambda path: write_survey_table(path, survey_id, fmt, progress=_Progress(job_id)))
+
+def _run_survey_delta_export(job_id: int, params: Dict) -> None:
+    """تصدير الإجابات الجديدة أو المعدلة منذ آخر تصدير تغييرات للمستخدم، ثم تحديث نقطته"""
+    survey_id, user_id = params['survey_id'], params['user_id']
+    checkpoint = get_export_checkpoint(user_id, survey_id)
+    # بدون نقطة سابقة يُصدر كل ما هو موجود الآن
+    since = tuple(checkpoint[:2]) if checkpoint else (0, None)
+    up_to = get_change_watermark(survey_id)
+    job_store.start_job(job_id, count_survey_responses(survey_id, since=since, up_to=up_to))
+    result_path, result_name = _result_file(job_id, survey_id, "تغييرات")
+
+    _build('xlsx', lambda: write_survey_workbook(result_path, survey_id, progress=_Progress(job_id),
+                                                 since=since, up_to=up_to))
+    save_export_checkpoint(user_id, survey_id, *up_to)
+    job_store.finish_job(job_id, result_path, result_name, JOB_RESULT_TTL)
+
+def _run_replica_sync(job_id: int, params: Dict) -> None:
+    """مزامنة النسخة التحليلية مع القاعدة الرئيسية (ما تغير منذ المزامنة السابقة فقط)"""
+    job_store.start_job(job_id)
+    replica.sync(progress=_Progress(job_id))
+    job_store.finish_job(job_id, None, None, JOB_RESULT_TTL)
+
+# نوع المهمة: الدالة التي تنفذها (تستقبل رقم المهمة ومعاملاتها)
+JOB_TYPES: Dict[str, Callable[[int, Dict], None]] = {
+    'survey_export': _run_survey_export,
+    'survey_delta_export': _run_survey_delta_export,
+    'survey_bundle_export': _run_survey_bundle_export,
+    'survey_table_export': _run_survey_table_export,
+    'replica_sync': _run_replica_sync,
+}
+
+def _run(job_type: str, job_id: int, params: Dict) -> None:
+    try:
+        # نطاق قياس لكل مهمة حتى يعمل كاشف N+1 فيها كما في إعادة تشغيل الصفحة
+        with instrumentation.scope(f"job:{job_type}"):
+            JOB_TYPES[job_type](job_id, params)
+    except Exception as e:
+        logger.exception("فشلت المهمة %s رقم %s", job_type, job_id)
+        try:
+            job_store.fail_job(job_id, str(e), JOB_RESULT_TTL)
+        except Exception:
+            logger.exception("تعذر تسجيل فشل المهمة %s", job_id)
+    try:
+        cleanup_expired()
+    except Exception:
+        logger.exception("تعذر حذف المهام المنتهية الصلاحية")
+
+def _job_key(job_type: str, params: Dict) -> str:
+    return f"{job_type}:" + ",".join(f"{k}={params[k]}" for k in sorted(params))
+
+def submit(job_type: str, params: Dict, created_by: int = None, force: bool = False) -> Dict:
+    """تشغيل مهمة في الخلفية، أو إرجاع المهمة المطابقة إذا كانت جارية أو لها نتيجة صالحة
+
+    مع force تُعاد المهمة الجارية فقط، وتبدأ مهمة جديدة بدلاً من إرجاع نتيجة سابقة.
+    """
+    job_key = _job_key(job_type, params)
+    with _lock:
+        # المجمع يُنشأ أولاً حتى لا تُعاد مهمة جارية قطعتها إعادة تشغيل سابقة
+        executor = _get_executor()
+        existing = job_store.find_job(job_key)
+        if existing is not None and (existing['status'] in job_store.ACTIVE_STATUSES or
+                                     (existing['status'] == 'done' and not force)):
+            return existing
+        job_id = job_store.create_job(job_type, job_key, params, created_by, OWNER)
+        executor.submit(_run, job_type, job_id, params)
+    return job_store.get_job(job_id)
+
+def _survey_export_job(survey_id: int, mode: str, user_id: int = None):
+    """(نوع المهمة، معاملاتها) لنوع التصدير: full أو delta (لكل مستخدم) أو أحد BUNDLE_PARTITIONS
+    أو TABLE_FORMATS"""
+    if mode == 'delta':
+        return 'survey_delta_export', {'survey_id': survey_id, 'user_id': user_id}
+    if mode in BUNDLE_PARTITIONS:
+        return 'survey_bundle_export', {'survey_id': survey_id, 'by': mode}
+    if mode in TABLE_FORMATS:
+        return 'survey_table_export', {'survey_id': survey_id, 'format': mode}
+    return 'survey_export', {'survey_id': survey_id}
+
+def submit_survey_export(survey_id: int, created_by: int = None, force: bool = False,
+                         mode: str = 'full') -> Dict:
+    job_type, params = _survey_export_job(survey_id, mode, created_by)
+    return submit(job_type, params, created_by, force)
+
+def latest_survey_export(survey_id: int, mode: str = 'full', user_id: int = None) -> Optional[Dict]:
+    """آخر تصدير جارٍ أو منتهٍ لم تنته صلاحيته للاستبيان بهذا النوع"""
+    with _lock:
+        _get_executor()
+    return job_store.find_job(_job_key(*_survey_export_job(survey_id, mode, user_id)))
+
+def refresh_replica(created_by: int = None, force: bool = False) -> Optional[Dict]:
+    """طلب مزامنة النسخة التحليلية إذا مضى عليها أكثر من REPLICA_MAX_AGE (أو دائمًا مع force)
+
+    يُرجع مهمة المزامنة الجارية أو الجديدة، أو None إذا كانت النسخة حديثة أو غير مفعلة.
+    """
+    if not replica.replica_path():
+        return None
+    status = replica.sync_status()
+    if not force and status is not None and datetime.now() - status['synced_at'] < REPLICA_MAX_AGE:
+        return None
+    # نتيجة المزامنة السابقة لا تُعاد: كل طلب بعد انتهاء العمر يحتاج مزامنة جديدة
+    return submit('replica_sync', {}, created_by, force=True)
+
+def read_result(job: Dict) -> Optional[bytes]:
+    """محتوى نتيجة المهمة إذا كانت ما زالت موجودة"""
+    path = job.get('result_path')
+    if job.get('status') != 'done' or not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+def cleanup_expired() -> int:
+    """حذف المهام المنتهية الصلاحية وملفات نتائجها، وإرجاع عددها"""
+    expired = job_store.expired_jobs()
+    for job in expired:
+        path = job.get('result_path')
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("تعذر حذف نتيجة المهمة %s: %s", job['job_id'], e)
+    job_store.delete_jobs([job['job_id'] for job in expired])
+    return len(expired)
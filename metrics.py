@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+import export_cache
+from storage import analytics, instrumentation, survey_schema
+
+# مقاييس التشغيل بصيغة نص Prometheus على http://<host>:METRICS_PORT/metrics
+# الخادم يعمل في خيط داخل عملية Streamlit ولا يبدأ إلا إذا تم تحديد METRICS_PORT.
+# الجلسة تعتبر نشطة إذا أعادت تشغيل الصفحة خلال ACTIVE_SESSION_SECONDS (افتراضيًا 300).
+
+logger = logging.getLogger('metrics')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels_text(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """عداد تراكمي مع تسميات اختيارية (الاسم المنشور ينتهي بـ _total)"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name + '_total'
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _labels_text(self.labelnames, key), value
+
+class Histogram:
+    """توزيع القيم (بالثواني عادة) على حدود ثابتة"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # التسميات -> [عدد كل حد..., المجموع، العدد]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(entry) for key, entry in self._values.items()}
+        for key, entry in sorted(values.items()):
+            for bound, count in zip(self.buckets, entry):
+                yield self.name + '_bucket', _labels_text(self.labelnames, key, f'le="{bound}"'), count
+            yield self.name + '_bucket', _labels_text(self.labelnames, key, 'le="+Inf"'), entry[-1]
+            yield self.name + '_sum', _labels_text(self.labelnames, key), entry[-2]
+            yield self.name + '_count', _labels_text(self.labelnames, key), entry[-1]
+
+class Gauge:
+    """قيمة لحظية تُقرأ من دالة عند كل طلب للمقاييس"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def samples(self):
+        yield self.name, '', self.read()
+
+class CallbackCounter(Gauge):
+    """عداد تراكمي يحتفظ به مكون آخر ويُقرأ عند الطلب"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        super().__init__(name + '_total', documentation, read)
+
+_sessions: Dict[str, float] = {}
+_sessions_lock = threading.Lock()
+
+def touch_session(session_key: str) -> None:
+    """تسجيل نشاط جلسة (يُستدعى عند كل إعادة تشغيل للصفحة)"""
+    with _sessions_lock:
+        _sessions[session_key] = time.time()
+
+def _active_sessions() -> int:
+    cutoff = time.time() - int(os.getenv('ACTIVE_SESSION_SECONDS', '300'))
+    with _sessions_lock:
+        for key in [k for k, seen in _sessions.items() if seen < cutoff]:
+            del _sessions[key]
+        return len(_sessions)
+
+def _cache_hit_ratio() -> float:
+    stats = survey_schema.cache_stats()
+    lookups = stats['hits'] + stats['misses']
+    return stats['hits'] / lookups if lookups else 0.0
+
+SUBMISSIONS = Counter('survey_submissions', "الاستبيانات المرسلة حسب الحالة", ('status',))
+EXPORTS = Counter('survey_exports', "عمليات التصدير حسب الصيغة والنتيجة", ('format', 'result'))
+EXPORT_SECONDS = Histogram('survey_export_seconds', "زمن التصدير", ('format',),
+                           buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+LOGIN_ATTEMPTS = Counter('login_attempts', "محاولات تسجيل الدخول حسب النتيجة", ('result',))
+DB_CALL_SECONDS = Histogram('db_call_seconds', "زمن دوال database.py", ('function',))
+DB_ERRORS = Counter('db_errors', "أخطاء دوال database.py", ('function', 'error'))
+DB_QUERY_SECONDS = Histogram('db_query_seconds', "زمن الاستعلامات حسب الدالة المرسلة لها", ('function',))
+PAGE_SECONDS = Histogram('page_render_seconds', "زمن إعادة تشغيل الصفحة حسب الدور", ('role',))
+
+REGISTRY = [
+    SUBMISSIONS, EXPORTS, EXPORT_SECONDS, LOGIN_ATTEMPTS,
+    DB_CALL_SECONDS, DB_ERRORS, DB_QUERY_SECONDS, PAGE_SECONDS,
+    Gauge('db_connections_open', "اتصالات قاعدة البيانات المفتوحة الآن",
+          lambda: instrumentation.open_connections()['open']),
+    Gauge('db_connections_peak', "أعلى عدد اتصالات مفتوحة في نفس الوقت",
+          lambda: instrumentation.open_connections()['peak']),
+    CallbackCounter('db_connections_opened', "الاتصالات المفتوحة منذ بدء العملية",
+                    lambda: instrumentation.open_connections()['opened']),
+    CallbackCounter('survey_schema_cache_hits', "مرات إيجاد تعريف الاستبيان في الذاكرة",
+                    lambda: survey_schema.cache_stats()['hits']),
+    CallbackCounter('survey_schema_cache_misses', "مرات ترجمة تعريف الاستبيان من القاعدة",
+                    lambda: survey_schema.cache_stats()['misses']),
+    Gauge('survey_schema_cache_hit_ratio', "نسبة إيجاد تعريف الاستبيان في الذاكرة", _cache_hit_ratio),
+    Gauge('survey_schema_cache_size', "عدد التعريفات المترجمة في الذاكرة",
+          lambda: survey_schema.cache_stats()['size']),
+    CallbackCounter('export_cache_hits', "مرات إعادة ملف تصدير محفوظ لم تتغير بياناته",
+                    lambda: export_cache.cache_stats()['hits']),
+    CallbackCounter('export_cache_misses', "مرات بناء ملف التصدير لعدم وجوده محفوظًا",
+                    lambda: export_cache.cache_stats()['misses']),
+    Gauge('export_cache_bytes', "حجم ملفات التصدير المحفوظة على القرص",
+          lambda: export_cache.cache_stats()['bytes']),
+    CallbackCounter('crosstab_cache_hits', "مرات إعادة جدول تقاطعي محسوب لم تتغير بياناته",
+                    lambda: analytics.crosstab_cache_stats()['hits']),
+    CallbackCounter('crosstab_cache_misses', "مرات حساب الجدول التقاطعي من قاعدة البيانات",
+                    lambda: analytics.crosstab_cache_stats()['misses']),
+    Gauge('active_sessions', "الجلسات التي أعادت تشغيل الصفحة خلال ACTIVE_SESSION_SECONDS", _active_sessions),
+]
+
+def _observe_query(record) -> None:
+    # مكان الاستدعاء بصيغة "file.py:line function"
+    DB_QUERY_SECONDS.observe(record.duration_ms / 1000, function=record.call_site.rsplit(' ', 1)[-1])
+
+instrumentation.add_listener(_observe_query)
+
+def render() -> str:
+    """جميع المقاييس بصيغة نص Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        try:
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        except Exception as e:
+            logger.warning("تعذر قراءة المقياس %s: %s", metric.name, e)
+    return '\n'.join(lines) + '\n'
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def start_server(port: int = None) -> bool:
+    """تشغيل خادم المقاييس مرة واحدة لكل عملية (Streamlit يعيد تشغيل app.py مع كل تفاعل)"""
+    global _server
+    port = port or int(os.getenv('METRICS_PORT') or 0)
+    if not port:
+        return False
+    with _server_lock:
+        if _server is not None:
+            return True
+        try:
+            _server = ThreadingHTTPServer(('0.0.0.0', port), _Handler)
+        except OSError as e:
+            logger.warning("تعذر تشغيل خادم المقاييس على المنفذ %s: %s", port, e)
+            return False
+        threading.Thread(target=_server.serve_forever, name='metrics-server', daemon=True).start()
+        return True
@@ -0,0 +1,183 @@
+import contextvars
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from storage import instrumentation
+
+# قياس أداء إعادة تشغيل واحدة للصفحة: زمن كل قسم (مع زمن قاعدة البيانات فيه)، وملف cProfile
+# اختياري، وأعلى استهلاك للذاكرة عبر tracemalloc. الأقسام تُحدد في دوال الصفحات بـ section()
+# ولا تكلف شيئًا خارج وضع القياس. النتيجة ملف zip يمكن تحليله لاحقًا بـ pstats أو snakeviz.
+#
+# إذا تم تحديد PROFILE_DIR تُحفظ الملفات فيه أيضًا.
+#
+# cProfile و tracemalloc يعملان على مستوى العملية كلها، لذلك يُقاس بهما قياس واحد في نفس الوقت
+# (_profiler_lock). الجلسات الأخرى تُقاس أزمنة أقسامها فقط وتظهر بحالة "مشغول" (busy).
+
+TOP_ALLOCATIONS = 30
+
+_profiler_lock = threading.Lock()
+
+class SectionTiming:
+    """زمن قسم واحد من الصفحة"""
+
+    __slots__ = ('name', 'depth', 'wall_ms', 'db_ms', 'queries')
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.wall_ms = 0.0
+        self.db_ms = 0.0
+        self.queries = 0
+
+    def to_dict(self) -> Dict:
+        return {'section': self.name, 'depth': self.depth, 'wall_ms': round(self.wall_ms, 2),
+                'db_ms': round(self.db_ms, 2), 'other_ms': round(self.wall_ms - self.db_ms, 2),
+                'queries': self.queries}
+
+class PageProfile:
+    """نتيجة قياس إعادة تشغيل واحدة"""
+
+    def __init__(self, page: str, cpu: bool, memory: bool):
+        self.page = page
+        self.cpu = cpu
+        self.memory = memory
+        self.started_at = datetime.now()
+        self.sections: List[SectionTiming] = []
+        self.wall_ms = 0.0
+        self.db_ms = 0.0
+        self.queries = 0
+        self.peak_memory_kb: Optional[float] = None
+        self.top_allocations: List[str] = []
+        self.pstats_bytes: Optional[bytes] = None
+        self.cpu_summary = ''
+        # قياس آخر كان يستخدم cProfile و tracemalloc، فقيست الأزمنة فقط
+        self.busy = False
+        self._depth = 0
+
+    def summary(self) -> Dict:
+        return {
+            'page': self.page,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_ms': round(self.wall_ms, 2),
+            'db_ms': round(self.db_ms, 2),
+            'queries': self.queries,
+            'peak_memory_kb': self.peak_memory_kb,
+            'busy': self.busy,
+            'sections': [s.to_dict() for s in self.sections],
+        }
+
+    @property
+    def filename(self) -> str:
+        return f"profile_{self.page}_{self.started_at.strftime('%Y%m%d_%H%M%S')}.zip"
+
+    def artifact(self) -> bytes:
+        """ملف zip: sections.json، و cpu.prof (صيغة pstats) و cpu.txt، و memory.txt"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('sections.json', json.dumps(self.summary(), ensure_ascii=False, indent=2))
+            if self.pstats_bytes is not None:
+                archive.writestr('cpu.prof', self.pstats_bytes)
+                archive.writestr('cpu.txt', self.cpu_summary)
+            if self.top_allocations:
+                archive.writestr('memory.txt', '\n'.join(self.top_allocations))
+        return buffer.getvalue()
+
+_current: contextvars.ContextVar = contextvars.ContextVar('page_profile', default=None)
+
+def current() -> Optional[PageProfile]:
+    """القياس الجاري (None خارج وضع القياس)"""
+    return _current.get()
+
+@contextmanager
+def section(name: str):
+    """قسم من الصفحة يُقاس زمنه عند تفعيل القياس فقط"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    timing = SectionTiming(name, profile._depth)
+    profile.sections.append(timing)
+    profile._depth += 1
+    started = time.perf_counter()
+    try:
+        with instrumentation.scope(f"section:{name}") as stats:
+            yield
+    finally:
+        timing.wall_ms = (time.perf_counter() - started) * 1000
+        timing.db_ms = stats.db_ms
+        timing.queries = stats.query_count
+        profile._depth -= 1
+
+def _pstats_bytes(profiler: cProfile.Profile) -> bytes:
+    # نفس صيغة dump_stats، لكن في الذاكرة بدلاً من ملف
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+@contextmanager
+def profile_page(page: str, cpu: bool = True, memory: bool = True):
+    """قياس كل ما يُنفذ داخل الكتلة وإرجاع PageProfile بعد انتهائها"""
+    exclusive = (cpu or memory) and _profiler_lock.acquire(blocking=False)
+    result = PageProfile(page, cpu and exclusive, memory and exclusive)
+    result.busy = (cpu or memory) and not exclusive
+    cpu, memory = result.cpu, result.memory
+    token = _current.set(result)
+    profiler = cProfile.Profile() if cpu else None
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if memory:
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        with instrumentation.scope(f"profile:{page}") as stats:
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # أداة قياس أخرى خارج هذه الوحدة تعمل في العملية (Python 3.12+)
+                    profiler, result.cpu, result.busy = None, False, True
+            try:
+                yield result
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        result.wall_ms = (time.perf_counter() - started) * 1000
+        result.db_ms = stats.db_ms
+        result.queries = stats.query_count
+        try:
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+                result.peak_memory_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+                result.top_allocations = [str(stat) for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]]
+                if started_tracing:
+                    tracemalloc.stop()
+            if profiler is not None:
+                result.pstats_bytes = _pstats_bytes(profiler)
+                text = io.StringIO()
+                pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(40)
+                result.cpu_summary = text.getvalue()
+        finally:
+            _current.reset(token)
+            if exclusive:
+                _profiler_lock.release()
+        _save(result)
+
+def _save(result: PageProfile) -> None:
+    directory = os.getenv('PROFILE_DIR')
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, result.filename), 'wb') as f:
+        f.write(result.artifact())
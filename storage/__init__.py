@@ -0,0 +1,32 @@
+"""طبقة الوصول للبيانات بدون أي اعتماد على Streamlit
+
+الدوال ترفع استثناءات من storage.errors وتستقبل المستخدم المنفذ صراحة (acting_user_id)،
+لذا يمكن استدعاؤها من الخيوط الخلفية والمهام الدفعية. واجهات Streamlit تستخدمها عبر database.py.
+"""
+from storage.errors import (
+    DataAccessError, DatabaseError, NotFoundError,
+    DuplicateError, ConflictError, ValidationError, NPlusOneError
+)
+from storage.core import get_db_connection, connection
+from storage.schema import init_db
+from storage.users import (
+    hash_password, get_user_by_username, get_user_role, update_last_login,
+    update_user_activity, add_user, update_user, get_user_allowed_surveys,
+    update_user_allowed_surveys, get_all_users_for_admin_view
+)
+from storage.regions import (
+    get_governorates_list, add_health_admin, get_health_admins, get_governorate_health_admins,
+    get_health_admin_name,
+    add_governorate_admin, get_governorate_admin, get_governorate_admin_data,
+    get_governorate_surveys, get_governorate_employees, get_governorate_compliance
+)
+from storage.surveys import (
+    save_survey, update_survey, delete_survey, get_survey_fields,
+    get_compiled_survey, get_survey_by_id
+)
+from storage.responses import (
+    save_response, submit_response, save_response_detail, get_response_info, get_response_details,
+    update_response_detail, update_response_details, has_completed_survey_today,
+    get_employee_dashboard_data
+)
+from storage.audit import insert_audit, log_audit_action, get_audit_logs
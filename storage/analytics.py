@@ -0,0 +1,237 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from storage import replica
+from storage.core import connection
+from storage.exports import SURVEY_WATERMARK_SQL
+
+# الاستعلامات التحليلية (التقرير الهرمي وتوزيع القيم). تُنفذ على النسخة التحليلية في
+# DuckDB إذا كانت مفعلة ومزامنة، فلا تنافس إرسال الاستبيانات على القاعدة الرئيسية؛ وإلا على
+# القاعدة الرئيسية. الاستعلامات مكتوبة بصيغة تعمل في الخلفيتين.
+
+_replica_ready = False
+
+def uses_replica() -> bool:
+    """هل تُقرأ التحليلات الآن من النسخة التحليلية (مفعلة واكتملت مزامنتها الأولى)"""
+    global _replica_ready
+    if not replica.replica_path():
+        return False
+    if not _replica_ready:
+        _replica_ready = replica.sync_status() is not None
+    return _replica_ready
+
+@contextmanager
+def analytics_connection():
+    """اتصال للاستعلامات التحليلية: النسخة التحليلية إن كانت جاهزة، وإلا القاعدة الرئيسية"""
+    with (replica.replica_connection() if uses_replica() else connection()) as conn:
+        yield conn
+
+def get_analytics_surveys() -> List[Tuple[int, str]]:
+    """الاستبيانات التي لها إجابات (الرقم، الاسم)"""
+    with analytics_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.survey_id, s.survey_name FROM Surveys s
+            WHERE EXISTS (SELECT 1 FROM Responses r WHERE r.survey_id = s.survey_id)
+            ORDER BY s.survey_name
+        ''')
+        return cursor.fetchall()
+
+def get_survey_field_labels(survey_id: int) -> List[Tuple[str, str]]:
+    """تسميات حقول الاستبيان في جميع الإصدارات (التسمية، النوع)"""
+    with analytics_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT field_label, MIN(field_type) FROM Survey_Fields
+            WHERE survey_id = %s
+            GROUP BY field_label
+            ORDER BY MIN(field_order)
+        ''', (survey_id,))
+        return cursor.fetchall()
+
+def get_field_distribution(survey_id: int, field_label: str, limit: int = 20) -> List[Tuple[str, int]]:
+    """أكثر قيم الحقل تكرارًا في الإجابات المكتملة (القيمة، العدد)"""
+    with analytics_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT rd.answer_value, COUNT(*)
+            FROM Response_Details rd
+            JOIN Survey_Fields sf ON rd.field_id = sf.field_id
+            JOIN Responses r ON rd.response_id = r.response_id
+            WHERE sf.survey_id = %s AND sf.field_label = %s AND r.is_completed
+            GROUP BY rd.answer_value
+            ORDER BY COUNT(*) DESC, rd.answer_value
+            LIMIT %s
+        ''', (survey_id, field_label, limit))
+        return cursor.fetchall()
+
+# مستويات التقرير الهرمي من الأعلى: (عمود الرقم، عمود الاسم) لكل مستوى
+ROLLUP_LEVELS = (
+    ('g.governorate_id', 'g.governorate_name'),
+    ('ha.admin_id', 'ha.admin_name'),
+    ('r.user_id', 'u.username'),
+)
+_ROLLUP_AGGREGATES = '''COUNT(*), SUM(CASE WHEN r.is_completed THEN 1 ELSE 0 END),
+                        COUNT(DISTINCT r.region_id), COUNT(DISTINCT r.user_id), MAX(r.submission_date)'''
+_ROLLUP_FROM = '''
+    FROM Responses r
+    JOIN HealthAdministrations ha ON r.region_id = ha.admin_id
+    JOIN Governorates g ON ha.governorate_id = g.governorate_id
+    JOIN Users u ON r.user_id = u.user_id
+    WHERE r.survey_id = %s
+'''
+
+def _rollup_sql(backend_name: str) -> Tuple[str, int]:
+    """(جملة التقرير الهرمي، عدد مرات تكرار رقم الاستبيان في معاملاتها)"""
+    if backend_name != 'sqlite':
+        grouping_sets = ', '.join(
+            '(' + ', '.join(col for level in ROLLUP_LEVELS[:depth] for col in level) + ')'
+            for depth in range(len(ROLLUP_LEVELS) + 1))
+        rolled_up = ' + '.join(f"GROUPING({id_column})" for id_column, _ in ROLLUP_LEVELS)
+        columns = ', '.join(col for level in ROLLUP_LEVELS for col in level)
+        return f'''
+            SELECT {len(ROLLUP_LEVELS)} - ({rolled_up}), {columns}, {_ROLLUP_AGGREGATES}
+            {_ROLLUP_FROM}
+            GROUP BY GROUPING SETS ({grouping_sets})
+            ORDER BY 1, 8 DESC
+        ''', 1
+    # SQLite لا يدعم GROUPING SETS: نفس المستويات باستعلام لكل مستوى مجمعة بـ UNION ALL
+    parts = []
+    for depth in range(len(ROLLUP_LEVELS) + 1):
+        grouped = [col for level in ROLLUP_LEVELS[:depth] for col in level]
+        columns = grouped + ['NULL'] * (2 * len(ROLLUP_LEVELS) - len(grouped))
+        group_by = f"GROUP BY {', '.join(grouped)}" if grouped else ''
+        parts.append(f"SELECT {depth}, {', '.join(columns)}, {_ROLLUP_AGGREGATES} {_ROLLUP_FROM} {group_by}")
+    return ' UNION ALL '.join(parts) + ' ORDER BY 1, 8 DESC', len(parts)
+
+def get_survey_rollup(survey_id: int) -> List[Tuple]:
+    """التقرير الهرمي لاستبيان باستعلام واحد: الإجمالي ثم المحافظات ثم الإدارات ثم الموظفون
+
+    كل صف: (المستوى 0-3، رقم المحافظة، اسمها، رقم الإدارة، اسمها، رقم الموظف، اسمه، الإجابات،
+    المكتملة، الإدارات المشاركة، الموظفون، آخر إجابة)؛ أعمدة المستويات الأدنى من مستوى الصف فارغة.
+    """
+    with analytics_connection() as conn:
+        sql, repeats = _rollup_sql(conn.backend.name)
+        cursor = conn.cursor()
+        cursor.execute(sql, (survey_id,) * repeats)
+        return cursor.fetchall()
+
+# أطول نافذة في الاتجاهات: تُحسب من أيام قبل بداية الفترة حتى تكون قيم أولها كاملة
+TREND_WINDOW_DAYS = 28
+
+def _next_day_sql(backend_name: str) -> str:
+    return "DATE(day, '+1 day')" if backend_name == 'sqlite' else "day + 1"
+
+def get_submission_trend(start: date, end: date, survey_id: int = None, governorate_id: int = None,
+                         region_id: int = None) -> List[Tuple]:
+    """الإجابات المكتملة يوميًا بين start و end مع المتوسطات المتحركة والمقارنة بالأسبوع السابق
+
+    كل صف: (اليوم، الإجابات، متوسط 7 أيام، متوسط 28 يومًا، مجموع آخر 7 أيام، مجموع الـ7 أيام
+    السابقة لها). تُحسب بدوال النوافذ على DailySubmissionCounts بعد إكمال الأيام الخالية بصفر،
+    وتُقرأ من القاعدة الرئيسية لأن الجدول صغير ويُحدث مع كل إرسال.
+    """
+    filters, params = [], []
+    for condition, value in (("d.survey_id = %s", survey_id), ("ha.governorate_id = %s", governorate_id),
+                             ("d.region_id = %s", region_id)):
+        if value is not None:
+            filters.append(f"AND {condition}")
+            params.append(value)
+    warmup = start - timedelta(days=TREND_WINDOW_DAYS - 1)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            WITH RECURSIVE calendar(day) AS (
+                SELECT %s
+                UNION ALL
+                SELECT {_next_day_sql(conn.backend.name)} FROM calendar WHERE day < %s
+            ),
+            buckets AS (
+                SELECT d.day, SUM(d.submissions) AS submissions
+                FROM DailySubmissionCounts d
+                JOIN HealthAdministrations ha ON d.region_id = ha.admin_id
+                WHERE d.day >= %s AND d.day <= %s {' '.join(filters)}
+                GROUP BY d.day
+            ),
+            series AS (
+                SELECT c.day, COALESCE(b.submissions, 0) AS submissions
+                FROM calendar c LEFT JOIN buckets b ON b.day = c.day
+            ),
+            windowed AS (
+                SELECT day, submissions,
+                       AVG(submissions) OVER (ORDER BY day ROWS BETWEEN 6 PRECEDING AND CURRENT ROW) AS avg_7,
+                       AVG(submissions) OVER (ORDER BY day ROWS BETWEEN 27 PRECEDING AND CURRENT ROW) AS avg_28,
+                       SUM(submissions) OVER (ORDER BY day ROWS BETWEEN 6 PRECEDING AND CURRENT ROW) AS week_total,
+                       SUM(submissions) OVER (ORDER BY day ROWS BETWEEN 13 PRECEDING AND 7 PRECEDING)
+                           AS previous_week_total
+                FROM series
+            )
+            SELECT day, submissions, avg_7, avg_28, week_total, previous_week_total
+            FROM windowed WHERE day >= %s ORDER BY day
+        ''', (warmup, end, warmup, end, *params, start))
+        return cursor.fetchall()
+
+# نتائج الجداول التقاطعية في الذاكرة، بمفتاح يتضمن علامة بيانات الاستبيان: أي إجابة جديدة أو
+# تعديل أو حذف يغير العلامة فتُحسب النتيجة من جديد، والمفاتيح القديمة تخرج بترتيب الاستخدام
+MAX_CACHED_CROSSTABS = 64
+
+_crosstab_cache = OrderedDict()
+_crosstab_lock = threading.Lock()
+_crosstab_hits = 0
+_crosstab_misses = 0
+
+def get_field_crosstab(survey_id: int, row_label: str, column_label: str, governorate_id: int = None,
+                       region_id: int = None) -> List[Tuple[str, str, int]]:
+    """عدد الإجابات المكتملة لكل زوج من قيم حقلين (قيمة الصف، قيمة العمود، العدد)
+
+    الحقلان يُطابقان بالتسمية في جميع إصدارات الاستبيان، والإجابات التي ليس فيها أحدهما لا تُحسب.
+    """
+    global _crosstab_hits, _crosstab_misses
+    filters, params = [], [row_label, column_label, survey_id]
+    for condition, value in (("ha.governorate_id = %s", governorate_id), ("r.region_id = %s", region_id)):
+        if value is not None:
+            filters.append(f"AND {condition}")
+            params.append(value)
+
+    with analytics_connection() as conn:
+        cursor = conn.cursor()
+        # العلامة من نفس المصدر الذي يُحسب منه الجدول (النسخة التحليلية أو القاعدة الرئيسية)
+        cursor.execute(SURVEY_WATERMARK_SQL, (survey_id,))
+        key = (survey_id, row_label, column_label, governorate_id, region_id, tuple(cursor.fetchone() or ()))
+        with _crosstab_lock:
+            rows = _crosstab_cache.get(key)
+            if rows is not None:
+                _crosstab_cache.move_to_end(key)
+                _crosstab_hits += 1
+                return rows
+            _crosstab_misses += 1
+
+        cursor.execute(f'''
+            SELECT a.answer_value, b.answer_value, COUNT(*)
+            FROM Responses r
+            JOIN HealthAdministrations ha ON r.region_id = ha.admin_id
+            JOIN Response_Details a ON a.response_id = r.response_id
+            JOIN Survey_Fields fa ON a.field_id = fa.field_id AND fa.field_label = %s
+            JOIN Response_Details b ON b.response_id = r.response_id
+            JOIN Survey_Fields fb ON b.field_id = fb.field_id AND fb.field_label = %s
+            WHERE r.survey_id = %s AND r.is_completed = TRUE {' '.join(filters)}
+            GROUP BY a.answer_value, b.answer_value
+        ''', params)
+        rows = cursor.fetchall()
+
+    with _crosstab_lock:
+        _crosstab_cache[key] = rows
+        while len(_crosstab_cache) > MAX_CACHED_CROSSTABS:
+            _crosstab_cache.popitem(last=False)
+    return rows
+
+def crosstab_cache_stats() -> Dict[str, int]:
+    """عدد مرات إيجاد الجدول التقاطعي في الذاكرة وعدم إيجاده، وعدد الجداول المخزنة"""
+    with _crosstab_lock:
+        return {'hits': _crosstab_hits, 'misses': _crosstab_misses, 'size': len(_crosstab_cache)}
+
+def get_source_status() -> Optional[dict]:
+    """حالة آخر مزامنة للنسخة التحليلية، أو None إذا كانت التحليلات من القاعدة الرئيسية"""
+    return replica.sync_status() if uses_replica() else None
@@ -0,0 +1,75 @@
+import json
+from typing import List, Tuple
+
+from storage.core import connection
+
+# دوال سجل التعديلات
+def insert_audit(cursor, user_id: int, action_type: str, table_name: str,
+                 record_id: int = None, old_value=None, new_value=None) -> None:
+    """إضافة سجل تعديل باستخدام مؤشر معاملة قائمة"""
+    cursor.execute(
+        """INSERT INTO AuditLog
+           (user_id, action_type, table_name, record_id, old_value, new_value)
+           VALUES (%s, %s, %s, %s, %s, %s)""",
+        (user_id, action_type, table_name, record_id,
+         json.dumps(old_value) if old_value else None,
+         json.dumps(new_value) if new_value else None)
+    )
+
+def log_audit_action(user_id: int, action_type: str, table_name: str,
+                     record_id: int = None, old_value=None, new_value=None) -> None:
+    """تسجيل إجراء في سجل التعديلات"""
+    with connection() as conn:
+        insert_audit(conn.cursor(), user_id, action_type, table_name, record_id, old_value, new_value)
+
+def get_audit_logs(
+    table_name: str = None,
+    action_type: str = None,
+    username: str = None,
+    date_range: tuple = None,
+    search_query: str = None
+) -> List[Tuple]:
+    """الحصول على سجل التعديلات مع فلاتر متقدمة"""
+    query = '''
+        SELECT a.log_id, u.username, a.action_type, a.table_name,
+               a.record_id, a.old_value, a.new_value, a.action_timestamp
+        FROM AuditLog a
+        JOIN Users u ON a.user_id = u.user_id
+    '''
+    params = []
+    conditions = []
+
+    # تطبيق الفلاتر
+    if table_name:
+        conditions.append("a.table_name = %s")
+        params.append(table_name)
+    if action_type:
+        conditions.append("a.action_type = %s")
+        params.append(action_type)
+    if username:
+        conditions.append("u.username LIKE %s")
+        params.append(f"%{username}%")
+    if date_range and len(date_range) == 2:
+        start_date, end_date = date_range
+        conditions.append("DATE(a.action_timestamp) BETWEEN %s AND %s")
+        params.extend([start_date, end_date])
+    if search_query:
+        conditions.append("""
+            (a.old_value LIKE %s OR
+             a.new_value LIKE %s OR
+             u.username LIKE %s OR
+             a.table_name LIKE %s OR
+             a.action_type LIKE %s)
+        """)
+        search_term = f"%{search_query}%"
+        params.extend([search_term, search_term, search_term, search_term, search_term])
+
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+
+    query += ' ORDER BY a.action_timestamp DESC'
+
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return cursor.fetchall()
@@ -0,0 +1,323 @@
+import itertools
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from storage import instrumentation
+
+# طبقة الاتصال بقاعدة البيانات
+#
+# جميع الاستعلامات في التطبيق مكتوبة بصيغة Postgres (معاملات %s و ANY(%s) و SERIAL).
+# كل خلفية تعيد اتصالاً موحدًا، وخلفية SQLite تحول الاستعلامات عند التنفيذ
+# حتى يعمل التطبيق والقياسات محليًا دون شبكة.
+
+class Cursor:
+    """مؤشر موحد لجميع الخلفيات"""
+
+    def __init__(self, backend, raw, dict_rows: bool = False):
+        self.backend = backend
+        self.raw = raw
+        self.dict_rows = dict_rows
+        self._record = None
+
+    def execute(self, sql: str, params: Sequence = None):
+        record = instrumentation.start_query(sql, params)
+        started = time.perf_counter()
+        try:
+            prepared = self.backend.prepare(self.raw, sql, params)
+            if prepared is not None:
+                self.raw.execute(*prepared)
+        except Exception as e:
+            instrumentation.finish_query(record, started, 0, e)
+            raise
+        rowcount = self.raw.rowcount if prepared is not None else 0
+        instrumentation.finish_query(record, started, rowcount)
+        # عند عدم معرفة عدد الصفوف مسبقًا (SELECT في SQLite) تُحسب الصفوف عند قراءتها
+        self._record = record if rowcount < 0 else None
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        for params in seq_of_params:
+            self.execute(sql, params)
+        return self
+
+    def _fetched(self, count: int):
+        if self._record is not None:
+            self._record.rows += count
+
+    def _convert(self, row):
+        if row is None or not self.dict_rows:
+            return row
+        return self.backend.row_to_dict(self.raw, row)
+
+    def fetchone(self):
+        row = self.raw.fetchone()
+        self._fetched(row is not None)
+        return self._convert(row)
+
+    def fetchmany(self, size: int = None):
+        rows = self.raw.fetchmany(size) if size else self.raw.fetchmany()
+        self._fetched(len(rows))
+        return [self._convert(r) for r in rows]
+
+    def fetchall(self):
+        rows = self.raw.fetchall()
+        self._fetched(len(rows))
+        return [self._convert(r) for r in rows]
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    @property
+    def rowcount(self) -> int:
+        return self.raw.rowcount
+
+    @property
+    def description(self):
+        return self.raw.description
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class Connection:
+    """اتصال موحد لجميع الخلفيات"""
+
+    def __init__(self, backend, raw):
+        self.backend = backend
+        self.raw = raw
+        # يُضبط في get_db_connection ليُحسب الإغلاق في عداد الاتصالات المفتوحة
+        self.counted = False
+
+    def cursor(self, dict_rows: bool = False, streaming: bool = False) -> Cursor:
+        """مؤشر جديد؛ مع streaming تبقى نتيجة SELECT في الخادم وتُقرأ على دفعات بـ fetchmany"""
+        return Cursor(self.backend, self.backend.raw_cursor(self.raw, dict_rows, streaming), dict_rows)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        if self.counted:
+            self.counted = False
+            instrumentation.release_connection()
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+class PostgresBackend:
+    """خلفية Postgres (Neon في بيئة التشغيل)"""
+
+    name = 'postgres'
+
+    def __init__(self):
+        self._cursor_numbers = itertools.count(1)
+
+    def connect(self) -> Connection:
+        import psycopg2
+        raw = psycopg2.connect(
+            host=os.getenv('NEON_HOST'),
+            port=os.getenv('NEON_PORT') or None,
+            database=os.getenv('NEON_DATABASE'),
+            user=os.getenv('NEON_USER'),
+            password=os.getenv('NEON_PASSWORD'),
+            sslmode=os.getenv('NEON_SSLMODE', 'require')
+        )
+        return Connection(self, raw)
+
+    def raw_cursor(self, raw_conn, dict_rows: bool, streaming: bool = False):
+        # المؤشر المسمى (server-side) لا ينقل الصفوف إلا عند قراءتها، ويعمل داخل المعاملة فقط
+        name = f"stream_{next(self._cursor_numbers)}" if streaming else None
+        if dict_rows:
+            from psycopg2.extras import RealDictCursor
+            return raw_conn.cursor(name=name, cursor_factory=RealDictCursor)
+        return raw_conn.cursor(name=name)
+
+    def prepare(self, raw_cursor, sql: str, params: Sequence) -> Optional[Tuple]:
+        return (sql, params) if params is not None else (sql,)
+
+    def row_to_dict(self, raw_cursor, row):
+        return row
+
+_PLACEHOLDER = re.compile(r"=\s*ANY\(\s*%s\s*\)|%s|%%")
+_SERIAL = re.compile(r"\bSERIAL PRIMARY KEY\b", re.IGNORECASE)
+_ADD_COLUMN = re.compile(
+    r"^\s*ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+IF\s+NOT\s+EXISTS\s+(\w+)\s+(.*)$",
+    re.IGNORECASE | re.DOTALL
+)
+
+def _adapt_datetime(value: datetime) -> str:
+    return value.isoformat(sep=' ')
+
+def _convert_timestamp(value: bytes):
+    text = value.decode()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("BOOLEAN", lambda value: value not in (b"0", b""))
+
+class SQLiteBackend:
+    """خلفية SQLite مضمنة للتشغيل المحلي والاختبارات والقياس"""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def connect(self) -> Connection:
+        raw = sqlite3.connect(
+            self.path,
+            timeout=30,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False
+        )
+        raw.execute("PRAGMA foreign_keys = ON")
+        raw.execute("PRAGMA journal_mode = WAL")
+        return Connection(self, raw)
+
+    def raw_cursor(self, raw_conn, dict_rows: bool, streaming: bool = False):
+        # مؤشر SQLite يقرأ الصفوف من الملف عند طلبها أصلاً
+        return raw_conn.cursor()
+
+    def row_to_dict(self, raw_cursor, row):
+        return {col[0]: value for col, value in zip(raw_cursor.description, row)}
+
+    def prepare(self, raw_cursor, sql: str, params: Sequence) -> Optional[Tuple]:
+        """تحويل استعلام بصيغة Postgres إلى SQLite، أو None إذا لا يلزم تنفيذه"""
+        match = _ADD_COLUMN.match(sql)
+        if match:
+            table, column, definition = match.groups()
+            existing = {row[1].lower() for row in raw_cursor.execute(f"PRAGMA table_info({table})")}
+            if column.lower() in existing:
+                return None
+            sql = f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+
+        sql = _SERIAL.sub("INTEGER PRIMARY KEY AUTOINCREMENT", sql)
+        return _qmark(sql, params)
+
+def _qmark(sql: str, params: Sequence) -> Tuple[str, List]:
+    """تحويل معاملات %s إلى ? و = ANY(%s) مع قائمة إلى IN (?, ?, ...)"""
+    values = list(params) if params is not None else []
+    out_params: List = []
+    position = 0
+
+    def replace(m):
+        nonlocal position
+        token = m.group(0)
+        if token == '%%':
+            return '%'
+        value = values[position]
+        position += 1
+        if token == '%s':
+            out_params.append(value)
+            return '?'
+        items = list(value)
+        out_params.extend(items)
+        return "IN (" + ", ".join("?" * len(items)) + ")" if items else "IN (NULL)"
+
+    return _PLACEHOLDER.sub(replace, sql), out_params
+
+class _DuckDBCursor:
+    """مؤشر DuckDB على نفس اتصال المعاملة (مؤشرات DuckDB المستقلة لها معاملات مستقلة)"""
+
+    def __init__(self, raw_conn):
+        self.raw_conn = raw_conn
+        self.rowcount = -1
+        self.description = None
+
+    def execute(self, sql: str, params: Sequence = ()):
+        self.raw_conn.execute(sql, params)
+        self.description = self.raw_conn.description
+        return self
+
+    def fetchone(self):
+        return self.raw_conn.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        return self.raw_conn.fetchmany(size)
+
+    def fetchall(self):
+        return self.raw_conn.fetchall()
+
+    def close(self):
+        pass
+
+class DuckDBBackend:
+    """خلفية DuckDB للنسخة التحليلية المحلية (storage.replica)، بنفس صيغة الاستعلامات"""
+
+    name = 'duckdb'
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+
+    def connect(self) -> Connection:
+        import duckdb
+        raw = duckdb.connect(self.path, read_only=self.read_only)
+        raw.begin()
+        return Connection(self, raw)
+
+    def raw_cursor(self, raw_conn, dict_rows: bool, streaming: bool = False):
+        return _DuckDBCursor(raw_conn)
+
+    def row_to_dict(self, raw_cursor, row):
+        return {col[0]: value for col, value in zip(raw_cursor.description, row)}
+
+    def prepare(self, raw_cursor, sql: str, params: Sequence) -> Optional[Tuple]:
+        return _qmark(sql, params)
+
+def execute_values(cursor: Cursor, sql: str, rows: List[Sequence], page_size: int = 100) -> None:
+    """إدراج عدة صفوف في استعلام واحد لكل صفحة؛ sql يحتوي VALUES %s"""
+    rows = list(rows)
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        group = "(" + ", ".join(["%s"] * len(page[0])) + ")"
+        params = [value for row in page for value in row]
+        cursor.execute(sql.replace("VALUES %s", "VALUES " + ", ".join([group] * len(page)), 1), params)
+
+_backend = None
+
+def get_backend():
+    """الخلفية المحددة بمتغير البيئة DB_BACKEND (postgres افتراضيًا أو sqlite)"""
+    global _backend
+    if _backend is None:
+        kind = os.getenv('DB_BACKEND', 'postgres').lower()
+        if kind == 'sqlite':
+            _backend = SQLiteBackend(os.getenv('SQLITE_PATH', 'mego.db'))
+        elif kind == 'postgres':
+            _backend = PostgresBackend()
+        else:
+            raise ValueError(f"خلفية قاعدة بيانات غير معروفة: {kind}")
+    return _backend
+
+def set_backend(backend) -> None:
+    """تغيير الخلفية برمجيًا (للقياسات والأدوات)"""
+    global _backend
+    _backend = backend
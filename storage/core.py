@@ -0,0 +1,37 @@
+import time
+from contextlib import contextmanager
+
+from storage import instrumentation
+from storage.backends import get_backend
+from storage.errors import DataAccessError, DatabaseError
+
+# تكوين اتصال قاعدة البيانات حسب الخلفية المحددة في متغيرات البيئة (DB_BACKEND)
+def get_db_connection():
+    started = time.perf_counter()
+    conn = get_backend().connect()
+    instrumentation.record_connection((time.perf_counter() - started) * 1000)
+    conn.counted = True
+    return conn
+
+@contextmanager
+def connection():
+    """اتصال داخل معاملة واحدة: يُعتمد عند النجاح ويُلغى عند أي خطأ
+
+    أخطاء قاعدة البيانات تتحول إلى DatabaseError، وأخطاء طبقة البيانات تمر كما هي.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        yield conn
+        conn.commit()
+    except DataAccessError:
+        if conn:
+            conn.rollback()
+        raise
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        raise DatabaseError(str(e)) from e
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,20 @@
+class DataAccessError(Exception):
+    """الخطأ الأساسي لطبقة البيانات"""
+
+class DatabaseError(DataAccessError):
+    """فشل في الاتصال أو في تنفيذ استعلام"""
+
+class NotFoundError(DataAccessError):
+    """السجل المطلوب غير موجود"""
+
+class DuplicateError(DataAccessError):
+    """السجل موجود بالفعل"""
+
+class ConflictError(DataAccessError):
+    """تم تعديل السجل من مستخدم آخر منذ قراءته"""
+
+class ValidationError(DataAccessError):
+    """البيانات المرسلة غير صالحة"""
+
+class NPlusOneError(DataAccessError):
+    """نفس شكل الاستعلام تكرر أكثر من الحد المسموح في نطاق واحد (وضع التطوير)"""
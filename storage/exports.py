@@ -0,0 +1,259 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from storage.core import connection
+
+# دوال قراءة بيانات التصدير
+#
+# تصدير التغييرات يستقبل since = (آخر رقم إجابة، آخر تاريخ تعديل) من نقطة تصدير سابقة
+# و up_to = get_change_watermark عند بدء التصدير، فتُقرأ الإجابات التي أضيفت أو عُدلت
+# (last_modified) بعد since وحتى up_to. الحد يسبق وقت قاعدة البيانات بـ COMMIT_MARGIN_SECONDS
+# حتى لا تفوت إجابة حصلت على رقمها ووقتها قبل الحد لكن لم تُحفظ إلا بعد قراءته؛ التغييرات
+# الأحدث من الحد تظهر في التصدير التالي. الإجابات القديمة بلا last_modified تُقارن برقمها.
+# region_ids يقصر التصدير على إجابات إدارات صحية معينة (ملفات كل محافظة في الحزمة).
+
+COMMIT_MARGIN_SECONDS = 60
+
+def _response_filter(since: Optional[Tuple], up_to: Optional[Tuple], region_ids: Optional[List[int]],
+                     prefix: str = '') -> Tuple[str, tuple]:
+    """شرط SQL إضافي على Responses: الإجابات الجديدة أو المعدلة بين since و up_to، وإدارات region_ids"""
+    sql, params = '', ()
+    if since is not None:
+        last_response_id, last_modified = since
+        if last_modified is None:
+            changed = f"({prefix}response_id > %s OR {prefix}last_modified IS NOT NULL)"
+            params = (last_response_id,)
+        else:
+            changed = f"({prefix}last_modified > %s OR ({prefix}last_modified IS NULL AND {prefix}response_id > %s))"
+            params = (last_modified, last_response_id)
+        sql = f" AND {changed} AND COALESCE({prefix}last_modified, {prefix}submission_date) <= %s"
+        params += (up_to[1],)
+    if region_ids is not None:
+        sql += f" AND {prefix}region_id = ANY(%s)"
+        params += (list(region_ids),)
+    return sql, params
+
+def get_survey_name(survey_id: int) -> Optional[str]:
+    """الحصول على اسم الاستبيان"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT survey_name FROM Surveys WHERE survey_id = %s", (survey_id,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+def get_survey_responses(survey_id: int, since: Optional[Tuple] = None, up_to: Optional[Tuple] = None,
+                         region_ids: Optional[List[int]] = None) -> List[Tuple]:
+    """ملخص إجابات الاستبيان (الرقم، المستخدم، الإدارة، المحافظة، التاريخ، الحالة)"""
+    changed, changed_params = _response_filter(since, up_to, region_ids, 'r.')
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT r.response_id, u.username, ha.admin_name, g.governorate_name,
+                   r.submission_date, r.is_completed
+            FROM Responses r
+            JOIN Users u ON r.user_id = u.user_id
+            JOIN HealthAdministrations ha ON r.region_id = ha.admin_id
+            JOIN Governorates g ON ha.governorate_id = g.governorate_id
+            WHERE r.survey_id = %s{changed}
+            ORDER BY r.submission_date DESC
+        ''', (survey_id,) + changed_params)
+        return cursor.fetchall()
+
+def count_survey_responses(survey_id: int, after_response_id: int = 0, since: Optional[Tuple] = None,
+                           up_to: Optional[Tuple] = None, region_ids: Optional[List[int]] = None) -> int:
+    """عدد إجابات الاستبيان بعد رقم إجابة معين"""
+    changed, changed_params = _response_filter(since, up_to, region_ids)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT COUNT(*) FROM Responses WHERE survey_id = %s AND response_id > %s{changed}",
+            (survey_id, after_response_id) + changed_params
+        )
+        return cursor.fetchone()[0]
+
+def iter_response_details(survey_id: int, after_response_id: int = 0, batch_size: int = 500,
+                          since: Optional[Tuple] = None, up_to: Optional[Tuple] = None,
+                          region_ids: Optional[List[int]] = None) -> Iterator[Tuple[int, int, List[Tuple]]]:
+    """تفاصيل إجابات الاستبيان على دفعات مرتبة برقم الإجابة
+
+    كل دفعة تُقرأ في اتصال مستقل باستعلامين مهما كان عدد الإجابات، وتُرجع
+    (آخر رقم إجابة، عدد الإجابات، الصفوف) حتى يمكن الاستئناف من آخر دفعة مكتملة.
+    الصفوف: (رقم الإجابة، الحقل، القيمة، المستخدم، تاريخ الإدخال، الحالة).
+    """
+    changed, changed_params = _response_filter(since, up_to, region_ids)
+    while True:
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT response_id FROM Responses
+                WHERE survey_id = %s AND response_id > %s{changed}
+                ORDER BY response_id
+                LIMIT %s
+            ''', (survey_id, after_response_id) + changed_params + (batch_size,))
+            response_ids = [row[0] for row in cursor.fetchall()]
+            if not response_ids:
+                return
+
+            cursor.execute('''
+                SELECT rd.response_id, sf.field_label, rd.answer_value,
+                       u.username, r.submission_date, r.is_completed
+                FROM Response_Details rd
+                JOIN Survey_Fields sf ON rd.field_id = sf.field_id
+                JOIN Responses r ON rd.response_id = r.response_id
+                JOIN Users u ON r.user_id = u.user_id
+                WHERE rd.response_id = ANY(%s)
+                ORDER BY rd.response_id, sf.field_order, sf.field_id
+            ''', (response_ids,))
+            rows = cursor.fetchall()
+
+        after_response_id = response_ids[-1]
+        yield after_response_id, len(response_ids), rows
+
+def get_all_survey_fields(survey_id: int) -> List[Tuple[int, str, str]]:
+    """حقول الاستبيان في جميع الإصدارات (الرقم، التسمية، النوع) بترتيب ظهورها"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT field_id, field_label, field_type FROM Survey_Fields
+            WHERE survey_id = %s
+            ORDER BY from_version, field_order, field_id
+        ''', (survey_id,))
+        return cursor.fetchall()
+
+def iter_response_values(survey_id: int, batch_size: int = 10000) -> Iterator[List[Tuple]]:
+    """جميع قيم إجابات الاستبيان مرتبة برقم الإجابة، على دفعات من استعلام واحد
+
+    في Postgres تبقى النتيجة في الخادم (مؤشر مسمى) فلا تتجاوز الذاكرة دفعة واحدة.
+    الصفوف: (رقم الإجابة، المستخدم، الإدارة، المحافظة، التاريخ، الحالة، إصدار الاستبيان،
+    رقم الحقل، القيمة)؛ الإجابة بلا تفاصيل تظهر مرة برقم حقل NULL.
+    """
+    with connection() as conn:
+        cursor = conn.cursor(streaming=True)
+        cursor.execute('''
+            SELECT r.response_id, u.username, ha.admin_name, g.governorate_name,
+                   r.submission_date, r.is_completed, r.survey_version,
+                   rd.field_id, rd.answer_value
+            FROM Responses r
+            JOIN Users u ON r.user_id = u.user_id
+            JOIN HealthAdministrations ha ON r.region_id = ha.admin_id
+            JOIN Governorates g ON ha.governorate_id = g.governorate_id
+            LEFT JOIN Response_Details rd ON rd.response_id = r.response_id
+            WHERE r.survey_id = %s
+            ORDER BY r.response_id
+        ''', (survey_id,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+def get_survey_partitions(survey_id: int, by: str = 'governorate') -> List[Tuple[int, str, List[int], int]]:
+    """أقسام إجابات الاستبيان حسب المحافظة أو الإدارة الصحية (by='region')
+
+    كل قسم: (الرقم، الاسم، أرقام الإدارات الصحية فيه، عدد الإجابات)، الأكبر أولاً.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT g.governorate_id, g.governorate_name, ha.admin_id, ha.admin_name, COUNT(*)
+            FROM Responses r
+            JOIN HealthAdministrations ha ON r.region_id = ha.admin_id
+            JOIN Governorates g ON ha.governorate_id = g.governorate_id
+            WHERE r.survey_id = %s
+            GROUP BY g.governorate_id, g.governorate_name, ha.admin_id, ha.admin_name
+        ''', (survey_id,))
+        rows = cursor.fetchall()
+
+    partitions = {}
+    for governorate_id, governorate_name, admin_id, admin_name, count in rows:
+        if by == 'region':
+            key, name = admin_id, f"{governorate_name} - {admin_name}"
+        else:
+            key, name = governorate_id, governorate_name
+        partition = partitions.setdefault(key, [key, name, [], 0])
+        partition[2].append(admin_id)
+        partition[3] += count
+    return sorted((tuple(p) for p in partitions.values()), key=lambda p: -p[3])
+
+# علامة بيانات الاستبيان (تعمل أيضًا على النسخة التحليلية لأن أعمدتها منسوخة)
+SURVEY_WATERMARK_SQL = '''
+    SELECT s.definition_version, COUNT(r.response_id),
+           COALESCE(SUM(CASE WHEN r.is_completed THEN 1 ELSE 0 END), 0),
+           COALESCE(MAX(r.response_id), 0), COALESCE(SUM(r.edit_version), 0),
+           MAX(COALESCE(r.last_modified, r.submission_date))
+    FROM Surveys s
+    LEFT JOIN Responses r ON r.survey_id = s.survey_id
+    WHERE s.survey_id = %s
+    GROUP BY s.definition_version
+'''
+
+# أسماء المستخدمين والإدارات الصحية والمحافظات تُكتب في ملف التصدير، وتبعية الإدارة لمحافظتها
+# تحدد ملفات الحزمة، لكن تعديلها لا يغير أي إجابة؛ لذلك تدخل بصمتها في علامة التصدير
+EXPORT_NAMES_SQL = (
+    "SELECT user_id, username FROM Users ORDER BY user_id",
+    "SELECT admin_id, admin_name, governorate_id FROM HealthAdministrations ORDER BY admin_id",
+    "SELECT governorate_id, governorate_name FROM Governorates ORDER BY governorate_id",
+)
+
+def get_survey_watermark(survey_id: int) -> Tuple:
+    """قيمة تتغير مع أي تغيير في بيانات تصدير الاستبيان
+
+    (إصدار التعريف، عدد الإجابات، المكتملة منها، أكبر رقم إجابة، مجموع أرقام التعديل،
+    آخر تاريخ تقديم أو تعديل، بصمة الأسماء). الحذف يغير العدد والتعديل يزيد edit_version.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SURVEY_WATERMARK_SQL, (survey_id,))
+        watermark = cursor.fetchone()
+        names = hashlib.sha1()
+        for sql in EXPORT_NAMES_SQL:
+            cursor.execute(sql)
+            for row in cursor.fetchall():
+                names.update(repr(tuple(row)).encode('utf-8'))
+        return tuple(watermark or ()) + (names.hexdigest(),)
+
+def commit_cutoff(cursor) -> datetime:
+    """وقت قاعدة البيانات ناقص COMMIT_MARGIN_SECONDS: ما عُدل قبله قد التزم (بنفس ساعة last_modified)"""
+    cursor.execute("SELECT CURRENT_TIMESTAMP")
+    now = cursor.fetchone()[0]
+    if isinstance(now, str):
+        now = datetime.fromisoformat(now)
+    # last_modified بلا منطقة زمنية بتوقيت الجلسة، فيُقارن بنفس الوقت دون المنطقة
+    return now.replace(tzinfo=None) - timedelta(seconds=COMMIT_MARGIN_SECONDS)
+
+def get_change_watermark(survey_id: int) -> Tuple[int, datetime]:
+    """(أكبر رقم إجابة حتى الحد، الحد) للاستبيان الآن، لتكون نقطة التصدير التالية
+
+    الحد هو commit_cutoff وليس أكبر last_modified مقروء.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        up_to = commit_cutoff(cursor)
+        cursor.execute('''
+            SELECT COALESCE(MAX(response_id), 0) FROM Responses
+            WHERE survey_id = %s AND COALESCE(last_modified, submission_date) <= %s
+        ''', (survey_id, up_to))
+        return cursor.fetchone()[0], up_to
+
+def get_export_checkpoint(user_id: int, survey_id: int) -> Optional[Tuple]:
+    """آخر نقطة تصدير للمستخدم (آخر رقم إجابة، آخر تاريخ تعديل، وقت التصدير)"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT last_response_id, last_modified, exported_at FROM ExportCheckpoints
+            WHERE user_id = %s AND survey_id = %s
+        ''', (user_id, survey_id))
+        return cursor.fetchone()
+
+def save_export_checkpoint(user_id: int, survey_id: int, last_response_id: int,
+                           last_modified: Optional[datetime]) -> None:
+    """حفظ نقطة التصدير بعد اكتمال تصدير التغييرات"""
+    with connection() as conn:
+        conn.cursor().execute('''
+            INSERT INTO ExportCheckpoints (user_id, survey_id, last_response_id, last_modified, exported_at)
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id, survey_id) DO UPDATE
+            SET last_response_id = EXCLUDED.last_response_id, last_modified = EXCLUDED.last_modified,
+                exported_at = EXCLUDED.exported_at
+        ''', (user_id, survey_id, last_response_id, last_modified))
@@ -0,0 +1,285 @@
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, List, Optional
+
+from storage.errors import NPlusOneError
+
+# قياس الاستعلامات: كل استعلام يمر عبر storage.backends.Cursor يُسجل بزمنه وعدد صفوفه
+# ومكان استدعائه. النطاق (scope) يجمع استعلامات إعادة تشغيل واحدة للصفحة أو مهمة واحدة،
+# والاستعلامات الأبطأ من SLOW_QUERY_MS تُكتب في سجل الاستعلامات البطيئة.
+# السجل يحتفظ بشكل الاستعلام (fingerprint) وعدد معاملاته فقط، لا بقيمها: القيم (الإجابات وكلمات
+# المرور المشفرة) تُكتب في سجل البطء بعد إخفاء النصوص، ولا تبقى إلا في نطاق يطلبها (capture_params).
+#
+# كاشف N+1 (للتطوير): إذا تكرر نفس شكل الاستعلام أكثر من N_PLUS_ONE_THRESHOLD مرة
+# في نطاق واحد يُكتب تحذير (N_PLUS_ONE=warn) أو يُرفع NPlusOneError (N_PLUS_ONE=raise).
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+N_PLUS_ONE_MODE = os.getenv('N_PLUS_ONE', 'off').lower()
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '5'))
+
+slow_query_logger = logging.getLogger('storage.slow_queries')
+n_plus_one_logger = logging.getLogger('storage.n_plus_one')
+if os.getenv('SLOW_QUERY_LOG'):
+    _handler = logging.FileHandler(os.getenv('SLOW_QUERY_LOG'), encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_query_logger.addHandler(_handler)
+    slow_query_logger.setLevel(logging.WARNING)
+
+_STORAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_INTERNAL_FILES = {
+    os.path.join(_STORAGE_DIR, name) for name in ('backends.py', 'core.py', 'instrumentation.py')
+}
+_ADAPTER_FILE = os.path.join(os.path.dirname(_STORAGE_DIR), 'database.py')
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)')
+_VALUES_LIST = re.compile(r'(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+
+def fingerprint(sql: str) -> str:
+    """شكل الاستعلام بعد إزالة القيم: استعلامان بنفس الشكل يختلفان في المعاملات فقط"""
+    sql = _WHITESPACE.sub(' ', sql).strip().lower()
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _VALUES_LIST.sub(r'\1', sql)
+
+def redact(params) -> str:
+    """المعاملات للسجل: الأرقام والتواريخ كما هي، والنصوص بطولها فقط"""
+    def one(value):
+        if value is None or isinstance(value, (bool, int, float, date)):
+            return repr(value)
+        if isinstance(value, (str, bytes)):
+            return f"<{type(value).__name__}:{len(value)}>"
+        if isinstance(value, (list, tuple)):
+            items = [one(item) for item in value[:5]]
+            return "[" + ", ".join(items + (["..."] if len(value) > 5 else [])) + "]"
+        return f"<{type(value).__name__}>"
+    return one(list(params)) if params is not None else "[]"
+
+class QueryRecord:
+    """استعلام واحد منفذ
+
+    sql هو شكل الاستعلام دون القيم. statement (نص الاستعلام) و params تبقى بعد التنفيذ
+    فقط إذا طلبها النطاق (capture)، مثل فحص خطط التنفيذ الذي يعيد تنفيذها مع EXPLAIN.
+    """
+
+    __slots__ = ('sql', 'param_count', 'statement', 'params', 'capture',
+                 'duration_ms', 'rows', 'call_site', 'origin', 'error')
+
+    def __init__(self, sql: str, params, call_site: str, origin: str, capture: bool = False):
+        self.statement = _WHITESPACE.sub(' ', sql).strip()
+        self.sql = fingerprint(self.statement)
+        self.params = params
+        self.param_count = len(params) if params is not None else 0
+        self.capture = capture
+        self.duration_ms = 0.0
+        self.rows = 0
+        self.call_site = call_site
+        self.origin = origin
+        self.error = None
+
+class QueryStats:
+    """استعلامات واتصالات نطاق واحد (إعادة تشغيل صفحة أو مهمة)"""
+
+    def __init__(self, name: str, parent: 'QueryStats' = None,
+                 n_plus_one: str = None, threshold: int = None, capture_params: bool = False):
+        self.name = name
+        self.parent = parent
+        self.capture_params = capture_params
+        self.queries: List[QueryRecord] = []
+        self.connections = 0
+        self.connect_ms = 0.0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.n_plus_one = n_plus_one or N_PLUS_ONE_MODE
+        self.threshold = threshold if threshold is not None else N_PLUS_ONE_THRESHOLD
+        self.fingerprints: Dict[str, int] = {}
+        # أشكال الاستعلامات التي تجاوزت الحد: الشكل -> (العدد، مكان الاستدعاء)
+        self.repeated: Dict[str, Dict] = {}
+
+    @property
+    def query_count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def db_ms(self) -> float:
+        return sum(q.duration_ms for q in self.queries) + self.connect_ms
+
+    @property
+    def elapsed_ms(self) -> float:
+        return ((self.finished or time.perf_counter()) - self.started) * 1000
+
+    def by_call_site(self) -> List[Dict]:
+        """الاستعلامات مجمعة حسب مكان الاستدعاء، الأعلى زمنًا أولاً"""
+        groups: Dict[str, Dict] = {}
+        for q in self.queries:
+            group = groups.setdefault(q.call_site, {
+                'call_site': q.call_site, 'origin': q.origin, 'count': 0, 'total_ms': 0.0, 'rows': 0
+            })
+            group['count'] += 1
+            group['total_ms'] += q.duration_ms
+            group['rows'] += q.rows
+        return sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)
+
+    def summary(self) -> Dict:
+        return {
+            'name': self.name,
+            'queries': self.query_count,
+            'connections': self.connections,
+            'db_ms': round(self.db_ms, 3),
+            'elapsed_ms': round(self.elapsed_ms, 3),
+            'repeated_shapes': len(self.repeated),
+        }
+
+    def _add(self, record: QueryRecord) -> None:
+        self.queries.append(record)
+        if self.n_plus_one == 'off':
+            return
+        shape = record.sql
+        count = self.fingerprints.get(shape, 0) + 1
+        self.fingerprints[shape] = count
+        if count <= self.threshold:
+            return
+        if shape in self.repeated:
+            self.repeated[shape]['count'] = count
+            return
+        self.repeated[shape] = {'count': count, 'call_site': record.call_site, 'origin': record.origin}
+        message = (f"N+1: الاستعلام تكرر {count} مرة في النطاق '{self.name}' "
+                   f"من {record.call_site} (عبر {record.origin}): {shape[:300]}")
+        if self.n_plus_one == 'raise':
+            raise NPlusOneError(message)
+        n_plus_one_logger.warning(message)
+
+_current: contextvars.ContextVar = contextvars.ContextVar('query_stats', default=None)
+
+def current() -> Optional[QueryStats]:
+    """نطاق القياس الحالي (None خارج أي نطاق)"""
+    return _current.get()
+
+@contextmanager
+def scope(name: str, n_plus_one: str = None, threshold: int = None, capture_params: bool = False):
+    """جمع كل الاستعلامات المنفذة داخل الكتلة في QueryStats واحد
+
+    النطاقات المتداخلة تسجل الاستعلامات في النطاق الخارجي أيضًا. مع capture_params يحتفظ
+    كل استعلام بنصه وقيم معاملاته (للأدوات فقط، لا لنطاقات الصفحات).
+    """
+    stats = QueryStats(name, _current.get(), n_plus_one, threshold, capture_params)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        stats.finished = time.perf_counter()
+        _current.reset(token)
+
+def next_batch() -> None:
+    """بداية دفعة جديدة في مهمة دفعية: كاشف N+1 يعد تكرار الشكل داخل الدفعة الواحدة فقط
+
+    استعلامات الدفعة تتكرر بنفس الشكل في كل دفعة تالية، وهذا ليس N+1.
+    """
+    stats = _current.get()
+    while stats is not None:
+        stats.fingerprints.clear()
+        stats = stats.parent
+
+@contextmanager
+def assert_no_n_plus_one(name: str = 'assert_no_n_plus_one', threshold: int = None):
+    """رفع NPlusOneError إذا تكرر أي شكل استعلام أكثر من threshold مرة داخل الكتلة"""
+    with scope(name, 'raise', threshold) as stats:
+        yield stats
+
+def _describe(frame) -> str:
+    path = frame.f_code.co_filename
+    return f"{os.path.basename(path)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+def _call_sites():
+    """مكان الاستعلام في طبقة البيانات، وأول مكان خارجها (الواجهة أو المهمة) الذي أدى إليه"""
+    frame = sys._getframe(2)
+    call_site = origin = None
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if call_site is None and path not in _INTERNAL_FILES:
+            call_site = _describe(frame)
+        if call_site is not None and not path.startswith(_STORAGE_DIR) and path != _ADAPTER_FILE:
+            origin = _describe(frame)
+            break
+        frame = frame.f_back
+    return call_site or '?', origin or call_site or '?'
+
+# دوال تُستدعى مع كل استعلام منتهٍ في أي نطاق (مثل مقاييس التشغيل في metrics.py)
+_listeners: List = []
+
+def add_listener(listener) -> None:
+    """تسجيل دالة تستقبل QueryRecord بعد كل استعلام"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+def start_query(sql: str, params=None) -> QueryRecord:
+    """بداية استعلام؛ يُكمل بـ finish_query بعد التنفيذ"""
+    call_site, origin = _call_sites()
+    stats, capture = _current.get(), False
+    while stats is not None and not capture:
+        capture, stats = stats.capture_params, stats.parent
+    return QueryRecord(sql, params, call_site, origin, capture)
+
+def finish_query(record: QueryRecord, started: float, rowcount: int, error: Exception = None) -> None:
+    record.duration_ms = (time.perf_counter() - started) * 1000
+    record.rows = max(rowcount or 0, 0)
+    record.error = str(error) if error else None
+    if record.duration_ms >= SLOW_QUERY_MS:
+        slow_query_logger.warning(
+            "slow query %.1f ms rows=%d at %s (from %s): %s params=%s",
+            record.duration_ms, record.rows, record.call_site, record.origin, record.statement[:1000],
+            redact(record.params)
+        )
+    if not record.capture:
+        record.statement = record.params = None
+    for listener in _listeners:
+        listener(record)
+    stats = _current.get()
+    while stats is not None:
+        stats._add(record)
+        stats = stats.parent
+
+# عدد الاتصالات المفتوحة حاليًا في العملية كلها وأعلى قيمة وصل إليها (لتحديد حجم مجمع الاتصالات)
+_connections_lock = threading.Lock()
+_open_connections = 0
+_peak_connections = 0
+_opened_connections = 0
+
+def record_connection(duration_ms: float) -> None:
+    """تسجيل فتح اتصال جديد وزمنه"""
+    global _open_connections, _peak_connections, _opened_connections
+    with _connections_lock:
+        _open_connections += 1
+        _opened_connections += 1
+        _peak_connections = max(_peak_connections, _open_connections)
+    stats = _current.get()
+    while stats is not None:
+        stats.connections += 1
+        stats.connect_ms += duration_ms
+        stats = stats.parent
+
+def release_connection() -> None:
+    """تسجيل إغلاق اتصال فتحه get_db_connection"""
+    global _open_connections
+    with _connections_lock:
+        _open_connections -= 1
+
+def open_connections() -> Dict[str, int]:
+    """الاتصالات المفتوحة الآن، وأعلى عدد متزامن منذ آخر reset_peak_connections، وإجمالي ما فُتح"""
+    with _connections_lock:
+        return {'open': _open_connections, 'peak': _peak_connections, 'opened': _opened_connections}
+
+def reset_peak_connections() -> None:
+    global _peak_connections
+    with _connections_lock:
+        _peak_connections = _open_connections
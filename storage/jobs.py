@@ -0,0 +1,143 @@
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from storage.core import connection
+
+# جدول المهام الخلفية: الحالة تمر بـ queued -> running -> done أو failed.
+# job_key يحدد المهمة المتطابقة (النوع والمعاملات) لمنع تشغيلها مرتين في نفس الوقت.
+# owner يحدد العملية التي تنفذ المهمة، و heartbeat_at تحدثه تلك العملية دوريًا ما دامت حية.
+ACTIVE_STATUSES = ('queued', 'running')
+
+_COLUMNS = '''job_id, job_type, job_key, params, status, progress_done, progress_total,
+              result_path, result_name, error, created_by, created_at, started_at,
+              finished_at, expires_at, owner, heartbeat_at'''
+
+def _row_to_job(row: Dict) -> Dict:
+    if row and row.get('params'):
+        row['params'] = json.loads(row['params'])
+    return row
+
+def create_job(job_type: str, job_key: str, params: Dict, created_by: int = None,
+               owner: str = None) -> int:
+    """إضافة مهمة جديدة بحالة queued تنفذها العملية owner وإرجاع رقمها"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO BackgroundJobs (job_type, job_key, params, created_by, owner, heartbeat_at)
+            VALUES (%s, %s, %s, %s, %s, %s) RETURNING job_id
+        ''', (job_type, job_key, json.dumps(params), created_by, owner, datetime.now()))
+        return cursor.fetchone()[0]
+
+def get_job(job_id: int) -> Optional[Dict]:
+    """الحصول على مهمة برقمها"""
+    with connection() as conn:
+        cursor = conn.cursor(dict_rows=True)
+        cursor.execute(f"SELECT {_COLUMNS} FROM BackgroundJobs WHERE job_id = %s", (job_id,))
+        return _row_to_job(cursor.fetchone())
+
+def find_job(job_key: str, now: datetime = None) -> Optional[Dict]:
+    """أحدث مهمة بنفس المفتاح ما زالت قيد التشغيل أو لها نتيجة لم تنته صلاحيتها"""
+    now = now or datetime.now()
+    with connection() as conn:
+        cursor = conn.cursor(dict_rows=True)
+        cursor.execute(f'''
+            SELECT {_COLUMNS} FROM BackgroundJobs
+            WHERE job_key = %s
+            AND (status = ANY(%s) OR (status IN ('done', 'failed') AND expires_at > %s))
+            ORDER BY job_id DESC
+            LIMIT 1
+        ''', (job_key, list(ACTIVE_STATUSES), now))
+        return _row_to_job(cursor.fetchone())
+
+def list_jobs(created_by: int = None, limit: int = 20) -> List[Dict]:
+    """أحدث المهام (لمستخدم معين أو للجميع)"""
+    with connection() as conn:
+        cursor = conn.cursor(dict_rows=True)
+        if created_by is None:
+            cursor.execute(f"SELECT {_COLUMNS} FROM BackgroundJobs ORDER BY job_id DESC LIMIT %s", (limit,))
+        else:
+            cursor.execute(f'''
+                SELECT {_COLUMNS} FROM BackgroundJobs
+                WHERE created_by = %s ORDER BY job_id DESC LIMIT %s
+            ''', (created_by, limit))
+        return [_row_to_job(row) for row in cursor.fetchall()]
+
+def start_job(job_id: int, progress_total: int = None) -> None:
+    with connection() as conn:
+        conn.cursor().execute('''
+            UPDATE BackgroundJobs
+            SET status = 'running', started_at = CURRENT_TIMESTAMP, progress_total = %s
+            WHERE job_id = %s
+        ''', (progress_total, job_id))
+
+def update_progress(job_id: int, progress_done: int) -> None:
+    with connection() as conn:
+        conn.cursor().execute(
+            "UPDATE BackgroundJobs SET progress_done = %s WHERE job_id = %s",
+            (progress_done, job_id)
+        )
+
+def finish_job(job_id: int, result_path: str, result_name: str, ttl: timedelta) -> None:
+    """تسجيل نجاح المهمة ومسار نتيجتها وموعد انتهاء صلاحيتها"""
+    with connection() as conn:
+        conn.cursor().execute('''
+            UPDATE BackgroundJobs
+            SET status = 'done', result_path = %s, result_name = %s,
+                finished_at = CURRENT_TIMESTAMP, expires_at = %s,
+                progress_done = COALESCE(progress_total, progress_done)
+            WHERE job_id = %s
+        ''', (result_path, result_name, datetime.now() + ttl, job_id))
+
+def fail_job(job_id: int, error: str, ttl: timedelta) -> None:
+    """تسجيل فشل المهمة؛ يبقى الخطأ ظاهرًا حتى انتهاء الصلاحية"""
+    with connection() as conn:
+        conn.cursor().execute('''
+            UPDATE BackgroundJobs
+            SET status = 'failed', error = %s, finished_at = CURRENT_TIMESTAMP, expires_at = %s
+            WHERE job_id = %s
+        ''', (error[:2000], datetime.now() + ttl, job_id))
+
+def heartbeat(owner: str) -> int:
+    """تحديث إشارة الحياة لمهام العملية owner الجارية وإرجاع عددها"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE BackgroundJobs SET heartbeat_at = %s
+            WHERE owner = %s AND status = ANY(%s)
+        ''', (datetime.now(), owner, list(ACTIVE_STATUSES)))
+        return cursor.rowcount
+
+def fail_interrupted_jobs(ttl: timedelta, stale_before: datetime, owner: str = None) -> int:
+    """تسجيل المهام التي لن تكتمل أبدًا كفاشلة وإرجاع عددها
+
+    وهي مهام owner (نفس العملية بعد إعادة تشغيلها) والمهام التي توقفت إشارة حياتها قبل
+    stale_before لأن عمليتها توقفت. مهام العمليات الأخرى الحية لا تتأثر.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE BackgroundJobs
+            SET status = 'failed', error = %s, finished_at = CURRENT_TIMESTAMP, expires_at = %s
+            WHERE status = ANY(%s)
+            AND (owner = %s OR heartbeat_at IS NULL OR heartbeat_at < %s)
+        ''', ("توقفت المهمة بسبب إعادة تشغيل الخادم", datetime.now() + ttl, list(ACTIVE_STATUSES),
+              owner, stale_before))
+        return cursor.rowcount
+
+def expired_jobs(now: datetime = None) -> List[Dict]:
+    """المهام المنتهية التي انتهت صلاحية نتائجها"""
+    now = now or datetime.now()
+    with connection() as conn:
+        cursor = conn.cursor(dict_rows=True)
+        cursor.execute(f'''
+            SELECT {_COLUMNS} FROM BackgroundJobs
+            WHERE status IN ('done', 'failed') AND expires_at <= %s
+        ''', (now,))
+        return [_row_to_job(row) for row in cursor.fetchall()]
+
+def delete_jobs(job_ids: List[int]) -> None:
+    if not job_ids:
+        return
+    with connection() as conn:
+        conn.cursor().execute("DELETE FROM BackgroundJobs WHERE job_id = ANY(%s)", (list(job_ids),))
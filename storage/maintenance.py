@@ -0,0 +1,122 @@
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+
+from storage.core import connection
+
+# مهام الصيانة الدفعية: كل استدعاء يعالج دفعة واحدة في معاملة قصيرة
+def count_audit_logs_before(cutoff: datetime) -> int:
+    """عدد سجلات التعديلات الأقدم من تاريخ معين"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM AuditLog WHERE action_timestamp < %s", (cutoff,))
+        return cursor.fetchone()[0]
+
+def purge_audit_logs(cutoff: datetime, batch_size: int = 1000) -> int:
+    """حذف دفعة من سجلات التعديلات الأقدم من cutoff وإرجاع عدد المحذوف"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM AuditLog WHERE log_id IN (
+                SELECT log_id FROM AuditLog
+                WHERE action_timestamp < %s
+                ORDER BY log_id
+                LIMIT %s
+            )
+        ''', (cutoff, batch_size))
+        return cursor.rowcount
+
+def count_drafts_before(cutoff: datetime) -> int:
+    """عدد الإجابات غير المكتملة الأقدم من تاريخ معين"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM Responses WHERE is_completed = FALSE AND submission_date < %s",
+            (cutoff,)
+        )
+        return cursor.fetchone()[0]
+
+def purge_draft_responses(cutoff: datetime, batch_size: int = 500) -> int:
+    """حذف دفعة من الإجابات غير المكتملة الأقدم من cutoff مع تفاصيلها"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT response_id FROM Responses
+            WHERE is_completed = FALSE AND submission_date < %s
+            ORDER BY response_id
+            LIMIT %s
+        ''', (cutoff, batch_size))
+        response_ids = [row[0] for row in cursor.fetchall()]
+        if not response_ids:
+            return 0
+        cursor.execute("DELETE FROM Response_Details WHERE response_id = ANY(%s)", (response_ids,))
+        cursor.execute("DELETE FROM Responses WHERE response_id = ANY(%s)", (response_ids,))
+        return len(response_ids)
+
+def count_missing_last_modified(after_response_id: int = 0) -> int:
+    """عدد الإجابات التي ليس لها وقت آخر تعديل"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM Responses WHERE last_modified IS NULL AND response_id > %s",
+            (after_response_id,)
+        )
+        return cursor.fetchone()[0]
+
+def backfill_last_modified(after_response_id: int = 0, batch_size: int = 1000) -> Tuple[int, int]:
+    """تعبئة last_modified بتاريخ التقديم لدفعة من الإجابات القديمة
+
+    تُرجع (آخر رقم إجابة تمت معالجته، عدد الصفوف المحدثة)، والرقم لا يتغير عند انتهاء البيانات.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT response_id FROM Responses
+            WHERE last_modified IS NULL AND response_id > %s
+            ORDER BY response_id
+            LIMIT %s
+        ''', (after_response_id, batch_size))
+        response_ids = [row[0] for row in cursor.fetchall()]
+        if not response_ids:
+            return after_response_id, 0
+        cursor.execute('''
+            UPDATE Responses SET last_modified = submission_date
+            WHERE response_id = ANY(%s) AND last_modified IS NULL
+        ''', (response_ids,))
+        return response_ids[-1], cursor.rowcount
+
+def get_first_submission_day() -> Optional[date]:
+    """يوم أقدم إجابة (None إذا لم توجد إجابات)"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        # العمود نفسه بدلاً من MIN() ليحتفظ بنوعه في SQLite
+        cursor.execute("SELECT submission_date FROM Responses ORDER BY submission_date LIMIT 1")
+        row = cursor.fetchone()
+        return row[0].date() if row else None
+
+# أيام كل دفعة في إعادة حساب DailySubmissionCounts
+DAILY_COUNTS_BATCH_DAYS = 31
+
+def backfill_daily_counts(first_day: date, days: int = DAILY_COUNTS_BATCH_DAYS) -> int:
+    """إعادة حساب DailySubmissionCounts لعدد من الأيام بدءًا من first_day وإرجاع عدد الصفوف
+
+    أيام الدفعة تُحذف وتُحسب من Responses في نفس المعاملة، لذلك تكرار الدفعة لا يكرر العد.
+    الإدراج يستبدل أي صف أضافه إرسال متزامن بعد الحذف بدل أن يفشل بتكرار المفتاح.
+    """
+    start = datetime.combine(first_day, datetime.min.time())
+    end = start + timedelta(days=days)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM DailySubmissionCounts WHERE day >= %s AND day < %s",
+            (first_day, end.date())
+        )
+        cursor.execute('''
+            INSERT INTO DailySubmissionCounts (survey_id, day, region_id, submissions)
+            SELECT survey_id, DATE(submission_date), region_id, COUNT(*)
+            FROM Responses
+            WHERE submission_date >= %s AND submission_date < %s AND is_completed = TRUE
+            GROUP BY survey_id, DATE(submission_date), region_id
+            ON CONFLICT (survey_id, day, region_id)
+            DO UPDATE SET submissions = EXCLUDED.submissions
+        ''', (start, end))
+        return cursor.rowcount
@@ -0,0 +1,151 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional, List, Tuple
+
+from storage.core import connection
+from storage.errors import DuplicateError
+
+# دوال المحافظات والإدارات الصحية
+def get_governorates_list() -> List[Tuple]:
+    """الحصول على قائمة المحافظات"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT governorate_id, governorate_name FROM Governorates")
+        return cursor.fetchall()
+
+def add_health_admin(admin_name: str, description: str, governorate_id: int) -> int:
+    """إضافة إدارة صحية جديدة وإرجاع رقمها"""
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT 1 FROM HealthAdministrations WHERE admin_name=%s AND governorate_id=%s",
+                       (admin_name, governorate_id))
+        if cursor.fetchone():
+            raise DuplicateError("هذه الإدارة الصحية موجودة بالفعل في هذه المحافظة!")
+
+        cursor.execute(
+            """INSERT INTO HealthAdministrations (admin_name, description, governorate_id)
+               VALUES (%s, %s, %s) RETURNING admin_id""",
+            (admin_name, description, governorate_id)
+        )
+        return cursor.fetchone()[0]
+
+def get_health_admins() -> List[Tuple]:
+    """الحصول على قائمة الإدارات الصحية"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT admin_id, admin_name FROM HealthAdministrations")
+        return cursor.fetchall()
+
+def get_governorate_health_admins(governorate_id: int) -> List[Tuple]:
+    """الإدارات الصحية في محافظة (الرقم، الاسم)"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT admin_id, admin_name FROM HealthAdministrations WHERE governorate_id = %s ORDER BY admin_name",
+            (governorate_id,)
+        )
+        return cursor.fetchall()
+
+def get_health_admin_name(admin_id: int) -> Optional[str]:
+    """الحصول على اسم الإدارة الصحية (None إذا لم تكن موجودة)"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT admin_name FROM HealthAdministrations WHERE admin_id=%s", (admin_id,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+# دوال مسؤولي المحافظات
+def add_governorate_admin(user_id: int, governorate_id: int) -> None:
+    """إضافة مسؤول محافظة"""
+    with connection() as conn:
+        conn.cursor().execute(
+            "INSERT INTO GovernorateAdmins (user_id, governorate_id) VALUES (%s, %s)",
+            (user_id, governorate_id)
+        )
+
+def get_governorate_admin(user_id: int) -> List[Tuple]:
+    """الحصول على بيانات مسؤول المحافظة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT g.governorate_id, g.governorate_name
+            FROM GovernorateAdmins ga
+            JOIN Governorates g ON ga.governorate_id = g.governorate_id
+            WHERE ga.user_id = %s
+        ''', (user_id,))
+        return cursor.fetchall()
+
+def get_governorate_admin_data(user_id: int) -> Optional[Tuple]:
+    """الحصول على بيانات مسؤول المحافظة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT g.governorate_id, g.governorate_name, g.description
+            FROM GovernorateAdmins ga
+            JOIN Governorates g ON ga.governorate_id = g.governorate_id
+            WHERE ga.user_id = %s
+        ''', (user_id,))
+        return cursor.fetchone()
+
+def get_governorate_surveys(governorate_id: int) -> List[Tuple]:
+    """الحصول على استبيانات المحافظة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.survey_id, s.survey_name, s.created_at, s.is_active
+            FROM Surveys s
+            JOIN SurveyGovernorate sg ON s.survey_id = sg.survey_id
+            WHERE sg.governorate_id = %s
+            ORDER BY s.created_at DESC
+        ''', (governorate_id,))
+        return cursor.fetchall()
+
+def get_governorate_employees(governorate_id: int) -> List[Tuple]:
+    """الحصول على موظفي المحافظة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT u.user_id, u.username, ha.admin_name
+            FROM Users u
+            JOIN HealthAdministrations ha ON u.assigned_region = ha.admin_id
+            WHERE ha.governorate_id = %s AND u.role = 'employee'
+            ORDER BY u.username
+        ''', (governorate_id,))
+        return cursor.fetchall()
+
+def get_governorate_compliance(governorate_id: int, day: date = None) -> List[Tuple]:
+    """إكمال الموظفين لاستبياناتهم المسموح بها في يوم (افتراضيًا اليوم حسب قاعدة البيانات)، مجمعة حسب الإدارة الصحية
+
+    كل صف: (رقم الإدارة، اسمها، رقم الموظف، اسمه، الاستبيانات المسموح بها، المتبقية، آخر إرسال
+    في اليوم). الإكمالات تُقرأ مرة واحدة لنطاق اليوم ثم تُطابق مع الصلاحيات (LEFT JOIN ... IS NULL)
+    بدلاً من استعلام لكل موظف.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        if day is None:
+            # اليوم بساعة قاعدة البيانات التي تكتب submission_date، لا بساعة خادم التطبيق
+            cursor.execute("SELECT CURRENT_DATE")
+            day = cursor.fetchone()[0]
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+        start = datetime.combine(day, time.min)
+        cursor.execute('''
+            SELECT ha.admin_id, ha.admin_name, u.user_id, u.username,
+                   COUNT(*),
+                   SUM(CASE WHEN done.user_id IS NULL THEN 1 ELSE 0 END),
+                   MAX(done.submitted_at)
+            FROM HealthAdministrations ha
+            JOIN Users u ON u.assigned_region = ha.admin_id AND u.role = 'employee'
+            JOIN UserSurveys us ON us.user_id = u.user_id
+            JOIN Surveys s ON s.survey_id = us.survey_id AND s.is_active = TRUE
+            LEFT JOIN (
+                SELECT user_id, survey_id, MAX(submission_date) AS submitted_at
+                FROM Responses
+                WHERE submission_date >= %s AND submission_date < %s AND is_completed = TRUE
+                GROUP BY user_id, survey_id
+            ) done ON done.user_id = us.user_id AND done.survey_id = us.survey_id
+            WHERE ha.governorate_id = %s
+            GROUP BY ha.admin_id, ha.admin_name, u.user_id, u.username
+            ORDER BY ha.admin_name, 6 DESC, u.username
+        ''', (start, start + timedelta(days=1), governorate_id))
+        return cursor.fetchall()
@@ -0,0 +1,234 @@
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from storage.backends import DuckDBBackend
+from storage.core import connection
+from storage.errors import DatabaseError
+from storage.exports import commit_cutoff
+
+# نسخة تحليلية محلية في DuckDB (REPLICA_PATH) تُقرأ منها الاستعلامات التحليلية بدلاً من
+# القاعدة الرئيسية. كل مزامنة تنسخ فقط ما تغير منذ السابقة:
+# - الجداول المرجعية الصغيرة (المحافظات، الإدارات، المستخدمين، الاستبيانات وحقولها) تُنسخ كاملة.
+# - الإجابات الجديدة بعد آخر رقم إجابة منسوخ، والمعدلة بعد حد المزامنة السابقة، مع تفاصيلها.
+#   الحد هو commit_cutoff (وقت القاعدة ناقص هامش) لا أكبر last_modified مقروء: تعديل بدأ قبل
+#   القراءة والتزم بعدها له وقت أقدم، فيُعاد نسخ ما عُدل خلال الهامش بدلاً من أن يفوت.
+# - إذا اختلف عدد الإجابات حتى آخر رقم بين القاعدتين (حذف أو إجابة التزمت متأخرة) تُقارن الأرقام.
+# المزامنة تعمل في معاملة واحدة على النسخة، فالقراءات ترى النسخة السابقة كاملة حتى تكتمل.
+
+# إعادة نسخ آخر إجابات قبل الرقم المحفوظ، لأن أرقام SERIAL قد تلتزم بغير ترتيبها
+OVERLAP_RESPONSES = 1000
+
+# الجدول: (الأعمدة، المفتاح) بنفس أسماء القاعدة الرئيسية؛ Users بدون كلمات المرور
+REFERENCE_TABLES = {
+    'Governorates': ('governorate_id INTEGER PRIMARY KEY, governorate_name TEXT, description TEXT',
+                     'governorate_id, governorate_name, description'),
+    'HealthAdministrations': ('admin_id INTEGER PRIMARY KEY, admin_name TEXT, description TEXT, '
+                              'governorate_id INTEGER',
+                              'admin_id, admin_name, description, governorate_id'),
+    'Users': ('user_id INTEGER PRIMARY KEY, username TEXT, role TEXT, assigned_region INTEGER',
+              'user_id, username, role, assigned_region'),
+    'Surveys': ('survey_id INTEGER PRIMARY KEY, survey_name TEXT, created_at TIMESTAMP, is_active BOOLEAN, '
+                'definition_version INTEGER',
+                'survey_id, survey_name, created_at, is_active, definition_version'),
+    'Survey_Fields': ('field_id INTEGER PRIMARY KEY, survey_id INTEGER, field_type TEXT, field_label TEXT, '
+                      'field_options TEXT, is_required BOOLEAN, field_order INTEGER, from_version INTEGER, '
+                      'to_version INTEGER',
+                      'field_id, survey_id, field_type, field_label, field_options, is_required, field_order, '
+                      'from_version, to_version'),
+    'SurveyGovernorate': ('id INTEGER PRIMARY KEY, survey_id INTEGER, governorate_id INTEGER',
+                          'id, survey_id, governorate_id'),
+}
+RESPONSE_COLUMNS = ('response_id, survey_id, user_id, region_id, submission_date, is_completed, '
+                    'survey_version, edit_version, last_modified')
+DETAIL_COLUMNS = 'detail_id, response_id, field_id, answer_value'
+
+REPLICA_SCHEMA = [f"CREATE TABLE IF NOT EXISTS {table} ({columns})"
+                  for table, (columns, _) in REFERENCE_TABLES.items()] + [
+    '''CREATE TABLE IF NOT EXISTS Responses (
+        response_id INTEGER PRIMARY KEY, survey_id INTEGER, user_id INTEGER, region_id INTEGER,
+        submission_date TIMESTAMP, is_completed BOOLEAN, survey_version INTEGER,
+        edit_version INTEGER, last_modified TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS Response_Details (
+        detail_id INTEGER PRIMARY KEY, response_id INTEGER, field_id INTEGER, answer_value TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS ReplicaSync (
+        sync_id INTEGER PRIMARY KEY, last_response_id INTEGER, last_modified TIMESTAMP,
+        synced_at TIMESTAMP, duration_ms DOUBLE
+    )''',
+]
+
+def replica_path() -> Optional[str]:
+    """مسار ملف النسخة التحليلية، أو None إذا لم تُفعّل"""
+    return os.getenv('REPLICA_PATH') or None
+
+_backend: Optional[DuckDBBackend] = None
+
+def _get_backend() -> DuckDBBackend:
+    global _backend
+    path = replica_path()
+    if _backend is None or _backend.path != path:
+        _backend = DuckDBBackend(path)
+    return _backend
+
+@contextmanager
+def replica_connection():
+    """اتصال بالنسخة التحليلية داخل معاملة واحدة"""
+    conn = None
+    try:
+        conn = _get_backend().connect()
+        yield conn
+        conn.commit()
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        raise DatabaseError(str(e)) from e
+    finally:
+        if conn:
+            conn.close()
+
+def sync_status() -> Optional[Dict]:
+    """آخر مزامنة (الوقت، آخر رقم إجابة، المدة)، أو None إذا لم تكتمل أي مزامنة بعد"""
+    if not replica_path() or not os.path.exists(replica_path()):
+        return None
+    with replica_connection() as conn:
+        cursor = conn.cursor(dict_rows=True)
+        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_name = 'ReplicaSync'")
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute('''
+            SELECT last_response_id, last_modified, synced_at, duration_ms FROM ReplicaSync
+            WHERE sync_id = 1
+        ''')
+        return cursor.fetchone()
+
+def _insert_rows(conn, table: str, columns: str, rows: List[Tuple]) -> None:
+    """إدراج صفوف كثيرة في النسخة دفعة واحدة عبر DataFrame (أسرع كثيرًا من صف بصف)"""
+    if not rows:
+        return
+    import pandas as pd
+    frame = pd.DataFrame(rows, columns=[c.strip() for c in columns.split(',')])
+    conn.raw.register('replica_batch', frame)
+    try:
+        conn.raw.execute(f"INSERT OR REPLACE INTO {table} ({columns}) SELECT {columns} FROM replica_batch")
+    finally:
+        conn.raw.unregister('replica_batch')
+
+def _copy_responses(rconn, response_ids: Sequence[int]) -> int:
+    """نسخ إجابات بأرقامها مع تفاصيلها (تفاصيلها القديمة في النسخة تُحذف أولاً)"""
+    if not response_ids:
+        return 0
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {RESPONSE_COLUMNS} FROM Responses WHERE response_id = ANY(%s)",
+                       (list(response_ids),))
+        responses = cursor.fetchall()
+        cursor.execute(f"SELECT {DETAIL_COLUMNS} FROM Response_Details WHERE response_id = ANY(%s)",
+                       (list(response_ids),))
+        details = cursor.fetchall()
+    rconn.cursor().execute("DELETE FROM Response_Details WHERE response_id = ANY(%s)", (list(response_ids),))
+    _insert_rows(rconn, 'Responses', RESPONSE_COLUMNS, responses)
+    _insert_rows(rconn, 'Response_Details', DETAIL_COLUMNS, details)
+    return len(responses)
+
+def _delete_responses(rconn, response_ids: Sequence[int]) -> None:
+    if response_ids:
+        cursor = rconn.cursor()
+        cursor.execute("DELETE FROM Response_Details WHERE response_id = ANY(%s)", (list(response_ids),))
+        cursor.execute("DELETE FROM Responses WHERE response_id = ANY(%s)", (list(response_ids),))
+
+def _primary_ids(sql: str, params: tuple, batch_size: int) -> List[List[int]]:
+    """أرقام الإجابات من القاعدة الرئيسية على دفعات"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        ids = [row[0] for row in cursor.fetchall()]
+    return [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+
+def sync(batch_size: int = 5000, progress: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+    """مزامنة النسخة التحليلية مع القاعدة الرئيسية وإرجاع عدد الصفوف المنسوخة والمحذوفة
+
+    new هي الإجابات بعد آخر مزامنة فقط، و overlap إجابات التداخل التي أعيد نسخها.
+    """
+    if not replica_path():
+        raise DatabaseError("النسخة التحليلية غير مفعلة (REPLICA_PATH)")
+    started = time.perf_counter()
+    counts = {'reference': 0, 'new': 0, 'overlap': 0, 'changed': 0, 'reconciled': 0, 'deleted': 0}
+
+    # الحد الأعلى يُقرأ أولاً: ما يتغير بعده يُنسخ في المزامنة التالية
+    with connection() as conn:
+        cursor = conn.cursor()
+        modified_to = commit_cutoff(cursor)
+        cursor.execute("SELECT COALESCE(MAX(response_id), 0) FROM Responses")
+        up_to = cursor.fetchone()[0]
+        reference = {}
+        for table, (_, columns) in REFERENCE_TABLES.items():
+            cursor.execute(f"SELECT {columns} FROM {table}")
+            reference[table] = cursor.fetchall()
+
+    with replica_connection() as rconn:
+        cursor = rconn.cursor()
+        for statement in REPLICA_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute("SELECT last_response_id, last_modified FROM ReplicaSync WHERE sync_id = 1")
+        state = cursor.fetchone()
+        last_id, last_modified = state if state else (0, None)
+
+        for table, (_, columns) in REFERENCE_TABLES.items():
+            cursor.execute(f"DELETE FROM {table}")
+            _insert_rows(rconn, table, columns, reference[table])
+            counts['reference'] += len(reference[table])
+        if progress:
+            progress(counts['reference'], 'reference')
+
+        # 1. الإجابات الجديدة (مع تداخل للأرقام التي التزمت متأخرة)
+        for ids in _primary_ids(
+                "SELECT response_id FROM Responses WHERE response_id > %s AND response_id <= %s ORDER BY response_id",
+                (max(last_id - OVERLAP_RESPONSES, 0), up_to), batch_size):
+            _copy_responses(rconn, ids)
+            overlap = sum(1 for response_id in ids if response_id <= last_id)
+            counts['overlap'] += overlap
+            counts['new'] += len(ids) - overlap
+            if progress:
+                progress(len(ids), 'new')
+
+        # 2. الإجابات المعدلة منذ آخر مزامنة
+        if state is not None:
+            # قبل أول تعديل مسجل تُقارن كل الإجابات التي لها وقت تعديل
+            changed_sql, changed_params = ("last_modified > %s", (last_modified,)) if last_modified is not None \
+                else ("last_modified IS NOT NULL", ())
+            for ids in _primary_ids(
+                    f"SELECT response_id FROM Responses WHERE {changed_sql} AND response_id <= %s",
+                    changed_params + (max(last_id - OVERLAP_RESPONSES, 0),), batch_size):
+                counts['changed'] += _copy_responses(rconn, ids)
+                if progress:
+                    progress(len(ids), 'changed')
+
+        # 3. المقارنة عند اختلاف العدد (حذف المسودات أو الاستبيانات، أو إجابة فاتت المزامنة)
+        with connection() as conn:
+            primary_cursor = conn.cursor()
+            primary_cursor.execute("SELECT COUNT(*) FROM Responses WHERE response_id <= %s", (up_to,))
+            primary_count = primary_cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM Responses WHERE response_id <= %s", (up_to,))
+        if cursor.fetchone()[0] != primary_count:
+            primary_ids = {i for ids in _primary_ids(
+                "SELECT response_id FROM Responses WHERE response_id <= %s", (up_to,), batch_size) for i in ids}
+            cursor.execute("SELECT response_id FROM Responses WHERE response_id <= %s", (up_to,))
+            replica_ids = {row[0] for row in cursor.fetchall()}
+            missing = sorted(primary_ids - replica_ids)
+            for start in range(0, len(missing), batch_size):
+                counts['reconciled'] += _copy_responses(rconn, missing[start:start + batch_size])
+                if progress:
+                    progress(len(missing[start:start + batch_size]), 'reconciled')
+            extra = sorted(replica_ids - primary_ids)
+            _delete_responses(rconn, extra)
+            counts['deleted'] = len(extra)
+
+        cursor.execute('''
+            INSERT OR REPLACE INTO ReplicaSync (sync_id, last_response_id, last_modified, synced_at, duration_ms)
+            VALUES (1, %s, %s, %s, %s)
+        ''', (up_to, modified_to, datetime.now(), (time.perf_counter() - started) * 1000))
+    return counts
@@ -0,0 +1,274 @@
+from typing import Optional, List, Tuple, Dict
+
+from storage import survey_schema
+from storage.audit import insert_audit
+from storage.backends import execute_values
+from storage.core import connection
+from storage.errors import ConflictError, ValidationError
+
+# دوال الإجابات
+def _count_submission(cursor, response_id: int) -> None:
+    """إضافة الإجابة المكتملة إلى عدد يومها في DailySubmissionCounts (في نفس معاملة حفظها)"""
+    cursor.execute('''
+        INSERT INTO DailySubmissionCounts (survey_id, day, region_id, submissions)
+        SELECT survey_id, DATE(submission_date), region_id, 1 FROM Responses
+        WHERE response_id = %s
+        ON CONFLICT (survey_id, day, region_id)
+        DO UPDATE SET submissions = DailySubmissionCounts.submissions + 1
+    ''', (response_id,))
+
+def save_response(survey_id: int, user_id: int, region_id: int, is_completed: bool = False,
+                  survey_version: int = None) -> int:
+    """حفظ إجابة استبيان مرتبطة بإصدار التعريف الذي عُبئت عليه وإرجاع رقمها"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            '''INSERT INTO Responses
+               (survey_id, user_id, region_id, is_completed, survey_version, last_modified)
+               VALUES (%s, %s, %s, %s, COALESCE(%s, (
+                   SELECT definition_version FROM Surveys WHERE survey_id = %s
+               )), CURRENT_TIMESTAMP)
+               RETURNING response_id''',
+            (survey_id, user_id, region_id, is_completed, survey_version, survey_id)
+        )
+        response_id = cursor.fetchone()[0]
+        if is_completed:
+            _count_submission(cursor, response_id)
+        return response_id
+
+def submit_response(survey_id: int, user_id: int, region_id: int, answers: Dict[int, object],
+                    is_completed: bool = False, survey_version: int = None) -> int:
+    """حفظ الإجابة مع جميع تفاصيلها في معاملة واحدة وإرجاع رقمها
+
+    التفاصيل تُضاف بإدراج متعدد الصفوف بدلاً من استعلام لكل حقل، والإجابات الفارغة (None) لا تُحفظ.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            '''INSERT INTO Responses
+               (survey_id, user_id, region_id, is_completed, survey_version, last_modified)
+               VALUES (%s, %s, %s, %s, COALESCE(%s, (
+                   SELECT definition_version FROM Surveys WHERE survey_id = %s
+               )), CURRENT_TIMESTAMP)
+               RETURNING response_id''',
+            (survey_id, user_id, region_id, is_completed, survey_version, survey_id)
+        )
+        response_id = cursor.fetchone()[0]
+        if is_completed:
+            _count_submission(cursor, response_id)
+
+        details = [(response_id, field_id, str(answer))
+                   for field_id, answer in answers.items() if answer is not None]
+        if details:
+            execute_values(
+                cursor,
+                "INSERT INTO Response_Details (response_id, field_id, answer_value) VALUES %s",
+                details
+            )
+        return response_id
+
+def save_response_detail(response_id: int, field_id: int, answer_value: str) -> None:
+    """حفظ تفاصيل الإجابة وتحديث تاريخ تعديلها حتى يعيدها تصدير التغييرات كاملة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO Response_Details (response_id, field_id, answer_value) VALUES (%s, %s, %s)",
+            (response_id, field_id, str(answer_value) if answer_value is not None else "")
+        )
+        cursor.execute(
+            "UPDATE Responses SET last_modified = CURRENT_TIMESTAMP WHERE response_id = %s",
+            (response_id,)
+        )
+
+def get_response_info(response_id: int) -> Optional[Tuple]:
+    """الحصول على معلومات الإجابة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT r.response_id, s.survey_name, u.username,
+                   ha.admin_name, g.governorate_name, r.submission_date,
+                   r.survey_version, r.edit_version
+            FROM Responses r
+            JOIN Surveys s ON r.survey_id = s.survey_id
+            JOIN Users u ON r.user_id = u.user_id
+            JOIN HealthAdministrations ha ON r.region_id = ha.admin_id
+            JOIN Governorates g ON ha.governorate_id = g.governorate_id
+            WHERE r.response_id = %s
+        ''', (response_id,))
+        return cursor.fetchone()
+
+def get_response_details(response_id: int) -> List[Tuple]:
+    """الحصول على تفاصيل الإجابة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT rd.detail_id, rd.field_id, sf.field_label,
+                   sf.field_type, sf.field_options, rd.answer_value
+            FROM Response_Details rd
+            JOIN Survey_Fields sf ON rd.field_id = sf.field_id
+            WHERE rd.response_id = %s
+            ORDER BY sf.field_order, sf.field_id
+        ''', (response_id,))
+        return cursor.fetchall()
+
+def update_response_detail(detail_id: int, new_value: str) -> None:
+    """تحديث تفاصيل الإجابة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE Response_Details SET answer_value = %s WHERE detail_id = %s",
+            (new_value, detail_id)
+        )
+        cursor.execute('''
+            UPDATE Responses
+            SET edit_version = edit_version + 1, last_modified = CURRENT_TIMESTAMP
+            WHERE response_id = (SELECT response_id FROM Response_Details WHERE detail_id = %s)
+        ''', (detail_id,))
+
+def update_response_details(response_id: int, updates: Dict[int, str], expected_version: int, *,
+                            acting_user_id: int) -> int:
+    """تحديث عدة قيم في إجابة واحدة داخل معاملة واحدة وإرجاع رقم الإصدار الجديد
+
+    يُرفع ConflictError إذا عُدلت الإجابة منذ قراءة expected_version.
+    """
+    if not updates:
+        return expected_version
+
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        # 1. رفع رقم الإصدار فقط إذا لم تُعدل الإجابة منذ فتحها
+        cursor.execute('''
+            UPDATE Responses
+            SET edit_version = edit_version + 1, last_modified = CURRENT_TIMESTAMP
+            WHERE response_id = %s AND edit_version = %s
+        ''', (response_id, expected_version))
+        if cursor.rowcount == 0:
+            raise ConflictError("تم تعديل هذه الإجابة من مستخدم آخر بعد فتحها. يرجى إعادة تحميلها والمحاولة مرة أخرى")
+
+        # 2. القيم القديمة للتأكد من انتماء الحقول للإجابة ولسجل التعديلات
+        cursor.execute('''
+            SELECT detail_id, answer_value FROM Response_Details
+            WHERE response_id = %s AND detail_id = ANY(%s)
+        ''', (response_id, list(updates)))
+        old_values = dict(cursor.fetchall())
+        if len(old_values) != len(updates):
+            raise ValidationError("بعض الحقول المعدلة لا تنتمي لهذه الإجابة")
+
+        # 3. تحديث جميع القيم في استعلام واحد
+        cases = []
+        params = []
+        for detail_id, value in updates.items():
+            cases.append("WHEN %s THEN %s")
+            params.extend([detail_id, str(value) if value is not None else ""])
+        cursor.execute(
+            "UPDATE Response_Details SET answer_value = CASE detail_id "
+            + " ".join(cases) +
+            " END WHERE detail_id = ANY(%s)",
+            params + [list(updates)]
+        )
+
+        # 4. سجل تعديلات واحد لجميع التغييرات
+        insert_audit(
+            cursor,
+            acting_user_id,
+            'UPDATE',
+            'Response_Details',
+            response_id,
+            {'edit_version': expected_version, 'values': old_values},
+            {'edit_version': expected_version + 1, 'values': updates}
+        )
+
+        return expected_version + 1
+
+def has_completed_survey_today(user_id: int, survey_id: int) -> bool:
+    """التحقق من إكمال الاستبيان اليوم"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 1 FROM Responses
+            WHERE user_id = %s AND survey_id = %s AND is_completed = TRUE
+            AND DATE(submission_date) = CURRENT_DATE
+            LIMIT 1
+        ''', (user_id, survey_id))
+        return cursor.fetchone() is not None
+
+def get_employee_dashboard_data(user_id: int, region_id: int, selected_survey_ids: List[int] = None) -> Optional[Dict]:
+    """تحميل كل بيانات لوحة الموظف في اتصال واحد واستعلامين"""
+    with connection() as conn:
+        cursor = conn.cursor(dict_rows=True)
+
+        # 1. المنطقة وآخر دخول والاستبيانات المسموح بها مع حالة إكمالها اليوم
+        cursor.execute('''
+            SELECT ha.admin_id, ha.admin_name, g.governorate_name, g.governorate_id,
+                   u.last_login, s.survey_id, s.survey_name, s.created_at,
+                   s.definition_version,
+                   EXISTS (
+                       SELECT 1 FROM Responses r
+                       WHERE r.user_id = u.user_id AND r.survey_id = s.survey_id
+                       AND r.is_completed = TRUE
+                       AND DATE(r.submission_date) = CURRENT_DATE
+                   ) AS completed_today
+            FROM Users u
+            JOIN HealthAdministrations ha ON ha.admin_id = %s
+            JOIN Governorates g ON ha.governorate_id = g.governorate_id
+            LEFT JOIN UserSurveys us ON us.user_id = u.user_id
+            LEFT JOIN Surveys s ON s.survey_id = us.survey_id
+            WHERE u.user_id = %s
+            ORDER BY s.survey_name
+        ''', (region_id, user_id))
+        rows = cursor.fetchall()
+
+        if not rows:
+            return None
+
+        first = rows[0]
+        data = {
+            'region_info': {
+                'admin_id': first['admin_id'],
+                'admin_name': first['admin_name'],
+                'governorate_name': first['governorate_name'],
+                'governorate_id': first['governorate_id']
+            },
+            'last_login': first['last_login'],
+            'allowed_surveys': [],
+            'surveys': {}
+        }
+        for row in rows:
+            if row['survey_id'] is None:
+                continue
+            data['allowed_surveys'].append((row['survey_id'], row['survey_name']))
+            data['surveys'][row['survey_id']] = {
+                'survey_name': row['survey_name'],
+                'created_at': row['created_at'],
+                'completed_today': row['completed_today'],
+                'version': row['definition_version'],
+                'schema': survey_schema.get_cached(row['survey_id'], row['definition_version'])
+            }
+
+        # 2. حقول الاستبيانات المختارة التي ليس لها تعريف مترجم في الذاكرة فقط
+        selected = [sid for sid in (selected_survey_ids or [])
+                    if sid in data['surveys'] and data['surveys'][sid]['schema'] is None]
+        if selected:
+            cursor.execute('''
+                SELECT survey_id, field_id, field_label, field_type,
+                       field_options, is_required, field_order
+                FROM Survey_Fields
+                WHERE survey_id = ANY(%s) AND to_version IS NULL
+                ORDER BY survey_id, field_order, field_id
+            ''', (selected,))
+            rows_by_survey = {sid: [] for sid in selected}
+            for row in cursor.fetchall():
+                rows_by_survey[row['survey_id']].append((
+                    row['field_id'],
+                    row['field_label'],
+                    row['field_type'],
+                    row['field_options'],
+                    row['is_required'],
+                    row['field_order']
+                ))
+            for sid, rows in rows_by_survey.items():
+                survey = data['surveys'][sid]
+                survey['schema'] = survey_schema.compile_survey(sid, survey['version'], rows)
+
+        return data
@@ -0,0 +1,247 @@
+from storage.core import connection
+from storage.users import hash_password
+
+INDEXES = [
+    # الإجابات حسب الاستبيان (التصدير والعرض) وحسب المستخدم (التحقق من الإكمال اليوم)
+    "CREATE INDEX IF NOT EXISTS idx_responses_survey ON Responses(survey_id, response_id)",
+    "CREATE INDEX IF NOT EXISTS idx_responses_user_survey ON Responses(user_id, survey_id, submission_date)",
+    "CREATE INDEX IF NOT EXISTS idx_response_details_response ON Response_Details(response_id)",
+    "CREATE INDEX IF NOT EXISTS idx_survey_fields_survey ON Survey_Fields(survey_id, field_order)",
+    "CREATE INDEX IF NOT EXISTS idx_health_admins_governorate ON HealthAdministrations(governorate_id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_region ON Users(assigned_region)",
+    "CREATE INDEX IF NOT EXISTS idx_survey_governorate_governorate ON SurveyGovernorate(governorate_id)",
+    "CREATE INDEX IF NOT EXISTS idx_auditlog_timestamp ON AuditLog(action_timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_background_jobs_key ON BackgroundJobs(job_key, status)",
+    "CREATE INDEX IF NOT EXISTS idx_responses_survey_modified ON Responses(survey_id, last_modified)",
+    # إكمالات يوم واحد لمتابعة الالتزام اليومي (نطاق على التاريخ بدلاً من مسح كل الإجابات)
+    "CREATE INDEX IF NOT EXISTS idx_responses_submission ON Responses(submission_date, user_id, survey_id)",
+]
+
+def init_db() -> None:
+    """تهيئة جداول قاعدة البيانات إذا لم تكن موجودة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        
+        # إنشاء جدول المحافظات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Governorates (
+                governorate_id SERIAL PRIMARY KEY,
+                governorate_name TEXT NOT NULL UNIQUE,
+                description TEXT
+            )
+        ''')
+        
+        # إنشاء جدول الإدارات الصحية
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS HealthAdministrations (
+                admin_id SERIAL PRIMARY KEY,
+                admin_name TEXT NOT NULL,
+                description TEXT,
+                governorate_id INTEGER NOT NULL REFERENCES Governorates(governorate_id),
+                UNIQUE(admin_name, governorate_id)
+            )
+        ''')
+        
+        # إنشاء جدول المستخدمين
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Users (
+                user_id SERIAL PRIMARY KEY,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                role TEXT NOT NULL,
+                assigned_region INTEGER REFERENCES HealthAdministrations(admin_id),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP,
+                last_activity TIMESTAMP
+            )
+        ''')
+        
+        # إنشاء جدول الاستبيانات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Surveys (
+                survey_id SERIAL PRIMARY KEY,
+                survey_name TEXT NOT NULL,
+                created_by INTEGER NOT NULL REFERENCES Users(user_id),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_active BOOLEAN DEFAULT TRUE,
+                definition_version INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+        cursor.execute('''
+            ALTER TABLE Surveys
+            ADD COLUMN IF NOT EXISTS definition_version INTEGER NOT NULL DEFAULT 1
+        ''')
+        
+        # إنشاء جدول حقول الاستبيان
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Survey_Fields (
+                field_id SERIAL PRIMARY KEY,
+                survey_id INTEGER NOT NULL REFERENCES Surveys(survey_id),
+                field_type TEXT NOT NULL,
+                field_label TEXT NOT NULL,
+                field_options TEXT,
+                is_required BOOLEAN DEFAULT FALSE,
+                field_order INTEGER NOT NULL,
+                from_version INTEGER NOT NULL DEFAULT 1,
+                to_version INTEGER
+            )
+        ''')
+        # صفوف الحقول غير قابلة للتعديل: كل صف صالح للإصدارات من from_version حتى ما قبل to_version
+        cursor.execute('''
+            ALTER TABLE Survey_Fields
+            ADD COLUMN IF NOT EXISTS from_version INTEGER NOT NULL DEFAULT 1
+        ''')
+        cursor.execute('''
+            ALTER TABLE Survey_Fields
+            ADD COLUMN IF NOT EXISTS to_version INTEGER
+        ''')
+        
+        # إنشاء جدول الإجابات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Responses (
+                response_id SERIAL PRIMARY KEY,
+                survey_id INTEGER NOT NULL REFERENCES Surveys(survey_id),
+                user_id INTEGER NOT NULL REFERENCES Users(user_id),
+                region_id INTEGER NOT NULL REFERENCES HealthAdministrations(admin_id),
+                submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_completed BOOLEAN DEFAULT FALSE,
+                survey_version INTEGER NOT NULL DEFAULT 1,
+                edit_version INTEGER NOT NULL DEFAULT 1,
+                last_modified TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            ALTER TABLE Responses
+            ADD COLUMN IF NOT EXISTS survey_version INTEGER NOT NULL DEFAULT 1
+        ''')
+        # رقم إصدار الصف للتحكم في التعديل المتزامن ووقت آخر تعديل
+        cursor.execute('''
+            ALTER TABLE Responses
+            ADD COLUMN IF NOT EXISTS edit_version INTEGER NOT NULL DEFAULT 1
+        ''')
+        cursor.execute('''
+            ALTER TABLE Responses
+            ADD COLUMN IF NOT EXISTS last_modified TIMESTAMP
+        ''')
+        
+        # إنشاء جدول تفاصيل الإجابات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Response_Details (
+                detail_id SERIAL PRIMARY KEY,
+                response_id INTEGER NOT NULL REFERENCES Responses(response_id),
+                field_id INTEGER NOT NULL REFERENCES Survey_Fields(field_id),
+                answer_value TEXT
+            )
+        ''')
+        
+        # إنشاء جدول مسؤولي المحافظات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS GovernorateAdmins (
+                admin_id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES Users(user_id),
+                governorate_id INTEGER NOT NULL REFERENCES Governorates(governorate_id),
+                UNIQUE(user_id, governorate_id)
+            )
+        ''')
+        
+        # إنشاء جدول الاستبيانات المسموحة للمستخدمين
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS UserSurveys (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES Users(user_id),
+                survey_id INTEGER NOT NULL REFERENCES Surveys(survey_id),
+                UNIQUE(user_id, survey_id)
+            )
+        ''')
+        
+        # إنشاء جدول المحافظات المسموحة للاستبيانات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS SurveyGovernorate (
+                id SERIAL PRIMARY KEY,
+                survey_id INTEGER NOT NULL REFERENCES Surveys(survey_id),
+                governorate_id INTEGER NOT NULL REFERENCES Governorates(governorate_id),
+                UNIQUE(survey_id, governorate_id)
+            )
+        ''')
+        
+        # إنشاء جدول سجل التعديلات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS AuditLog (
+                log_id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES Users(user_id),
+                action_type TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                record_id INTEGER,
+                old_value TEXT,
+                new_value TEXT,
+                action_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # إنشاء جدول المهام الخلفية (التصدير وغيره) ونتائجها حتى انتهاء صلاحيتها
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS BackgroundJobs (
+                job_id SERIAL PRIMARY KEY,
+                job_type TEXT NOT NULL,
+                job_key TEXT NOT NULL,
+                params TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                progress_done INTEGER NOT NULL DEFAULT 0,
+                progress_total INTEGER,
+                result_path TEXT,
+                result_name TEXT,
+                error TEXT,
+                created_by INTEGER REFERENCES Users(user_id),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                expires_at TIMESTAMP,
+                owner TEXT,
+                heartbeat_at TIMESTAMP
+            )
+        ''')
+        # العملية التي تنفذ المهمة وآخر إشارة حياة منها، حتى لا تُغلق مهام عملية أخرى حية
+        cursor.execute('''
+            ALTER TABLE BackgroundJobs
+            ADD COLUMN IF NOT EXISTS owner TEXT
+        ''')
+        cursor.execute('''
+            ALTER TABLE BackgroundJobs
+            ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP
+        ''')
+        
+        # إنشاء جدول نقاط التصدير: آخر ما صدّره كل مستخدم من كل استبيان في تصدير التغييرات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ExportCheckpoints (
+                user_id INTEGER NOT NULL REFERENCES Users(user_id),
+                survey_id INTEGER NOT NULL REFERENCES Surveys(survey_id),
+                last_response_id INTEGER NOT NULL DEFAULT 0,
+                last_modified TIMESTAMP,
+                exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, survey_id)
+            )
+        ''')
+        
+        # إنشاء جدول عدد الإجابات المكتملة يوميًا لكل استبيان وإدارة صحية (لرسوم الاتجاهات)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS DailySubmissionCounts (
+                survey_id INTEGER NOT NULL REFERENCES Surveys(survey_id),
+                day DATE NOT NULL,
+                region_id INTEGER NOT NULL REFERENCES HealthAdministrations(admin_id),
+                submissions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (survey_id, day, region_id)
+            )
+        ''')
+        
+        # فهارس الاستعلامات المتكررة (تتحقق منها python -m benchmarks.plans)
+        for index_sql in INDEXES:
+            cursor.execute(index_sql)
+        
+        # إضافة مستخدم المسؤول إذا لم يكن موجوداً
+        cursor.execute("SELECT COUNT(*) FROM Users WHERE role='admin'")
+        if cursor.fetchone()[0] == 0:
+            admin_password = hash_password("admin123")
+            cursor.execute(
+                "INSERT INTO Users (username, password_hash, role) VALUES (%s, %s, %s)",
+                ("admin", admin_password, "admin")
+            )
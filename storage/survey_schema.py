@@ -0,0 +1,237 @@
+import bisect
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+FIELD_TYPES = ["text", "number", "dropdown", "checkbox", "date"]
+
+# عدد التعريفات المترجمة المحتفظ بها في ذاكرة العملية
+MAX_CACHED_SURVEYS = 256
+
+def _validate_text(value, field) -> Optional[str]:
+    return None
+
+def _validate_number(value, field) -> Optional[str]:
+    if isinstance(value, (int, float)):
+        return None
+    try:
+        float(str(value).strip())
+        return None
+    except ValueError:
+        return "يجب أن تكون القيمة رقمًا"
+
+def _validate_dropdown(value, field) -> Optional[str]:
+    if field.options and value not in field.options:
+        return "القيمة غير موجودة في خيارات القائمة"
+    return None
+
+def _validate_checkbox(value, field) -> Optional[str]:
+    if value in (True, False, "True", "False"):
+        return None
+    return "يجب أن تكون القيمة True أو False"
+
+def _validate_date(value, field) -> Optional[str]:
+    if isinstance(value, (date, datetime)):
+        return None
+    try:
+        date.fromisoformat(str(value).strip())
+        return None
+    except ValueError:
+        return "يجب أن يكون التاريخ بصيغة YYYY-MM-DD"
+
+VALIDATORS = {
+    'text': _validate_text,
+    'number': _validate_number,
+    'dropdown': _validate_dropdown,
+    'checkbox': _validate_checkbox,
+    'date': _validate_date,
+}
+
+class CompiledField:
+    """حقل استبيان بخيارات محللة مسبقًا"""
+
+    def __init__(self, field_id, label, field_type, raw_options, is_required, order):
+        self.field_id = field_id
+        self.label = label
+        self.field_type = field_type
+        self.raw_options = raw_options
+        self.options = json.loads(raw_options) if raw_options else []
+        self.is_required = bool(is_required)
+        self.order = order
+
+    @property
+    def row(self) -> Tuple:
+        """الصف بنفس ترتيب أعمدة get_survey_fields"""
+        return (self.field_id, self.label, self.field_type,
+                self.raw_options, self.is_required, self.order)
+
+    def validate(self, value) -> Optional[str]:
+        """التحقق من نوع القيمة، يعيد رسالة الخطأ أو None"""
+        if value is None or value == "":
+            return None
+        validator = VALIDATORS.get(self.field_type)
+        return validator(value, self) if validator else None
+
+class CompiledSurvey:
+    """تعريف استبيان مترجم لإصدار محدد تشترك فيه العرض والتحقق والتصدير"""
+
+    def __init__(self, survey_id: int, version: int, rows: List[Tuple]):
+        self.survey_id = survey_id
+        self.version = version
+        self.fields = tuple(CompiledField(*row[:6]) for row in rows)
+        self.by_id = {f.field_id: f for f in self.fields}
+        self.labels = {f.field_id: f.label for f in self.fields}
+        self.required_ids = tuple(f.field_id for f in self.fields if f.is_required)
+
+    def options(self, field_id: int) -> List[str]:
+        field = self.by_id.get(field_id)
+        return field.options if field else []
+
+    def missing_required(self, answers: Dict) -> List[str]:
+        """تسميات الحقول المطلوبة التي لم تتم تعبئتها"""
+        return [self.labels[fid] for fid in self.required_ids if not answers.get(fid)]
+
+    def validate_answers(self, answers: Dict) -> Dict[int, str]:
+        """أخطاء التحقق من الأنواع لكل حقل"""
+        errors = {}
+        for field_id, value in answers.items():
+            field = self.by_id.get(field_id)
+            error = field.validate(value) if field else None
+            if error:
+                errors[field_id] = error
+        return errors
+
+def _increasing(keys: List[Tuple]) -> set:
+    """مواقع أطول تسلسل متزايد تمامًا في keys"""
+    tails, tail_positions, previous = [], [], [None] * len(keys)
+    for position, key in enumerate(keys):
+        i = bisect.bisect_left(tails, key)
+        if i == len(tails):
+            tails.append(key)
+            tail_positions.append(position)
+        else:
+            tails[i] = key
+            tail_positions[i] = position
+        previous[position] = tail_positions[i - 1] if i else None
+    result = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        result.add(position)
+        position = previous[position]
+    return result
+
+def diff_fields(current_rows: List[Tuple], fields: List[Dict]) -> Tuple[List[int], List[Tuple]]:
+    """مقارنة الحقول المخزنة بالتعريف المعدل
+
+    ترتيب fields هو الترتيب الجديد، والحقول المخزنة غير الموجودة فيها تعتبر محذوفة.
+    يعيد (معرفات الحقول التي تُغلق، صفوف الحقول الجديدة بالشكل
+    (field_label, field_type, field_options, is_required, field_order)).
+
+    الترتيب ليس جزءًا من هوية الحقل: الحقول غير المعدلة التي بقيت بترتيبها النسبي (أطول تسلسل
+    متزايد من (field_order، field_id)) تبقى بصفوفها وأرقامها، فإضافة حقل أو حذفه لا يعيد إنشاء ما
+    بعده. الصفوف الجديدة (المضافة والمعدلة والمنقولة) تأخذ field_order بين جارتيها، والترتيب
+    بين صفين بنفس field_order برقم الحقل (الصف الجديد رقمه أكبر من كل الصفوف المخزنة).
+    """
+    current = {row[0]: row for row in current_rows}
+    used = set()
+    retired_ids = []
+    entries = []  # (الصف بدون الترتيب، الصف المخزن إذا بقي كما هو)
+
+    for field in fields:
+        options = field.get('field_options') or None
+        row = (field['field_label'],
+               field['field_type'],
+               json.dumps(options) if options else None,
+               bool(field.get('is_required', False)))
+
+        stored = current.get(field.get('field_id'))
+        if stored is not None and stored[0] not in used:
+            used.add(stored[0])
+            stored_options = json.loads(stored[3]) if stored[3] else None
+            if (stored[1], stored[2], stored_options, bool(stored[4])) == (row[0], row[1], options, row[3]):
+                entries.append((row, stored))
+                continue
+            retired_ids.append(stored[0])
+        entries.append((row, None))
+    retired_ids.extend(fid for fid in current if fid not in used)
+
+    # الحقول التي تغير ترتيبها النسبي تُنقل (صف جديد بدلاً من تعديل ترتيب صف مشترك مع إصدارات سابقة)
+    kept = [i for i, (_, stored) in enumerate(entries) if stored is not None]
+    anchors = {kept[i] for i in _increasing([(entries[k][1][5], entries[k][1][0]) for k in kept])}
+    for i in kept:
+        if i not in anchors:
+            retired_ids.append(entries[i][1][0])
+            entries[i] = (entries[i][0], None)
+
+    new_rows = []
+    start, previous = 0, None
+    while start < len(entries):
+        if entries[start][1] is not None:
+            previous = entries[start][1][5]
+            start += 1
+            continue
+        end = start
+        while end < len(entries) and entries[end][1] is None:
+            end += 1
+        following = entries[end][1][5] if end < len(entries) else None
+        if previous is not None and following is not None and previous >= following:
+            # لا مكان بين حقلين بنفس الترتيب: يُنقل الحقل التالي أيضًا
+            retired_ids.append(entries[end][1][0])
+            entries[end] = (entries[end][0], None)
+            continue
+        count = end - start
+        if previous is None:
+            first = 1 if following is None else following - count
+        else:
+            first = previous + 1
+        for offset in range(count):
+            order = first + offset
+            if following is not None:
+                order = min(order, following - 1)
+            new_rows.append(entries[start + offset][0] + (order,))
+        start = end
+    return retired_ids, new_rows
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_hits = 0
+_cache_misses = 0
+
+def get_cached(survey_id: int, version: int) -> Optional[CompiledSurvey]:
+    """الحصول على التعريف المترجم من الذاكرة إن وجد"""
+    global _cache_hits, _cache_misses
+    with _cache_lock:
+        schema = _cache.get((survey_id, version))
+        if schema is not None:
+            _cache.move_to_end((survey_id, version))
+            _cache_hits += 1
+        else:
+            _cache_misses += 1
+        return schema
+
+def compile_survey(survey_id: int, version: int, rows: List[Tuple]) -> CompiledSurvey:
+    """ترجمة حقول الاستبيان وتخزينها حسب (الاستبيان، الإصدار)"""
+    with _cache_lock:
+        schema = _cache.get((survey_id, version))
+    if schema is not None:
+        return schema
+
+    schema = CompiledSurvey(survey_id, version, rows)
+    with _cache_lock:
+        _cache[(survey_id, version)] = schema
+        while len(_cache) > MAX_CACHED_SURVEYS:
+            _cache.popitem(last=False)
+    return schema
+
+def invalidate(survey_id: int) -> None:
+    """حذف جميع إصدارات الاستبيان من الذاكرة"""
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == survey_id]:
+            del _cache[key]
+
+def cache_stats() -> Dict[str, int]:
+    """عدد مرات إيجاد التعريف في الذاكرة وعدم إيجاده، وعدد التعريفات المخزنة"""
+    with _cache_lock:
+        return {'hits': _cache_hits, 'misses': _cache_misses, 'size': len(_cache)}
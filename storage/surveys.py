@@ -0,0 +1,189 @@
+import json
+from typing import Optional, List, Tuple, Dict
+
+from storage import survey_schema
+from storage.backends import execute_values
+from storage.core import connection
+from storage.errors import ConflictError, NotFoundError
+
+# دوال الاستبيانات
+def save_survey(survey_name: str, fields: List[Dict], governorate_ids: List[int] = None, *,
+                acting_user_id: int) -> int:
+    """حفظ استبيان جديد وإرجاع رقمه"""
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        # 1. حفظ الاستبيان الأساسي
+        cursor.execute(
+            "INSERT INTO Surveys (survey_name, created_by) VALUES (%s, %s) RETURNING survey_id",
+            (survey_name, acting_user_id)
+        )
+        survey_id = cursor.fetchone()[0]
+
+        # 2. ربط الاستبيان بالمحافظات
+        if governorate_ids:
+            for gov_id in governorate_ids:
+                cursor.execute(
+                    "INSERT INTO SurveyGovernorate (survey_id, governorate_id) VALUES (%s, %s)",
+                    (survey_id, gov_id)
+                )
+
+        # 3. حفظ حقول الاستبيان
+        for i, field in enumerate(fields):
+            field_options = json.dumps(field.get('field_options', [])) if field.get('field_options') else None
+
+            cursor.execute(
+                """INSERT INTO Survey_Fields
+                   (survey_id, field_type, field_label, field_options, is_required, field_order)
+                   VALUES (%s, %s, %s, %s, %s, %s)""",
+                (survey_id,
+                 field['field_type'],
+                 field['field_label'],
+                 field_options,
+                 field.get('is_required', False),
+                 i + 1)
+            )
+
+        return survey_id
+
+def update_survey(survey_id: int, survey_name: str, is_active: bool, fields: List[Dict] = None, *,
+                  expected_version: int) -> int:
+    """تحديث استبيان موجود بحفظ فروقات الحقول فقط وإرجاع رقم الإصدار الحالي
+
+    ترتيب fields هو ترتيب الحقول الجديد، والحقول غير الموجودة فيها تُحذف من الإصدار الجديد.
+    إذا كانت fields تساوي None تبقى الحقول كما هي.
+    يُرفع ConflictError إذا عُدل الاستبيان منذ قراءة expected_version (عند فتح نموذج التعديل).
+    """
+    conflict = "تم تعديل الاستبيان من مستخدم آخر. يرجى إعادة تحميل الصفحة والمحاولة مرة أخرى"
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        # 1. التأكد من أن الإصدار الحالي هو الذي فُتح عليه النموذج، ثم قراءة حقوله
+        cursor.execute("SELECT definition_version FROM Surveys WHERE survey_id=%s", (survey_id,))
+        result = cursor.fetchone()
+        if not result:
+            raise NotFoundError("الاستبيان غير موجود")
+        if result[0] != expected_version:
+            raise ConflictError(conflict)
+        current_version = expected_version
+
+        retired_ids, new_rows = [], []
+        if fields is not None:
+            cursor.execute('''
+                SELECT field_id, field_label, field_type, field_options, is_required, field_order
+                FROM Survey_Fields
+                WHERE survey_id = %s AND to_version IS NULL
+            ''', (survey_id,))
+            retired_ids, new_rows = survey_schema.diff_fields(cursor.fetchall(), fields)
+
+        # 2. ينشأ إصدار جديد فقط عند تغير الحقول: تُغلق الصفوف المعدلة أو المحذوفة
+        # وتُضاف صفوف جديدة لها، وتبقى الحقول غير المعدلة مشتركة بين الإصدارين
+        new_version = current_version + 1 if (retired_ids or new_rows) else current_version
+        if retired_ids:
+            cursor.execute(
+                "UPDATE Survey_Fields SET to_version=%s WHERE field_id = ANY(%s)",
+                (new_version, retired_ids)
+            )
+        if new_rows:
+            execute_values(
+                cursor,
+                '''INSERT INTO Survey_Fields
+                   (survey_id, field_label, field_type, field_options, is_required, field_order, from_version)
+                   VALUES %s''',
+                [(survey_id,) + row + (new_version,) for row in new_rows]
+            )
+
+        # 3. تحديث بيانات الاستبيان مع التأكد من عدم تعديله من مستخدم آخر في نفس الوقت
+        cursor.execute(
+            """UPDATE Surveys SET survey_name=%s, is_active=%s, definition_version=%s
+               WHERE survey_id=%s AND definition_version=%s""",
+            (survey_name, is_active, new_version, survey_id, current_version)
+        )
+        if cursor.rowcount == 0:
+            raise ConflictError(conflict)
+
+        return new_version
+
+def delete_survey(survey_id: int) -> None:
+    """حذف استبيان مع إجاباته وحقوله"""
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        # حذف تفاصيل الإجابات المرتبطة
+        cursor.execute('''
+            DELETE FROM Response_Details
+            WHERE response_id IN (
+                SELECT response_id FROM Responses WHERE survey_id = %s
+            )
+        ''', (survey_id,))
+
+        # حذف الإجابات المرتبطة والبيانات المشتقة منها
+        cursor.execute("DELETE FROM Responses WHERE survey_id = %s", (survey_id,))
+        cursor.execute("DELETE FROM DailySubmissionCounts WHERE survey_id = %s", (survey_id,))
+        cursor.execute("DELETE FROM ExportCheckpoints WHERE survey_id = %s", (survey_id,))
+
+        # حذف حقول الاستبيان
+        cursor.execute("DELETE FROM Survey_Fields WHERE survey_id = %s", (survey_id,))
+
+        # حذف الاستبيان نفسه
+        cursor.execute("DELETE FROM Surveys WHERE survey_id = %s", (survey_id,))
+
+    survey_schema.invalidate(survey_id)
+
+def get_survey_fields(survey_id: int) -> List[Tuple]:
+    """الحصول على حقول استبيان"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT
+                field_id,
+                field_label,
+                field_type,
+                field_options,
+                is_required,
+                field_order
+            FROM Survey_Fields
+            WHERE survey_id = %s AND to_version IS NULL
+            ORDER BY field_order, field_id
+        ''', (survey_id,))
+        return cursor.fetchall()
+
+def get_compiled_survey(survey_id: int, version: int = None) -> Optional[survey_schema.CompiledSurvey]:
+    """الحصول على التعريف المترجم لإصدار الاستبيان (الإصدار الحالي افتراضيًا)"""
+    # الإصدارات القديمة لا تتغير، لذا لا نحتاج لقاعدة البيانات إذا كانت في الذاكرة
+    if version is not None:
+        schema = survey_schema.get_cached(survey_id, version)
+        if schema is not None:
+            return schema
+
+    with connection() as conn:
+        cursor = conn.cursor()
+        if version is None:
+            cursor.execute("SELECT definition_version FROM Surveys WHERE survey_id = %s", (survey_id,))
+            result = cursor.fetchone()
+            if not result:
+                return None
+            version = result[0]
+
+        schema = survey_schema.get_cached(survey_id, version)
+        if schema is None:
+            cursor.execute('''
+                SELECT field_id, field_label, field_type, field_options, is_required, field_order
+                FROM Survey_Fields
+                WHERE survey_id = %s AND from_version <= %s
+                AND (to_version IS NULL OR to_version > %s)
+                ORDER BY field_order, field_id
+            ''', (survey_id, version, version))
+            schema = survey_schema.compile_survey(survey_id, version, cursor.fetchall())
+        return schema
+
+def get_survey_by_id(survey_id: int) -> Optional[Dict]:
+    """الحصول على بيانات الاستبيان باستخدام رقمه"""
+    with connection() as conn:
+        cursor = conn.cursor(dict_rows=True)
+        cursor.execute("""
+            SELECT survey_id, survey_name, created_at, is_active
+            FROM Surveys
+            WHERE survey_id = %s
+        """, (survey_id,))
+        return cursor.fetchone()
@@ -0,0 +1,166 @@
+import hashlib
+from typing import Optional, List, Tuple, Dict
+
+from storage.audit import insert_audit
+from storage.backends import execute_values
+from storage.core import connection
+from storage.errors import DuplicateError, NotFoundError, ValidationError
+
+def hash_password(password: str) -> str:
+    """تشفير كلمة المرور"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+# دوال المستخدمين
+def get_user_by_username(username: str) -> Optional[Dict]:
+    """الحصول على بيانات المستخدم باستخدام اسم المستخدم"""
+    with connection() as conn:
+        cursor = conn.cursor(dict_rows=True)
+        cursor.execute("SELECT * FROM Users WHERE username=%s", (username,))
+        return cursor.fetchone()
+
+def get_user_role(user_id: int) -> Optional[str]:
+    """الحصول على دور المستخدم"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT role FROM Users WHERE user_id=%s", (user_id,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+def update_last_login(user_id: int) -> None:
+    """تحديث وقت آخر دخول للمستخدم"""
+    with connection() as conn:
+        conn.cursor().execute(
+            "UPDATE Users SET last_login = CURRENT_TIMESTAMP WHERE user_id = %s",
+            (user_id,)
+        )
+
+def update_user_activity(user_id: int) -> None:
+    """تحديث وقت آخر نشاط للمستخدم"""
+    with connection() as conn:
+        conn.cursor().execute(
+            "UPDATE Users SET last_activity = CURRENT_TIMESTAMP WHERE user_id = %s",
+            (user_id,)
+        )
+
+def add_user(username: str, password: str, role: str, region_id: int = None) -> int:
+    """إضافة مستخدم جديد وإرجاع رقمه"""
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT 1 FROM Users WHERE username=%s", (username,))
+        if cursor.fetchone():
+            raise DuplicateError("اسم المستخدم موجود بالفعل!")
+
+        cursor.execute(
+            """INSERT INTO Users (username, password_hash, role, assigned_region)
+               VALUES (%s, %s, %s, %s) RETURNING user_id""",
+            (username, hash_password(password), role, region_id))
+        return cursor.fetchone()[0]
+
+def update_user(user_id: int, username: str, role: str, region_id: int = None, *,
+                acting_user_id: int) -> None:
+    """تحديث بيانات المستخدم وتسجيل التعديل في نفس المعاملة"""
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT username, role, assigned_region FROM Users WHERE user_id=%s", (user_id,))
+        old_data = cursor.fetchone()
+        if not old_data:
+            raise NotFoundError("المستخدم غير موجود")
+
+        cursor.execute("SELECT 1 FROM Users WHERE username=%s AND user_id!=%s", (username, user_id))
+        if cursor.fetchone():
+            raise DuplicateError("اسم المستخدم موجود بالفعل!")
+
+        cursor.execute(
+            "UPDATE Users SET username=%s, role=%s, assigned_region=%s WHERE user_id=%s",
+            (username, role, region_id, user_id)
+        )
+
+        if role == 'governorate_admin':
+            cursor.execute("DELETE FROM GovernorateAdmins WHERE user_id=%s", (user_id,))
+
+        # تسجيل التعديل في سجل التعديلات
+        insert_audit(
+            cursor,
+            acting_user_id,
+            'UPDATE',
+            'Users',
+            user_id,
+            tuple(old_data),
+            (username, role, region_id)
+        )
+
+# دوال الاستبيانات المسموح بها
+def get_user_allowed_surveys(user_id: int) -> List[Tuple[int, str]]:
+    """الحصول على الاستبيانات المسموح بها للمستخدم"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.survey_id, s.survey_name
+            FROM Surveys s
+            JOIN UserSurveys us ON s.survey_id = us.survey_id
+            WHERE us.user_id = %s
+            ORDER BY s.survey_name
+        ''', (user_id,))
+        return cursor.fetchall()
+
+def update_user_allowed_surveys(user_id: int, survey_ids: List[int]) -> List[int]:
+    """تحديث الاستبيانات المسموح بها للمستخدم وإرجاع الاستبيانات التي تم حفظها"""
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        # الحصول على محافظة المستخدم
+        cursor.execute('''
+            SELECT ha.governorate_id
+            FROM Users u
+            JOIN HealthAdministrations ha ON u.assigned_region = ha.admin_id
+            WHERE u.user_id = %s
+        ''', (user_id,))
+        governorate_id = cursor.fetchone()
+
+        if not governorate_id:
+            raise ValidationError("المستخدم غير مرتبط بمحافظة")
+
+        # التحقق من أن الاستبيانات مسموحة للمحافظة في استعلام واحد
+        valid_surveys = []
+        if survey_ids:
+            cursor.execute('''
+                SELECT survey_id FROM SurveyGovernorate
+                WHERE governorate_id = %s AND survey_id = ANY(%s)
+            ''', (governorate_id[0], list(survey_ids)))
+            allowed = {row[0] for row in cursor.fetchall()}
+            valid_surveys = [survey_id for survey_id in dict.fromkeys(survey_ids) if survey_id in allowed]
+
+        # حذف جميع التصاريح الحالية
+        cursor.execute("DELETE FROM UserSurveys WHERE user_id=%s", (user_id,))
+
+        # إضافة التصاريح الجديدة
+        if valid_surveys:
+            execute_values(
+                cursor,
+                "INSERT INTO UserSurveys (user_id, survey_id) VALUES %s",
+                [(user_id, survey_id) for survey_id in valid_surveys]
+            )
+
+        return valid_surveys
+
+def get_all_users_for_admin_view() -> List[Tuple]:
+    """الحصول على جميع المستخدمين لعرضها في لوحة التحكم الإدارية"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT u.user_id, u.username, u.role,
+                   COALESCE(g.governorate_name, ga.governorate_name) as governorate_name,
+                   h.admin_name
+            FROM Users u
+            LEFT JOIN HealthAdministrations h ON u.assigned_region = h.admin_id
+            LEFT JOIN Governorates g ON h.governorate_id = g.governorate_id
+            LEFT JOIN (
+                SELECT ga.user_id, g.governorate_name
+                FROM GovernorateAdmins ga
+                JOIN Governorates g ON ga.governorate_id = g.governorate_id
+            ) ga ON u.user_id = ga.user_id
+            ORDER BY u.user_id
+        ''')
+        return cursor.fetchall()
@@ -0,0 +1,25 @@
+from analytics_views import crosstab_table
+
+ROWS = [("نعم", "خيار أ", 3), ("نعم", "خيار ب", 1), ("لا", "خيار أ", 2), (None, "خيار ب", 4)]
+
+def test_counts_with_margins():
+    table = crosstab_table(ROWS, "سؤال 1", "سؤال 2")
+    assert table.index.name == "سؤال 1" and table.columns.name == "سؤال 2"
+    assert table.loc["نعم", "خيار أ"] == 3
+    assert table.loc["", "خيار ب"] == 4
+    assert table.loc["الإجمالي", "الإجمالي"] == 10
+
+def test_row_and_column_percentages():
+    by_row = crosstab_table(ROWS, "سؤال 1", "سؤال 2", "نسبة من الصف %")
+    assert by_row.loc["نعم"].sum() == 100.0
+    by_column = crosstab_table(ROWS, "سؤال 1", "سؤال 2", "نسبة من العمود %")
+    assert by_column["خيار أ"].sum() == 100.0
+
+def test_same_field_on_both_axes():
+    # نفس الحقل في الصفوف والأعمدة: كل إجابة تقع على القطر
+    rows = [("خيار أ", "خيار أ", 5), ("خيار ب", "خيار ب", 2)]
+    table = crosstab_table(rows, "سؤال 1", "سؤال 1")
+    assert table.index.name == table.columns.name == "سؤال 1"
+    assert table.loc["خيار أ", "خيار أ"] == 5
+    assert table.loc["خيار أ", "خيار ب"] == 0
+    assert table.loc["الإجمالي", "الإجمالي"] == 7
@@ -0,0 +1,51 @@
+import jobs
+from storage import backends, instrumentation, jobs as job_store
+from storage.core import connection
+from storage.schema import init_db
+
+def setup_function():
+    backends._backend = None
+
+def teardown_function():
+    backends._backend = None
+
+def _database(tmp_path, monkeypatch):
+    backends.set_backend(backends.SQLiteBackend(str(tmp_path / "jobs.db")))
+    init_db()
+    monkeypatch.setattr(instrumentation, 'N_PLUS_ONE_MODE', 'raise')
+    monkeypatch.setattr(instrumentation, 'N_PLUS_ONE_THRESHOLD', 5)
+
+def _lookups(count: int, progress=None):
+    # استعلام لكل عنصر: نفس الشكل يتكرر count مرة
+    for user_id in range(count):
+        with connection() as conn:
+            conn.cursor().execute("SELECT username FROM Users WHERE user_id = %s", (user_id,))
+        if progress:
+            progress(1)
+
+def _run_job(monkeypatch, body):
+    monkeypatch.setitem(jobs.JOB_TYPES, 'test_lookups', body)
+    job_id = job_store.create_job('test_lookups', 'test_lookups', {})
+    jobs._run('test_lookups', job_id, {})
+    return job_store.get_job(job_id)
+
+def test_repeated_query_shape_fails_the_job(tmp_path, monkeypatch):
+    _database(tmp_path, monkeypatch)
+
+    def body(job_id, params):
+        _lookups(10)
+        job_store.finish_job(job_id, None, None, jobs.JOB_RESULT_TTL)
+
+    job = _run_job(monkeypatch, body)
+    assert job['status'] == 'failed'
+    assert "N+1" in job['error'] and "job:test_lookups" in job['error']
+
+def test_repeats_across_batches_are_not_n_plus_one(tmp_path, monkeypatch):
+    _database(tmp_path, monkeypatch)
+
+    def body(job_id, params):
+        _lookups(10, jobs._Progress(job_id))
+        job_store.finish_job(job_id, None, None, jobs.JOB_RESULT_TTL)
+
+    job = _run_job(monkeypatch, body)
+    assert job['status'] == 'done'
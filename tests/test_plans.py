@@ -0,0 +1,28 @@
+import pytest
+
+from benchmarks import plans
+from benchmarks.generate import generate
+from benchmarks.run import Sample
+from storage import backends
+
+# أصغر من حجم small حتى يبقى الاختبار سريعًا، مع جداول إجابات أكبر من LARGE_ROWS
+SIZES = dict(governorates=3, admins_per_governorate=3, users=60, surveys=6,
+             fields_per_survey=6, responses=2_500, audit_entries=1_500)
+LARGE_ROWS = 1_000
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    backends.set_backend(backends.SQLiteBackend(str(tmp_path_factory.mktemp("plans") / "plans.db")))
+    generate(days=30, **SIZES)
+    sizes = plans.table_sizes()
+    yield Sample(7), {table for table, rows in sizes.items() if rows > LARGE_ROWS}
+    backends._backend = None
+
+@pytest.mark.parametrize("name", sorted(plans.HOT_QUERIES))
+def test_hot_query_plan(database, name):
+    sample, large_tables = database
+    func, expectation = plans.HOT_QUERIES[name]
+    results = plans.check(name, func, expectation, sample, large_tables)
+    assert results, "لم تُرسل العملية أي SELECT"
+    problems = [(r['call_site'], r['sql'][:120], r['problems']) for r in results if r['problems']]
+    assert not problems
@@ -0,0 +1,62 @@
+import random
+
+from storage.survey_schema import diff_fields
+
+def stored_fields(count):
+    return [(i, f"حقل {i}", 'text', None, False, i) for i in range(1, count + 1)]
+
+def as_fields(rows):
+    return [{'field_id': row[0], 'field_label': row[1], 'field_type': row[2],
+             'field_options': None, 'is_required': row[4]} for row in rows]
+
+def apply(rows, fields):
+    # الإصدار الجديد كما تقرؤه القاعدة: الصفوف الباقية والجديدة مرتبة بـ (field_order، field_id)
+    retired, new_rows = diff_fields(rows, fields)
+    next_id = max((row[0] for row in rows), default=0) + 1
+    version = [row for row in rows if row[0] not in retired]
+    for offset, (label, field_type, options, required, order) in enumerate(new_rows):
+        version.append((next_id + offset, label, field_type, options, required, order))
+    version.sort(key=lambda row: (row[5], row[0]))
+    return retired, new_rows, version
+
+def test_insert_near_top_keeps_later_fields():
+    rows = stored_fields(200)
+    fields = as_fields(rows)
+    fields.insert(1, {'field_label': "حقل جديد", 'field_type': 'text'})
+    retired, new_rows, version = apply(rows, fields)
+    assert retired == [] and len(new_rows) == 1
+    assert [row[1] for row in version] == [field['field_label'] for field in fields]
+
+def test_remove_near_top_retires_only_that_field():
+    rows = stored_fields(200)
+    retired, new_rows, version = apply(rows, as_fields(rows[:1] + rows[2:]))
+    assert retired == [2] and new_rows == []
+
+def test_edit_and_move():
+    rows = stored_fields(5)
+    fields = as_fields(rows)
+    fields[2]['field_label'] = "تسمية معدلة"
+    fields.insert(0, fields.pop(4))
+    retired, new_rows, version = apply(rows, fields)
+    assert sorted(retired) == [3, 5] and len(new_rows) == 2
+    assert [row[1] for row in version] == [field['field_label'] for field in fields]
+
+def test_repeated_edits_keep_requested_order():
+    rng = random.Random(7)
+    rows = stored_fields(30)
+    for _ in range(40):
+        fields = as_fields(rows)
+        action = rng.choice(['insert', 'remove', 'move'])
+        if action == 'insert':
+            fields.insert(rng.randrange(len(fields) + 1), {'field_label': f"جديد {rng.random()}", 'field_type': 'text'})
+        elif action == 'remove':
+            fields.pop(rng.randrange(len(fields)))
+        else:
+            fields.insert(rng.randrange(len(fields)), fields.pop(rng.randrange(len(fields))))
+        retired, new_rows, version = apply(rows, fields)
+        assert [row[1] for row in version] == [field['field_label'] for field in fields]
+        # كل صف جديد إما الحقل المضاف أو حقل نُقل (أُغلق صفه القديم)
+        assert len(new_rows) - len(retired) == {'insert': 1, 'remove': -1, 'move': 0}[action]
+        if action == 'remove':
+            assert new_rows == []
+        rows = version